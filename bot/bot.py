@@ -4,12 +4,22 @@ Telegram Bot для магазина цветов "Цветы Нячанг" - Г
 import asyncio
 import logging
 import os
+import sys
 from aiogram import Bot, Dispatcher, Router
 from aiogram.filters import CommandStart, Command
 from aiogram.types import Message, WebAppInfo, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
-from aiogram.fsm.storage.memory import MemoryStorage
 from dotenv import load_dotenv
 
+# Общие модули бота (хранилище FSM) лежат в flower_shop/bot, общий с backend пакет - в flower_shop/shared
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'flower_shop', 'bot'))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'flower_shop'))
+from storage import create_storage, setup_storage_cache
+from catalog import catalog_index
+from dedup import create_deduplicator
+from order_summary import order_summaries, render_orders, render_repeat, repeat_url
+from throttling import setup_throttling
+from update_pool import UpdatePool
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -85,19 +95,9 @@ async def my_orders(message: Message):
     """История заказов пользователя"""
     logger.info(f"📦 Запрос истории заказов от {message.from_user.id}")
     
-    # TODO: Получить заказы из API
-    await message.answer(
-        "📦 <b>Ваши заказы:</b>\n\n"
-        "📦 Заказ #123\n"
-        "💰 1,200,000 VND\n"
-        "📅 15.10.2025\n"
-        "Статус: Доставлен\n\n"
-        "📦 Заказ #122\n"
-        "💰 800,000 VND\n"
-        "📅 10.10.2025\n"
-        "Статус: Доставлен",
-        parse_mode='HTML'
-    )
+    # Сводка из API, повторные нажатия - из кэша процесса
+    summary = await order_summaries.get(message.from_user.id)
+    await message.answer(render_orders(summary), parse_mode='HTML')
 
 
 @router.message(lambda message: message.text == "💬 Поддержка")
@@ -119,19 +119,21 @@ async def repeat_last_order(message: Message):
     """Повторить последний заказ"""
     logger.info(f"🔁 Запрос повтора заказа от {message.from_user.id}")
     
+    summary = await order_summaries.get(message.from_user.id)
+    if summary is None or not summary.get("last_order_id"):
+        await message.answer(render_orders(summary), parse_mode='HTML')
+        return
+    
+    # Mini App заполнит корзину позициями последнего заказа
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
-            text="🛍 Повторить заказ #123",
-            web_app=WebAppInfo(url=f"{WEBAPP_URL}?repeat=123")
+            text=f"🛍 Повторить заказ #{summary['last_order_id']}",
+            web_app=WebAppInfo(url=repeat_url(WEBAPP_URL, summary))
         )]
     ])
     
     await message.answer(
-        "🔁 <b>Повторить последний заказ</b>\n\n"
-        "📦 Заказ #123\n"
-        "🌹 Розы премиум\n"
-        "💰 1,200,000 VND\n\n"
-        "Нажмите кнопку чтобы повторить:",
+        render_repeat(summary),
         reply_markup=keyboard,
         parse_mode='HTML'
     )
@@ -150,11 +152,18 @@ async def main():
     try:
         # Создаем бота и диспетчер
         bot = Bot(token=BOT_TOKEN)
-        storage = MemoryStorage()
+        storage = create_storage()
         dp = Dispatcher(storage=storage)
+        setup_storage_cache(dp)
+        # Лимит частоты на пользователя, до хендлеров
+        throttling = setup_throttling(dp)
         
         # Регистрируем роутер
         dp.include_router(router)
+        # Inline-поиск (@bot розы) по каталогу в памяти
+        from handlers import inline
+        dp.include_router(inline.router)
+        catalog_index.start()
         
         # Настраиваем webhook для Railway
         webhook_path = "/webhook"
@@ -206,6 +215,12 @@ async def main():
         
         app.router.add_get("/test-webhook", test_webhook)
         
+        # Апдейты обрабатывает пул воркеров, webhook отвечает сразу
+        update_pool = UpdatePool(dp, bot)
+        update_pool.start()
+        # Повторные доставки Telegram отбрасываем по update_id
+        deduplicator = create_deduplicator(prefix=str(bot.id))
+        
         # Webhook endpoint
         async def webhook_handler(request):
             try:
@@ -219,17 +234,32 @@ async def main():
                 
                 # Преобразуем dict в объект Update
                 from aiogram.types import Update
-                update = Update(**data)
-                
-                # Обрабатываем обновление
-                await dp.feed_update(bot, update)
-                logger.info("✅ Обновление обработано успешно")
-                return web.Response(text="OK")
+                update = Update.model_validate(data, context={"bot": bot})
             except Exception as e:
-                logger.error(f"❌ Ошибка в webhook handler: {e}")
-                import traceback
-                logger.error(f"❌ Traceback: {traceback.format_exc()}")
-                return web.Response(text="ERROR", status=500)
+                logger.error(f"❌ Невалидное обновление: {e}")
+                return web.Response(text="INVALID", status=400)
+            
+            if not await deduplicator.check(update.update_id):
+                logger.info(f"🔁 Повторный апдейт {update.update_id} пропущен")
+                return web.Response(text="OK")
+            
+            # Очередь полна - Telegram повторит доставку позже, этот повтор не дубль
+            if not update_pool.submit(update):
+                logger.warning(f"⚠️ Очередь апдейтов заполнена, {update.update_id} отклонен")
+                await deduplicator.release(update.update_id)
+                return web.Response(text="BUSY", status=503)
+            return web.Response(text="OK")
+        
+        # Очередь, задержка и время обработки апдейтов
+        async def update_metrics(request):
+            return web.json_response(update_pool.metrics())
+        
+        app.router.add_get("/metrics/updates", update_metrics)
+        
+        async def throttling_metrics(request):
+            return web.json_response(throttling.metrics())
+        
+        app.router.add_get("/metrics/throttling", throttling_metrics)
         
         app.router.add_post(webhook_path, webhook_handler)
         
@@ -253,8 +283,16 @@ async def main():
         raise
     finally:
         # Закрываем соединения
+        if 'update_pool' in locals():
+            await update_pool.stop()
+        if 'deduplicator' in locals():
+            await deduplicator.close()
         if 'bot' in locals():
             await bot.session.close()
+        if 'storage' in locals():
+            await storage.close()
+        await order_summaries.close()
+        await catalog_index.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
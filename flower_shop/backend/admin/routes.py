@@ -2,16 +2,24 @@ from fastapi import APIRouter, Request, Depends, Form, HTTPException
 from fastapi.responses import RedirectResponse
 from fastapi.templating import Jinja2Templates
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
+from sqlalchemy import select, desc, event, func, or_, text, column
 from typing import Optional
 import os
 
-from ..models.database import Product, get_db
+from shared.search_index import normalize
+from ..models.database import Product, Broadcast, engine, get_db
+from ..utils.catalog_cache import catalog_cache
+from ..utils.broadcast import broadcast_manager
+from ..utils.telegram_notify import TELEGRAM_MESSAGE_LIMIT
 
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 templates = Jinja2Templates(directory="flower_shop/backend/templates")
 
+MAX_PER_PAGE = 100
+# FTS5 trigram находит только подстроки от 3 символов
+FTS_MIN_QUERY_LENGTH = 3
+
 
 def get_admin_password() -> str:
     return os.getenv("ADMIN_PASSWORD", "")
@@ -22,6 +30,48 @@ def require_login(request: Request) -> None:
         raise HTTPException(status_code=403)
 
 
+def setup_search_functions(bind) -> None:
+    """search_normalize() в SQLite: встроенные lower()/LIKE меняют регистр только у ASCII"""
+    if bind.dialect.name != "sqlite":
+        return
+
+    @event.listens_for(bind.sync_engine, "connect")
+    def register(dbapi_connection, connection_record):
+        dbapi_connection.create_function("search_normalize", 1, normalize, deterministic=True)
+
+
+setup_search_functions(engine)
+
+
+def product_search_filter(q: str, dialect: str):
+    """Условие поиска по имени/описанию, использующее текстовый индекс диалекта"""
+    if dialect == "sqlite" and len(q) >= FTS_MIN_QUERY_LENGTH:
+        # Фраза в кавычках = поиск подстроки по триграммам products_fts
+        phrase = '"' + q.replace('"', '""') + '"'
+        matches = (
+            text("SELECT rowid FROM products_fts WHERE products_fts MATCH :fts_query")
+            .bindparams(fts_query=phrase)
+            .columns(column("rowid"))
+        )
+        return Product.id.in_(matches)
+
+    # Короткий запрос в SQLite: обе стороны через ту же нормализацию, что у
+    # триграммного индекса каталога, иначе "РО" не находит "Розы"
+    needle = normalize(q) if dialect == "sqlite" else ""
+    if needle:
+        return or_(
+            func.search_normalize(Product.name).contains(needle, autoescape=True),
+            func.search_normalize(Product.description).contains(needle, autoescape=True),
+        )
+
+    # PostgreSQL: ILIKE обслуживается GIN-индексами pg_trgm
+    pattern = "%" + q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    return or_(
+        Product.name.ilike(pattern, escape="\\"),
+        Product.description.ilike(pattern, escape="\\"),
+    )
+
+
 @router.get("/login")
 async def admin_login_page(request: Request):
     return templates.TemplateResponse(
@@ -63,17 +113,18 @@ async def products_list(
 ):
     require_login(request)
 
-    query = select(Product)
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), MAX_PER_PAGE)
+
+    filters = []
     if category:
-        query = query.where(Product.category == category)
+        filters.append(Product.category == category)
     if popular is not None:
-        query = query.where(Product.is_popular == popular)
+        filters.append(Product.is_popular == popular)
     if available is not None:
-        query = query.where(Product.is_available == available)
-    if q:
-        # простейший поиск по вхождению имени/описания (ILIKE недоступен без конкретного диалекта)
-        # здесь оставляем фильтрацию на уровне Python после выборки, чтобы не плодить завязки на диалект
-        pass
+        filters.append(Product.is_available == available)
+    if q and q.strip():
+        filters.append(product_search_filter(q.strip(), db.bind.dialect.name))
 
     # сортировка
     sort_field = {
@@ -82,25 +133,19 @@ async def products_list(
         "created_at": Product.created_at,
     }.get(sort, Product.created_at)
     if order == "asc":
-        query = query.order_by(sort_field)
+        ordering = (sort_field, Product.id)
     else:
-        query = query.order_by(desc(sort_field))
-
-    result = await db.execute(query)
-    rows = result.scalars().all()
-
-    if q:
-        q_lower = q.lower()
-        rows = [
-            p for p in rows
-            if (p.name and q_lower in p.name.lower())
-            or (p.description and q_lower in p.description.lower())
-        ]
-
-    total = len(rows)
-    start = (page - 1) * per_page
-    end = start + per_page
-    items = rows[start:end]
+        ordering = (desc(sort_field), desc(Product.id))
+
+    total = await db.scalar(select(func.count(Product.id)).where(*filters))
+    result = await db.execute(
+        select(Product)
+        .where(*filters)
+        .order_by(*ordering)
+        .offset((page - 1) * per_page)
+        .limit(per_page)
+    )
+    items = result.scalars().all()
 
     return templates.TemplateResponse(
         "admin/products_list.html",
@@ -170,6 +215,7 @@ async def product_create(
     )
     db.add(product)
     await db.commit()
+    await catalog_cache.refresh()
 
     return RedirectResponse(url="/admin/products", status_code=303)
 
@@ -231,6 +277,7 @@ async def product_update(
     product.is_available = bool(is_available)
 
     await db.commit()
+    await catalog_cache.refresh()
 
     return RedirectResponse(url="/admin/products", status_code=303)
 
@@ -244,6 +291,7 @@ async def product_delete(product_id: int, request: Request, db: AsyncSession = D
         raise HTTPException(status_code=404)
     await db.delete(product)
     await db.commit()
+    await catalog_cache.refresh()
     return RedirectResponse(url="/admin/products", status_code=303)
 
 
@@ -256,6 +304,7 @@ async def product_toggle_available(product_id: int, request: Request, db: AsyncS
         raise HTTPException(status_code=404)
     product.is_available = not bool(product.is_available)
     await db.commit()
+    await catalog_cache.refresh()
     return RedirectResponse(url="/admin/products", status_code=303)
 
 
@@ -268,7 +317,77 @@ async def product_toggle_popular(product_id: int, request: Request, db: AsyncSes
         raise HTTPException(status_code=404)
     product.is_popular = not bool(product.is_popular)
     await db.commit()
+    await catalog_cache.refresh()
     return RedirectResponse(url="/admin/products", status_code=303)
 
 
+def broadcast_to_dict(broadcast: Broadcast) -> dict:
+    return {
+        "id": broadcast.id,
+        "text": broadcast.text,
+        "status": broadcast.status,
+        "last_telegram_id": broadcast.last_telegram_id,
+        "total_recipients": broadcast.total_recipients,
+        "sent_count": broadcast.sent_count,
+        "failed_count": broadcast.failed_count,
+        "blocked_count": broadcast.blocked_count,
+        "created_at": broadcast.created_at.isoformat() if broadcast.created_at else None,
+        "started_at": broadcast.started_at.isoformat() if broadcast.started_at else None,
+        "finished_at": broadcast.finished_at.isoformat() if broadcast.finished_at else None,
+        "live": broadcast_manager.live_stats(broadcast.id),
+    }
+
+
+async def get_broadcast_or_404(db: AsyncSession, broadcast_id: int) -> Broadcast:
+    broadcast = await db.get(Broadcast, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404)
+    return broadcast
+
+
+@router.get("/broadcasts")
+async def broadcasts_list(request: Request, db: AsyncSession = Depends(get_db)):
+    require_login(request)
+    result = await db.execute(select(Broadcast).order_by(desc(Broadcast.id)).limit(MAX_PER_PAGE))
+    return [broadcast_to_dict(b) for b in result.scalars().all()]
+
+
+@router.post("/broadcasts")
+async def broadcast_create(payload: dict, request: Request, db: AsyncSession = Depends(get_db)):
+    """Создать рассылку; start=true - сразу запросить запуск у ведущего процесса"""
+    require_login(request)
+    text_value = (payload.get("text") or "").strip()
+    if not text_value or len(text_value) > TELEGRAM_MESSAGE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"text must be 1..{TELEGRAM_MESSAGE_LIMIT} characters")
+    broadcast = Broadcast(text=text_value, status='pending' if payload.get("start") else 'draft')
+    db.add(broadcast)
+    await db.commit()
+    broadcast_manager.wake()
+    return broadcast_to_dict(broadcast)
 
+
+@router.get("/broadcasts/{broadcast_id}")
+async def broadcast_detail(broadcast_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    require_login(request)
+    return broadcast_to_dict(await get_broadcast_or_404(db, broadcast_id))
+
+
+@router.post("/broadcasts/{broadcast_id}/start")
+async def broadcast_start(broadcast_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """Запустить или продолжить с контрольной точки (отправляет ведущий процесс)"""
+    require_login(request)
+    broadcast = await get_broadcast_or_404(db, broadcast_id)
+    if broadcast.status in ('completed', 'cancelled'):
+        raise HTTPException(status_code=409, detail=f"Broadcast is {broadcast.status}")
+    await broadcast_manager.request_start(broadcast_id)
+    await db.refresh(broadcast)
+    return {"id": broadcast_id, "status": broadcast.status}
+
+
+@router.post("/broadcasts/{broadcast_id}/pause")
+async def broadcast_pause(broadcast_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    require_login(request)
+    broadcast = await get_broadcast_or_404(db, broadcast_id)
+    await broadcast_manager.pause(broadcast_id)
+    await db.refresh(broadcast)
+    return {"id": broadcast_id, "status": broadcast.status}
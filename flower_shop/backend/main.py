@@ -3,45 +3,104 @@ FastAPI Backend для магазина цветов "Цветы Нячанг"
 """
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routes import products, orders
-from .models.database import create_tables
-import asyncio
+from .routes import products, orders, reminders
+from .models.database import create_tables, wait_for_migrations
+from .utils.outbox import outbox_dispatcher
+from .utils.telegram_notify import notifier, send_scheduler
+from .utils.broadcast import broadcast_manager
+from .utils.reminders import reminder_scheduler
+from .utils.leader import leader
 from starlette.middleware.sessions import SessionMiddleware
+import logging
 import os
 
-app = FastAPI(title="Flowers Nha Trang API", version="1.0.0")
+SESSION_SECRET = os.getenv("SESSION_SECRET", "change-me-please")
+logger = logging.getLogger(__name__)
 
-# CORS для Mini App
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
-# Сессии для админ-панели
-SESSION_SECRET = os.getenv("SESSION_SECRET", "change-me-please")
-app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
-
-# Подключаем роуты
-app.include_router(products.router, prefix="/api")
-app.include_router(orders.router, prefix="/api")
-try:
-    from .admin.routes import router as admin_router
-    app.include_router(admin_router)
-except Exception:
-    # Админ-панель не блокирует API при ошибках импорта
-    pass
+def setup_app(app: FastAPI) -> None:
+    """Middleware и роуты API; общие для этого приложения и unified_server.py"""
+    # CORS для Mini App
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Сессии для админ-панели
+    app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
 
-@app.on_event("startup")
-async def startup_event():
-    """Создаем таблицы при запуске (с защитой от временных сбоев БД)"""
+    # Подключаем роуты
+    app.include_router(products.router, prefix="/api")
+    app.include_router(orders.router, prefix="/api")
+    app.include_router(reminders.router, prefix="/api")
+    try:
+        from .admin.routes import router as admin_router
+        app.include_router(admin_router)
+    except Exception:
+        # Админ-панель не блокирует API при ошибках импорта
+        pass
+
+
+async def migrate() -> None:
+    """Миграции применяет только ведущий: параллельный upgrade из нескольких
+    воркеров гоняется за alembic_version, а проигравший CREATE INDEX
+    CONCURRENTLY оставляет INVALID индекс"""
     try:
         await create_tables()
     except Exception as e:
         # Не роняем приложение, чтобы health отвечал, а API мог подняться после восстановления БД
-        import logging
-        logging.getLogger(__name__).error(f"DB init error (startup skipped): {e}")
+        logger.error(f"DB init error (startup skipped): {e}")
+
+
+async def start_background_jobs() -> None:
+    """Фоновые задачи только в ведущем процессе: один глобальный лимит отправки в Telegram"""
+    # Диспетчер переживает недоступность БД: ошибки опроса только логируются
+    outbox_dispatcher.start()
+    reminder_scheduler.start()
+    # Запрошенные в админке (pending) и прерванные рестартом (running) рассылки
+    broadcast_manager.start_polling()
+
+
+async def stop_background_jobs() -> None:
+    await broadcast_manager.stop()
+    await reminder_scheduler.stop()
+    await outbox_dispatcher.stop()
+
+
+# Порядок важен: фоновые задачи стартуют на уже обновленной схеме
+leader.on_elected(migrate)
+leader.on_elected(start_background_jobs)
+leader.on_resigned(stop_background_jobs)
+
+
+async def startup() -> None:
+    """Выбор ведущего; ведущий применяет миграции, остальные ждут схему"""
+    await notifier.start()
+    send_scheduler.start()
+    # Остальные воркеры ждут своей очереди и подхватят задачи, если ведущий упадет
+    await leader.start()
+    if not leader.is_leader and not await wait_for_migrations():
+        logger.error("❌ Схема БД не обновлена ведущим процессом, стартуем без ожидания")
+
+
+async def shutdown() -> None:
+    await leader.stop()
+    await send_scheduler.stop()
+    await notifier.close()
+
+
+app = FastAPI(title="Flowers Nha Trang API", version="1.0.0")
+setup_app(app)
+
+
+@app.on_event("startup")
+async def startup_event():
+    await startup()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await shutdown()
 
 @app.get("/")
 async def root():
@@ -51,6 +110,11 @@ async def root():
 async def health_check():
     return {"status": "OK"}
 
+@app.get("/metrics/notifier")
+async def notifier_metrics():
+    """Очереди, отказы и задержки отправки в Telegram"""
+    return {**send_scheduler.metrics(), "leader": leader.is_leader}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,70 @@
+"""
+Окружение Alembic: online (через соединение приложения или собственный
+async-движок) и offline (--sql, генерация SQL без подключения к БД)
+"""
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+# При запуске из приложения метаданные и соединение передаются через attributes
+target_metadata = config.attributes.get("metadata")
+database_url = config.get_main_option("sqlalchemy.url")
+if target_metadata is None or not database_url:
+    from backend.models.database import Base, DATABASE_URL
+    target_metadata = target_metadata if target_metadata is not None else Base.metadata
+    database_url = database_url or DATABASE_URL
+
+
+def run_migrations_offline() -> None:
+    """Сгенерировать SQL-скрипт без подключения к БД"""
+    context.configure(
+        url=database_url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection) -> None:
+    # Каждая миграция в своей транзакции: CREATE INDEX CONCURRENTLY
+    # выполняется вне транзакции (autocommit_block)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        transaction_per_migration=True,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    engine = create_async_engine(database_url, poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+    else:
+        asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,85 @@
+"""initial schema
+
+Схема в том виде, в котором ее создавал Base.metadata.create_all до
+появления миграций. Существующие базы помечаются этой ревизией (stamp).
+
+Revision ID: 0001
+Revises:
+Create Date: 2025-10-20 12:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'products',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('name', sa.String(200), nullable=False),
+        sa.Column('category', sa.String(50)),
+        sa.Column('description', sa.Text()),
+        sa.Column('price', sa.Integer(), nullable=False),
+        sa.Column('photo_url', sa.String(500)),
+        sa.Column('is_available', sa.Boolean()),
+        sa.Column('is_popular', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('telegram_id', sa.Integer(), nullable=False),
+        sa.Column('telegram_username', sa.String(100)),
+        sa.Column('name', sa.String(200)),
+        sa.Column('phone', sa.String(20), nullable=False),
+        sa.Column('address', sa.Text(), nullable=False),
+        sa.Column('latitude', sa.String(50)),
+        sa.Column('longitude', sa.String(50)),
+        sa.Column('delivery_date', sa.String(50)),
+        sa.Column('delivery_time', sa.String(50)),
+        sa.Column('card_text', sa.Text()),
+        sa.Column('is_anonymous', sa.Boolean()),
+        sa.Column('items_total', sa.Integer()),
+        sa.Column('delivery_cost', sa.Integer()),
+        sa.Column('total', sa.Integer()),
+        sa.Column('status', sa.String(50)),
+        sa.Column('created_at', sa.DateTime()),
+    )
+    op.create_table(
+        'order_items',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('order_id', sa.Integer(), sa.ForeignKey('orders.id')),
+        sa.Column('product_id', sa.Integer(), sa.ForeignKey('products.id')),
+        sa.Column('product_name', sa.String(200)),
+        sa.Column('size', sa.String(20)),
+        sa.Column('price', sa.Integer()),
+        sa.Column('quantity', sa.Integer()),
+    )
+    op.create_table(
+        'reminders',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('telegram_id', sa.Integer(), nullable=False),
+        sa.Column('event_name', sa.String(200), nullable=False),
+        sa.Column('event_date', sa.String(50), nullable=False),
+        sa.Column('remind_days_before', sa.Integer()),
+        sa.Column('is_active', sa.Boolean()),
+        sa.Column('created_at', sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('reminders')
+    op.drop_table('order_items')
+    op.drop_table('orders')
+    op.drop_table('products')
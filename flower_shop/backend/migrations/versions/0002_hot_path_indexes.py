@@ -0,0 +1,51 @@
+"""hot path indexes
+
+Индексы под фактические запросы routes/orders.py и routes/products.py.
+На PostgreSQL создаются CONCURRENTLY, чтобы не блокировать запись в
+таблицы на время построения.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-10-20 12:10:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    # GET /orders/{telegram_id}: WHERE telegram_id = ? ORDER BY created_at DESC, id DESC
+    ('ix_orders_telegram_id_created_at', 'orders', ['telegram_id', 'created_at', 'id']),
+    # Админские выборки по статусу, новые сверху
+    ('ix_orders_status_created_at', 'orders', ['status', 'created_at']),
+    ('ix_orders_created_at', 'orders', ['created_at']),
+    # Загрузка позиций заказов (order.items)
+    ('ix_order_items_order_id', 'order_items', ['order_id']),
+    # GET /products?category=...: WHERE is_available AND category = ?
+    ('ix_products_category_available', 'products', ['category', 'is_available']),
+    # Постраничный каталог: WHERE is_available ORDER BY is_popular, created_at, id
+    ('ix_products_catalog_keyset', 'products', ['is_available', 'is_popular', 'created_at', 'id']),
+    ('ix_reminders_telegram_id', 'reminders', ['telegram_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
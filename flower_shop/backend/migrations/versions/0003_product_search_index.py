@@ -0,0 +1,78 @@
+"""product search index
+
+Текстовый индекс для поиска товаров в админке:
+- PostgreSQL: pg_trgm + GIN по name и description (ускоряет ILIKE '%...%');
+- SQLite: FTS5-таблица products_fts с токенизатором trigram, которую
+  синхронизируют триггеры.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-10-21 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRGM_INDEXES = [
+    ('ix_products_name_trgm', 'name'),
+    ('ix_products_description_trgm', 'description'),
+]
+
+SQLITE_FTS = [
+    """CREATE VIRTUAL TABLE products_fts USING fts5(
+        name, description, content='products', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER products_fts_au AFTER UPDATE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    "INSERT INTO products_fts(products_fts) VALUES ('rebuild')",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        with op.get_context().autocommit_block():
+            for name, column in TRGM_INDEXES:
+                op.create_index(
+                    name, 'products', [column],
+                    postgresql_using='gin',
+                    postgresql_ops={column: 'gin_trgm_ops'},
+                    postgresql_concurrently=True,
+                )
+    elif dialect == 'sqlite':
+        for statement in SQLITE_FTS:
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_context().dialect.name
+    if dialect == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, _ in TRGM_INDEXES:
+                op.drop_index(name, table_name='products', postgresql_concurrently=True)
+    elif dialect == 'sqlite':
+        for trigger in ('products_fts_ai', 'products_fts_ad', 'products_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS products_fts')
@@ -0,0 +1,44 @@
+"""notification outbox
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-10-22 09:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'notification_outbox',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('kind', sa.String(50), nullable=False),
+        sa.Column('chat_id', sa.BigInteger(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20)),
+        sa.Column('attempts', sa.Integer()),
+        sa.Column('next_attempt_at', sa.DateTime()),
+        sa.Column('locked_until', sa.DateTime()),
+        sa.Column('claim_token', sa.String(36)),
+        sa.Column('last_error', sa.Text()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('sent_at', sa.DateTime()),
+    )
+    op.create_index('ix_notification_outbox_due', 'notification_outbox', ['status', 'next_attempt_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notification_outbox_due', table_name='notification_outbox')
+    op.drop_table('notification_outbox')
@@ -0,0 +1,48 @@
+"""broadcasts and blocked users
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2025-10-24 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'broadcasts',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(20)),
+        sa.Column('last_telegram_id', sa.BigInteger()),
+        sa.Column('total_recipients', sa.Integer()),
+        sa.Column('sent_count', sa.Integer()),
+        sa.Column('failed_count', sa.Integer()),
+        sa.Column('blocked_count', sa.Integer()),
+        sa.Column('created_at', sa.DateTime()),
+        sa.Column('started_at', sa.DateTime()),
+        sa.Column('finished_at', sa.DateTime()),
+    )
+    op.create_table(
+        'blocked_users',
+        sa.Column('telegram_id', sa.BigInteger(), primary_key=True),
+        sa.Column('reason', sa.Text()),
+        sa.Column('blocked_at', sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('blocked_users')
+    op.drop_table('broadcasts')
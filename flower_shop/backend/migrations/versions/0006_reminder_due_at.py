@@ -0,0 +1,83 @@
+"""typed reminder due timestamps
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-10-27 11:00:00
+
+"""
+from datetime import datetime, time, timedelta
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, Sequence[str], None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Правило на момент миграции: в 9:00 по Нячангу (UTC+7) за remind_days_before дней
+REMIND_AT_LOCAL = time(9, 0)
+UTC_OFFSET = timedelta(hours=7)
+
+
+def due_at_for(event_date: str, days_before: int):
+    event = datetime.strptime(event_date.strip(), "%d.%m.%Y").date()
+    return datetime.combine(event - timedelta(days=days_before or 0), REMIND_AT_LOCAL) - UTC_OFFSET
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Простые ADD COLUMN без batch: на SQLite batch требует отражения таблицы и ломает --sql
+    op.add_column('reminders', sa.Column('is_yearly', sa.Boolean(), server_default=sa.false()))
+    op.add_column('reminders', sa.Column('due_at', sa.DateTime()))
+    op.add_column('reminders', sa.Column('last_sent_at', sa.DateTime()))
+    # CONCURRENTLY, как в 0002: не блокируем запись в reminders на время построения
+    with op.get_context().autocommit_block():
+        op.create_index('ix_reminders_active_due_at', 'reminders', ['is_active', 'due_at'],
+                        postgresql_concurrently=True)
+
+    if context.is_offline_mode():
+        # Дата события хранится строкой dd.mm.yyyy, разбор - в Python, нужна живая БД
+        op.execute("-- reminders.due_at backfill needs a live connection (dd.mm.yyyy parsed in Python), skipped in --sql mode")
+        return
+
+    # Заполняем due_at для существующих напоминаний; прошедшие и с неразборчивой датой отключаем
+    reminders = sa.table(
+        'reminders',
+        sa.column('id', sa.Integer()),
+        sa.column('event_date', sa.String()),
+        sa.column('remind_days_before', sa.Integer()),
+        sa.column('is_active', sa.Boolean()),
+        sa.column('due_at', sa.DateTime()),
+    )
+    bind = op.get_bind()
+    now = datetime.utcnow()
+    rows = bind.execute(
+        sa.select(reminders.c.id, reminders.c.event_date, reminders.c.remind_days_before)
+        .where(reminders.c.is_active == sa.true())
+    ).all()
+    for reminder_id, event_date, days_before in rows:
+        try:
+            due_at = due_at_for(event_date, days_before)
+        except (AttributeError, ValueError):
+            due_at = None
+        if due_at is not None and due_at <= now:
+            due_at = None
+        bind.execute(
+            reminders.update()
+            .where(reminders.c.id == reminder_id)
+            .values(due_at=due_at, is_active=due_at is not None)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_reminders_active_due_at', table_name='reminders', postgresql_concurrently=True)
+    with op.batch_alter_table('reminders') as batch:
+        batch.drop_column('last_sent_at')
+        batch.drop_column('due_at')
+        batch.drop_column('is_yearly')
@@ -0,0 +1,51 @@
+"""user order summaries read-model
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-11-03 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, Sequence[str], None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    summaries = op.create_table(
+        'user_order_summaries',
+        sa.Column('telegram_id', sa.BigInteger(), primary_key=True),
+        sa.Column('orders_count', sa.Integer()),
+        sa.Column('recent_orders', sa.Text()),
+        sa.Column('last_order_id', sa.Integer()),
+        sa.Column('last_order_items', sa.Text()),
+        sa.Column('updated_at', sa.DateTime()),
+    )
+
+    # Строки для тех, кто уже заказывал: один INSERT ... SELECT, валидный и в --sql.
+    # recent_orders = NULL - сводка не собрана, ее соберет первое чтение
+    # (utils/order_summary.py: load_order_summary) или следующий заказ
+    orders = sa.table(
+        'orders',
+        sa.column('id', sa.Integer()),
+        sa.column('telegram_id', sa.Integer()),
+    )
+    op.execute(summaries.insert().from_select(
+        ['telegram_id', 'orders_count', 'updated_at'],
+        sa.select(orders.c.telegram_id, sa.func.count(orders.c.id), sa.func.current_timestamp())
+        .where(orders.c.telegram_id.isnot(None))
+        .group_by(orders.c.telegram_id),
+    ))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('user_order_summaries')
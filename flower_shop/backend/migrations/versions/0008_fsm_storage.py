@@ -0,0 +1,38 @@
+"""bot fsm storage
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2025-11-10 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, Sequence[str], None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Раньше таблицу создавал сам бот (bot/storage.py, create_all при первом обращении)
+    if not context.is_offline_mode() and sa.inspect(op.get_bind()).has_table('fsm_storage'):
+        return
+    op.create_table(
+        'fsm_storage',
+        sa.Column('key', sa.String(255), primary_key=True),
+        sa.Column('state', sa.String(255)),
+        sa.Column('data', sa.Text()),
+        sa.Column('state_expires_at', sa.DateTime()),
+        sa.Column('data_expires_at', sa.DateTime()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('fsm_storage')
@@ -0,0 +1,35 @@
+"""processed telegram updates for dedup
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2025-11-12 10:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, Sequence[str], None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Принятые update_id для проверки повторов между воркерами без Redis (bot/dedup.py)
+    op.create_table(
+        'processed_updates',
+        sa.Column('key', sa.String(64), primary_key=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_processed_updates_created_at', 'processed_updates', ['created_at'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_processed_updates_created_at', table_name='processed_updates')
+    op.drop_table('processed_updates')
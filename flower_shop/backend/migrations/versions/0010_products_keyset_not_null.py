@@ -0,0 +1,50 @@
+"""not null products keyset columns
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2025-11-14 10:00:00
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, Sequence[str], None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Строкам без даты создания - самая ранняя дата: в выдаче "новые первыми" они в конце
+UNKNOWN_CREATED_AT = datetime(1970, 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Курсор каталога (is_popular, created_at, id) сравнивается как кортеж:
+    # сравнение с NULL не истинно, и пагинация обрывалась на первой такой строке
+    products = sa.table(
+        'products',
+        sa.column('is_popular', sa.Boolean()),
+        sa.column('created_at', sa.DateTime()),
+    )
+    op.execute(products.update().where(products.c.is_popular.is_(None)).values(is_popular=False))
+    op.execute(products.update().where(products.c.created_at.is_(None)).values(created_at=UNKNOWN_CREATED_AT))
+
+    if op.get_context().dialect.name == 'sqlite':
+        # SQLite меняет NOT NULL только пересозданием таблицы, а оно удалило бы
+        # триггеры FTS (0003); новые строки заполняют ORM-умолчания
+        return
+    op.alter_column('products', 'is_popular', existing_type=sa.Boolean(), nullable=False)
+    op.alter_column('products', 'created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == 'sqlite':
+        return
+    op.alter_column('products', 'created_at', existing_type=sa.DateTime(), nullable=True)
+    op.alter_column('products', 'is_popular', existing_type=sa.Boolean(), nullable=True)
@@ -0,0 +1,42 @@
+"""not null orders created_at
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2025-11-14 11:00:00
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, Sequence[str], None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Заказам без даты создания - самая ранняя дата: в истории "новые первыми" они в конце
+UNKNOWN_CREATED_AT = datetime(1970, 1, 1)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Курсор истории заказов (created_at, id) сравнивается как кортеж:
+    # с NULL в created_at пагинация обрывалась на первой такой строке
+    orders = sa.table('orders', sa.column('created_at', sa.DateTime()))
+    op.execute(orders.update().where(orders.c.created_at.is_(None)).values(created_at=UNKNOWN_CREATED_AT))
+
+    if op.get_context().dialect.name == 'sqlite':
+        # SQLite меняет NOT NULL только пересозданием таблицы; новые строки заполняют ORM-умолчания
+        return
+    op.alter_column('orders', 'created_at', existing_type=sa.DateTime(), nullable=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == 'sqlite':
+        return
+    op.alter_column('orders', 'created_at', existing_type=sa.DateTime(), nullable=True)
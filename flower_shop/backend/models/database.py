@@ -1,12 +1,13 @@
 """
 Модели базы данных для магазина цветов
 """
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, ForeignKey, Index, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from datetime import datetime
+import asyncio
 import os
 
 Base = declarative_base()
@@ -26,10 +27,69 @@ async def get_db():
     async with async_session() as session:
         yield session
 
+# Миграции Alembic (backend/migrations)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+# Ревизия, соответствующая схеме, которую раньше создавал create_all
+BASELINE_REVISION = '0001'
+
+def alembic_config(connection=None):
+    """Конфигурация Alembic без alembic.ini"""
+    from alembic.config import Config
+    config = Config()
+    config.set_main_option('script_location', MIGRATIONS_DIR)
+    config.set_main_option('sqlalchemy.url', DATABASE_URL.replace('%', '%%'))
+    config.attributes['metadata'] = Base.metadata
+    if connection is not None:
+        config.attributes['connection'] = connection
+    return config
+
+def _upgrade(connection, revision):
+    from alembic import command
+    tables = inspect(connection).get_table_names()
+    # Транзакциями дальше управляет Alembic (нужно для CREATE INDEX CONCURRENTLY)
+    connection.commit()
+    config = alembic_config(connection)
+    if 'alembic_version' not in tables and 'products' in tables:
+        # База создана через create_all до появления миграций
+        command.stamp(config, BASELINE_REVISION)
+    command.upgrade(config, revision)
+
+async def run_migrations(revision: str = 'head', bind=None):
+    """Применить миграции до указанной ревизии"""
+    async with (bind or engine).connect() as conn:
+        await conn.run_sync(_upgrade, revision)
+
 async def create_tables():
-    """Создание таблиц в базе данных"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    """Создание/обновление таблиц в базе данных через миграции"""
+    await run_migrations()
+
+# Сколько воркер ждет, пока ведущий применит миграции
+MIGRATION_WAIT_TIMEOUT = float(os.getenv('MIGRATION_WAIT_TIMEOUT', '120'))
+
+def head_revision():
+    from alembic.script import ScriptDirectory
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+def _current_revision(connection):
+    from alembic.runtime.migration import MigrationContext
+    return MigrationContext.configure(connection).get_current_revision()
+
+async def wait_for_migrations(timeout: float = MIGRATION_WAIT_TIMEOUT, interval: float = 1.0, bind=None) -> bool:
+    """Дождаться, пока схема дойдет до head (миграции применяет другой процесс)"""
+    loop = asyncio.get_running_loop()
+    head = head_revision()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            async with (bind or engine).connect() as conn:
+                if await conn.run_sync(_current_revision) == head:
+                    return True
+        except Exception:
+            # БД еще недоступна - ждем так же, как незавершенные миграции
+            pass
+        if loop.time() >= deadline:
+            return False
+        await asyncio.sleep(interval)
 
 class Product(Base):
     __tablename__ = 'products'
@@ -41,8 +101,14 @@ class Product(Base):
     price = Column(Integer, nullable=False)  # В VND
     photo_url = Column(String(500))
     is_available = Column(Boolean, default=True)
-    is_popular = Column(Boolean, default=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # NOT NULL: ключ курсора каталога (routes/products.py), миграция 0010
+    is_popular = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    __table_args__ = (
+        Index('ix_products_category_available', 'category', 'is_available'),
+        Index('ix_products_catalog_keyset', 'is_available', 'is_popular', 'created_at', 'id'),
+    )
 
 class Order(Base):
     __tablename__ = 'orders'
@@ -63,15 +129,22 @@ class Order(Base):
     delivery_cost = Column(Integer)
     total = Column(Integer)
     status = Column(String(50), default='pending')  # pending, confirmed, making, delivering, delivered, cancelled
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # NOT NULL: ключ курсора истории заказов (routes/orders.py), миграция 0011
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     
     items = relationship('OrderItem', back_populates='order')
+    
+    __table_args__ = (
+        Index('ix_orders_telegram_id_created_at', 'telegram_id', 'created_at', 'id'),
+        Index('ix_orders_status_created_at', 'status', 'created_at'),
+        Index('ix_orders_created_at', 'created_at'),
+    )
 
 class OrderItem(Base):
     __tablename__ = 'order_items'
     
     id = Column(Integer, primary_key=True)
-    order_id = Column(Integer, ForeignKey('orders.id'))
+    order_id = Column(Integer, ForeignKey('orders.id'), index=True)
     product_id = Column(Integer, ForeignKey('products.id'))
     product_name = Column(String(200))
     size = Column(String(20), default='standard')  # standard, large, xl
@@ -85,9 +158,74 @@ class Reminder(Base):
     __tablename__ = 'reminders'
     
     id = Column(Integer, primary_key=True)
-    telegram_id = Column(Integer, nullable=False)
+    telegram_id = Column(Integer, nullable=False, index=True)
     event_name = Column(String(200), nullable=False)
     event_date = Column(String(50), nullable=False)  # DD.MM.YYYY
     remind_days_before = Column(Integer, default=3)  # За сколько дней напомнить
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    is_yearly = Column(Boolean, default=False)  # дни рождения и годовщины
+    due_at = Column(DateTime)  # когда отправить (UTC); считается из event_date
+    last_sent_at = Column(DateTime)
+    
+    __table_args__ = (
+        # Планировщик читает только диапазон due_at ближайшего горизонта
+        Index('ix_reminders_active_due_at', 'is_active', 'due_at'),
+    )
+
+class NotificationOutbox(Base):
+    """Исходящие уведомления: пишутся в одной транзакции с заказом, отправляются в фоне"""
+    __tablename__ = 'notification_outbox'
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)  # order_admin, order_client
+    chat_id = Column(BigInteger, nullable=False)
+    payload = Column(Text, nullable=False)  # JSON
+    status = Column(String(20), default='pending')  # pending, sending, sent, failed
+    attempts = Column(Integer, default=0)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow)
+    locked_until = Column(DateTime)  # аренда строки отправителем
+    claim_token = Column(String(36))  # кто арендовал строку
+    last_error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime)
+    
+    __table_args__ = (
+        Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),
+    )
+
+class Broadcast(Base):
+    """Рассылка всем, кто когда-либо заказывал"""
+    __tablename__ = 'broadcasts'
+    
+    id = Column(Integer, primary_key=True)
+    text = Column(Text, nullable=False)
+    status = Column(String(20), default='pending')  # draft, pending, running, paused, completed, cancelled
+    # Все получатели с telegram_id <= last_telegram_id обработаны (получатели идут по возрастанию)
+    last_telegram_id = Column(BigInteger, default=0)
+    total_recipients = Column(Integer, default=0)
+    sent_count = Column(Integer, default=0)
+    failed_count = Column(Integer, default=0)
+    blocked_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class BlockedUser(Base):
+    """Пользователи, заблокировавшие бота (403): рассылки их пропускают"""
+    __tablename__ = 'blocked_users'
+    
+    telegram_id = Column(BigInteger, primary_key=True)
+    reason = Column(Text)
+    blocked_at = Column(DateTime, default=datetime.utcnow)
+
+class UserOrderSummary(Base):
+    """Сводка заказов пользователя для бота: пересчитывается при записи заказа, читается по ключу"""
+    __tablename__ = 'user_order_summaries'
+    
+    telegram_id = Column(BigInteger, primary_key=True)
+    orders_count = Column(Integer, default=0)
+    recent_orders = Column(Text)  # JSON: последние заказы без позиций
+    last_order_id = Column(Integer)
+    last_order_items = Column(Text)  # JSON: позиции последнего заказа для повтора
+    updated_at = Column(DateTime, default=datetime.utcnow)
@@ -3,94 +3,168 @@ API роуты для заказов
 """
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, insert, func, tuple_
+from sqlalchemy.orm import selectinload
 from ..models.database import Order, OrderItem, Product, Base, get_db
-from ..utils.telegram_notify import send_order_notification
+from ..utils.outbox import enqueue_order_notifications, outbox_dispatcher
+from ..utils.order_summary import load_order_summary, refresh_order_summary
+from ..utils.pricing import load_products, parse_items, price_order
+from ..utils.pagination import encode_cursor, decode_cursor, parse_datetime, page_size
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+async def insert_order(db: AsyncSession, values: dict, items: list) -> int:
+    """Заказ (INSERT ... RETURNING id) и все позиции одним пакетом (executemany)"""
+    order_id = await db.scalar(insert(Order).values(**values).returning(Order.id))
+    if items:
+        await db.execute(insert(OrderItem), [{**item, "order_id": order_id} for item in items])
+    return order_id
+
 @router.post("/orders")
 async def create_order(order_data: dict, db: AsyncSession = Depends(get_db)):
     """Создать заказ"""
     try:
-        # Создаем заказ
-        order = Order(
-            telegram_id=order_data['telegram_id'],
-            telegram_username=order_data.get('telegram_username'),
-            name=order_data['name'],
-            phone=order_data['phone'],
-            address=order_data['address'],
-            latitude=order_data.get('latitude'),
-            longitude=order_data.get('longitude'),
-            delivery_date=order_data['delivery_date'],
-            delivery_time=order_data['delivery_time'],
-            card_text=order_data.get('card_text'),
-            is_anonymous=order_data.get('is_anonymous', False),
-            items_total=order_data['items_total'],
-            delivery_cost=order_data['delivery_cost'],
-            total=order_data['total']
-        )
+        # Цены и итоги считаем по товарам в БД, присланные клиентом значения игнорируем
+        lines = parse_items(order_data.get('items') or [])
+        products = await load_products(db, (line['product_id'] for line in lines))
+        priced = price_order(lines, products)
+        if order_data.get('total') is not None and order_data.get('total') != priced.total:
+            logger.warning(
+                f"Сумма заказа от клиента {order_data.get('total')} не совпадает с расчетом {priced.total} "
+                f"(telegram_id={order_data.get('telegram_id')})"
+            )
         
-        db.add(order)
-        await db.flush()  # Получаем ID заказа
+        order_id = await insert_order(db, {
+            "telegram_id": order_data['telegram_id'],
+            "telegram_username": order_data.get('telegram_username'),
+            "name": order_data['name'],
+            "phone": order_data['phone'],
+            "address": order_data['address'],
+            "latitude": order_data.get('latitude'),
+            "longitude": order_data.get('longitude'),
+            "delivery_date": order_data['delivery_date'],
+            "delivery_time": order_data['delivery_time'],
+            "card_text": order_data.get('card_text'),
+            "is_anonymous": order_data.get('is_anonymous', False),
+            "items_total": priced.items_total,
+            "delivery_cost": priced.delivery_cost,
+            "total": priced.total,
+        }, priced.items)
         
-        # Добавляем товары
-        for item in order_data['items']:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item['product_id'],
-                product_name=item['product_name'],
-                size=item.get('size', 'standard'),
-                price=item['price'],
-                quantity=item['quantity']
-            )
-            db.add(order_item)
+        # Уведомления пишем в outbox в той же транзакции, отправит их диспетчер
+        enqueue_order_notifications(db, order_id, {
+            **order_data,
+            "items": priced.items,
+            "items_total": priced.items_total,
+            "delivery_cost": priced.delivery_cost,
+            "total": priced.total,
+        })
+        # Сводка для кнопок бота обновляется вместе с заказом
+        await refresh_order_summary(db, order_data['telegram_id'])
         
         await db.commit()
+        outbox_dispatcher.wake()
         
-        # Отправляем уведомления
-        await send_order_notification(order.id, order_data)
-        
-        return {"order_id": order.id, "message": "Order created successfully"}
+        return {
+            "order_id": order_id,
+            "items_total": priced.items_total,
+            "delivery_cost": priced.delivery_cost,
+            "total": priced.total,
+            "message": "Order created successfully"
+        }
         
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=400, detail=str(e))
 
+def order_item_to_dict(item) -> dict:
+    return {
+        "product_name": item.product_name,
+        "size": item.size,
+        "price": item.price,
+        "quantity": item.quantity
+    }
+
+@router.get("/orders/{telegram_id}/summary")
+async def get_order_summary(telegram_id: int, db: AsyncSession = Depends(get_db)):
+    """Сводка заказов для бота: последние заказы и позиции последнего (для повтора)"""
+    return await load_order_summary(db, telegram_id)
+
 @router.get("/orders/{telegram_id}")
-async def get_user_orders(telegram_id: int, db: AsyncSession = Depends(get_db)):
-    """Получить заказы пользователя"""
-    try:
-        result = await db.execute(
-            select(Order)
-            .where(Order.telegram_id == telegram_id)
-            .order_by(Order.created_at.desc())
+async def get_user_orders(
+    telegram_id: int,
+    limit: int = None,
+    cursor: str = None,
+    summary: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """Получить заказы пользователя
+    
+    limit/cursor - постраничная выдача {"items", "next_cursor"} по (created_at, id);
+    summary=true - без позиций заказа, только их количество.
+    """
+    paginated = limit is not None or cursor is not None
+    
+    if summary:
+        items_count = (
+            select(func.count(OrderItem.id))
+            .where(OrderItem.order_id == Order.id)
+            .scalar_subquery()
+            .label("items_count")
         )
-        orders = result.scalars().all()
-        
-        return [
-            {
-                "id": order.id,
-                "status": order.status,
-                "total": order.total,
-                "delivery_date": order.delivery_date,
-                "delivery_time": order.delivery_time,
-                "created_at": order.created_at.isoformat(),
-                "items": [
-                    {
-                        "product_name": item.product_name,
-                        "size": item.size,
-                        "price": item.price,
-                        "quantity": item.quantity
-                    }
-                    for item in order.items
-                ]
-            }
-            for order in orders
-        ]
+        query = select(
+            Order.id, Order.status, Order.total, Order.delivery_date,
+            Order.delivery_time, Order.created_at, items_count,
+        )
+    else:
+        # Все позиции одним дополнительным запросом (IN), без lazy load на каждый заказ
+        query = select(Order).options(selectinload(Order.items))
+    
+    query = query.where(Order.telegram_id == telegram_id).order_by(Order.created_at.desc(), Order.id.desc())
+    
+    if cursor:
+        created_at, last_id = decode_cursor(cursor, 2)
+        if not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(Order.created_at, Order.id) < tuple_(parse_datetime(created_at), last_id))
+    if paginated:
+        size = page_size(limit)
+        query = query.limit(size + 1)
+    
+    try:
+        result = await db.execute(query)
+        orders = result.all() if summary else result.scalars().all()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    next_cursor = None
+    if paginated and len(orders) > size:
+        orders = orders[:size]
+        next_cursor = encode_cursor([orders[-1].created_at, orders[-1].id])
+    
+    items = []
+    for order in orders:
+        data = {
+            "id": order.id,
+            "status": order.status,
+            "total": order.total,
+            "delivery_date": order.delivery_date,
+            "delivery_time": order.delivery_time,
+            "created_at": order.created_at.isoformat() if order.created_at else None,
+        }
+        if summary:
+            data["items_count"] = order.items_count
+        else:
+            data["items"] = [order_item_to_dict(item) for item in order.items]
+        items.append(data)
+    
+    if paginated:
+        return {"items": items, "next_cursor": next_cursor}
+    return items
 
 @router.patch("/orders/{order_id}/status")
 async def update_order_status(order_id: int, status: str, db: AsyncSession = Depends(get_db)):
@@ -103,6 +177,8 @@ async def update_order_status(order_id: int, status: str, db: AsyncSession = Dep
             raise HTTPException(status_code=404, detail="Order not found")
         
         order.status = status
+        await db.flush()
+        await refresh_order_summary(db, order.telegram_id)
         await db.commit()
         
         return {"message": "Order status updated"}
@@ -1,10 +1,13 @@
 """
 API роуты для товаров
 """
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from ..models.database import Product, Base, get_db
+from sqlalchemy import select, tuple_
+from ..models.database import Product, Base, get_db, async_session
+from ..utils.catalog_cache import catalog_cache, PRODUCT_FIELDS
+from ..utils.http_cache import cached_json_response, dumps_json, RawJSONResponse
+from ..utils.pagination import encode_cursor, decode_cursor, parse_datetime, page_size
 import os
 
 router = APIRouter()
@@ -15,55 +18,136 @@ async def create_tables():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+MAX_SEARCH_RESULTS = 50
+# Сколько товаров можно проверить одним запросом
+MAX_LOOKUP_IDS = 200
+
+# Ключ сортировки страниц каталога: популярные, затем новые
+CATALOG_SORT_KEY = (Product.is_popular, Product.created_at, Product.id)
+
 @router.get("/products")
-async def get_products(category: str = None, popular: bool = None, db: AsyncSession = Depends(get_db)):
+async def get_products(
+    request: Request,
+    category: str = None,
+    popular: bool = None,
+    limit: int = None,
+    cursor: str = None,
+    fields: str = None,
+    ids: str = None,
+):
     """Получить список товаров"""
+    # ?ids=1,2,3 - проверка корзины одним запросом
+    if ids is not None:
+        return await lookup_products(parse_ids(ids.split(",")))
+    
+    # Постраничный режим: только нужные колонки прямо из БД
+    if limit is not None or cursor or fields:
+        return await get_products_page(category, popular, limit, cursor, fields)
+    
     try:
-        query = select(Product).where(Product.is_available == True)
-        
-        if category:
-            query = query.where(Product.category == category)
-        
-        if popular is not None:
-            query = query.where(Product.is_popular == popular)
-        
-        result = await db.execute(query)
-        products = result.scalars().all()
-        
-        return [
-            {
-                "id": p.id,
-                "name": p.name,
-                "category": p.category,
-                "description": p.description,
-                "price": p.price,
-                "photo_url": p.photo_url,
-                "is_popular": p.is_popular
-            }
-            for p in products
-        ]
+        snapshot = await catalog_cache.get()
+        # Готовые байты выборки; при совпадении If-None-Match - 304 без тела
+        return cached_json_response(request, snapshot.encoded_view(category, popular))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def parse_ids(raw_ids) -> list:
+    """Список ID из запроса с проверкой размера"""
+    try:
+        product_ids = [int(str(value).strip()) for value in raw_ids if str(value).strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be integers")
+    if len(product_ids) > MAX_LOOKUP_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many ids (max {MAX_LOOKUP_IDS})")
+    return product_ids
+
+async def lookup_products(product_ids: list):
+    """Актуальные цены и наличие для набора товаров (из снимка каталога)"""
+    try:
+        snapshot = await catalog_cache.get()
+        return RawJSONResponse(dumps_json(snapshot.lookup(product_ids)))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/products/lookup")
+async def lookup_products_post(data: dict):
+    """Проверка корзины: {"ids": [1, 2, 3]} -> found / unavailable / missing"""
+    raw_ids = data.get("ids")
+    if not isinstance(raw_ids, list):
+        raise HTTPException(status_code=400, detail="ids must be a list")
+    return await lookup_products(parse_ids(raw_ids))
+
+async def get_products_page(category, popular, limit, cursor, fields):
+    """Страница каталога по курсору (is_popular, created_at, id) с проекцией полей"""
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in PRODUCT_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        output_fields = ["id"] + [f for f in requested if f != "id"]
+    else:
+        output_fields = list(PRODUCT_FIELDS)
+    
+    size = page_size(limit)
+    sort_names = [c.key for c in CATALOG_SORT_KEY]
+    columns = sort_names + [f for f in output_fields if f not in sort_names]
+    
+    query = (
+        select(*(getattr(Product, name) for name in columns))
+        .where(Product.is_available == True)
+        .order_by(*(c.desc() for c in CATALOG_SORT_KEY))
+        .limit(size + 1)
+    )
+    if category:
+        query = query.where(Product.category == category)
+    if popular is not None:
+        query = query.where(Product.is_popular == popular)
+    if cursor:
+        is_popular, created_at, last_id = decode_cursor(cursor, len(CATALOG_SORT_KEY))
+        if not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(
+            tuple_(*CATALOG_SORT_KEY) < tuple_(bool(is_popular), parse_datetime(created_at), last_id)
+        )
+    
+    try:
+        async with async_session() as db:
+            result = await db.execute(query)
+            rows = result.all()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        last = rows[-1]
+        next_cursor = encode_cursor([bool(last.is_popular), last.created_at, last.id])
+    
+    return {
+        "items": [{name: getattr(row, name) for name in output_fields} for row in rows],
+        "next_cursor": next_cursor,
+    }
+
+@router.get("/products/search")
+async def search_products(q: str = "", limit: int = 20):
+    """Поиск товаров для подсказок при наборе (индекс в памяти)"""
+    try:
+        products = await catalog_cache.search(q, min(max(limit, 1), MAX_SEARCH_RESULTS))
+        return RawJSONResponse(dumps_json(products))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/products/{product_id}")
-async def get_product(product_id: int, db: AsyncSession = Depends(get_db)):
+async def get_product(product_id: int, request: Request):
     """Получить товар по ID"""
     try:
-        result = await db.execute(select(Product).where(Product.id == product_id))
-        product = result.scalar_one_or_none()
+        snapshot = await catalog_cache.get()
+        encoded = snapshot.encoded_products.get(product_id)
         
-        if not product:
+        if not encoded:
             raise HTTPException(status_code=404, detail="Product not found")
         
-        return {
-            "id": product.id,
-            "name": product.name,
-            "category": product.category,
-            "description": product.description,
-            "price": product.price,
-            "photo_url": product.photo_url,
-            "is_popular": product.is_popular
-        }
+        return cached_json_response(request, encoded)
     except HTTPException:
         raise
     except Exception as e:
@@ -77,6 +161,7 @@ async def create_product(product_data: dict, db: AsyncSession = Depends(get_db))
         db.add(product)
         await db.commit()
         await db.refresh(product)
+        await catalog_cache.refresh()
         return {"id": product.id, "message": "Product created"}
     except Exception as e:
         await db.rollback()
@@ -96,6 +181,7 @@ async def update_product(product_id: int, data: dict, db: AsyncSession = Depends
             setattr(product, key, value)
         
         await db.commit()
+        await catalog_cache.refresh()
         return {"message": "Product updated"}
     except HTTPException:
         raise
@@ -115,6 +201,7 @@ async def delete_product(product_id: int, db: AsyncSession = Depends(get_db)):
         
         await db.delete(product)
         await db.commit()
+        await catalog_cache.refresh()
         return {"message": "Product deleted"}
     except HTTPException:
         raise
@@ -0,0 +1,81 @@
+"""
+API роуты для напоминаний о событиях
+"""
+from datetime import datetime
+
+from fastapi import APIRouter, HTTPException, Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from ..models.database import Reminder, get_db
+from ..utils.reminders import (
+    MAX_REMIND_DAYS_BEFORE, compute_due_at, parse_event_date, reminder_scheduler,
+)
+
+router = APIRouter()
+
+def reminder_to_dict(reminder: Reminder) -> dict:
+    return {
+        "id": reminder.id,
+        "event_name": reminder.event_name,
+        "event_date": reminder.event_date,
+        "remind_days_before": reminder.remind_days_before,
+        "is_yearly": bool(reminder.is_yearly),
+        "is_active": bool(reminder.is_active),
+        "due_at": reminder.due_at.isoformat() if reminder.due_at else None,
+    }
+
+@router.post("/reminders")
+async def create_reminder(data: dict, db: AsyncSession = Depends(get_db)):
+    """Создать напоминание; due_at считается на сервере"""
+    try:
+        telegram_id = int(data['telegram_id'])
+        event_name = str(data['event_name']).strip()
+        event_date = parse_event_date(data['event_date'])
+        days_before = int(data.get('remind_days_before', 3))
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="telegram_id, event_name and event_date (DD.MM.YYYY) are required")
+    if not event_name or len(event_name) > 200:
+        raise HTTPException(status_code=400, detail="event_name must be 1..200 characters")
+    if not 0 <= days_before <= MAX_REMIND_DAYS_BEFORE:
+        raise HTTPException(status_code=400, detail=f"remind_days_before must be 0..{MAX_REMIND_DAYS_BEFORE}")
+
+    is_yearly = bool(data.get('is_yearly', False))
+    due_at = compute_due_at(event_date, days_before, is_yearly, datetime.utcnow())
+    if due_at is None:
+        raise HTTPException(status_code=400, detail="Reminder time is in the past")
+
+    reminder = Reminder(
+        telegram_id=telegram_id,
+        event_name=event_name,
+        event_date=event_date.strftime("%d.%m.%Y"),
+        remind_days_before=days_before,
+        is_yearly=is_yearly,
+        is_active=True,
+        due_at=due_at,
+    )
+    db.add(reminder)
+    await db.commit()
+    reminder_scheduler.schedule(reminder.id, due_at)
+    return reminder_to_dict(reminder)
+
+@router.get("/reminders/{telegram_id}")
+async def get_user_reminders(telegram_id: int, db: AsyncSession = Depends(get_db)):
+    """Активные напоминания пользователя, ближайшие первыми"""
+    result = await db.execute(
+        select(Reminder)
+        .where(Reminder.telegram_id == telegram_id, Reminder.is_active == True)  # noqa: E712
+        .order_by(Reminder.due_at, Reminder.id)
+    )
+    return [reminder_to_dict(r) for r in result.scalars().all()]
+
+@router.delete("/reminders/{reminder_id}")
+async def delete_reminder(reminder_id: int, telegram_id: int, db: AsyncSession = Depends(get_db)):
+    """Отключить напоминание (только владелец)"""
+    reminder = await db.get(Reminder, reminder_id)
+    if not reminder or reminder.telegram_id != telegram_id:
+        raise HTTPException(status_code=404, detail="Reminder not found")
+    reminder.is_active = False
+    reminder.due_at = None
+    await db.commit()
+    reminder_scheduler.schedule(reminder_id, None)
+    return {"message": "Reminder deleted"}
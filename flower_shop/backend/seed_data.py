@@ -8,15 +8,14 @@ import os
 # Добавляем путь к backend
 sys.path.append(os.path.join(os.path.dirname(__file__)))
 
-from models.database import Product, Base, engine, async_session
+from models.database import Product, Base, engine, async_session, create_tables
 from sqlalchemy import select
 
 async def add_test_products():
     """Добавляем тестовые товары"""
     
-    # Создаем таблицы
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Создаем таблицы (миграции)
+    await create_tables()
     
     async with async_session() as db:
         try:
@@ -0,0 +1,341 @@
+"""
+Рассылки всем клиентам, которые когда-либо заказывали
+
+Получатели (уникальные Order.telegram_id по возрастанию) читаются потоком
+через серверный курсор пачками по BROADCAST_CHUNK_SIZE (на SQLite -
+keyset-страницами). Сообщения уходят
+через планировщик отправки в очереди рассылок, поэтому лимиты Bot API
+соблюдаются, а клиентские уведомления идут вперед. После каждой пачки в
+broadcasts сохраняется контрольная точка (последний telegram_id и
+счетчики): после перезапуска рассылка продолжается со следующего
+получателя. Повторно сообщение могут получить только те, кому оно ушло в
+пачке, прерванной падением процесса.
+
+Рассылки отправляет только ведущий процесс (utils/leader.py): через его
+планировщик проходит глобальный лимит Bot API. Админка в любом воркере
+лишь меняет статус в БД: pending - запустить, paused - остановить. Ведущий
+раз в BROADCAST_POLL_INTERVAL секунд подхватывает pending/running, а
+раннер перечитывает статус перед каждой пачкой.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import select, update, exists, func
+
+from ..models.database import Broadcast, BlockedUser, Order, async_session
+from .send_scheduler import PRIORITY_BULK
+from .telegram_notify import send_scheduler
+
+logger = logging.getLogger(__name__)
+
+BROADCAST_CHUNK_SIZE = int(os.getenv('BROADCAST_CHUNK_SIZE', '500'))
+# Сколько сообщений рассылки одновременно ждут в планировщике
+BROADCAST_CONCURRENCY = int(os.getenv('BROADCAST_CONCURRENCY', '30'))
+# Окно для расчета текущей скорости (сек)
+THROUGHPUT_WINDOW = 10
+# Сколько ждать завершения текущей пачки при остановке процесса (сек)
+BROADCAST_STOP_TIMEOUT = 20
+# Как часто ведущий проверяет запрошенные в админке рассылки (сек)
+BROADCAST_POLL_INTERVAL = float(os.getenv('BROADCAST_POLL_INTERVAL', '5'))
+# Статусы, которые отправляет ведущий
+ACTIVE_STATUSES = ('pending', 'running')
+
+
+async def send_bulk(chat_id: int, text: str):
+    return await send_scheduler.deliver(chat_id, text, PRIORITY_BULK)
+
+
+def recipients_query(after_telegram_id: int):
+    """Уникальные получатели после контрольной точки, без заблокировавших бота"""
+    return (
+        select(Order.telegram_id)
+        .distinct()
+        .where(
+            Order.telegram_id > after_telegram_id,
+            ~exists().where(BlockedUser.telegram_id == Order.telegram_id),
+        )
+        .order_by(Order.telegram_id)
+    )
+
+
+class BroadcastRunner:
+    """Отправка одной рассылки с контрольными точками и статистикой на лету"""
+
+    def __init__(
+        self,
+        broadcast_id: int,
+        session_factory=async_session,
+        send: Callable[[int, str], Awaitable] = send_bulk,
+        chunk_size: int = BROADCAST_CHUNK_SIZE,
+        concurrency: int = BROADCAST_CONCURRENCY,
+    ):
+        self.broadcast_id = broadcast_id
+        self.session_factory = session_factory
+        self.send = send
+        self.chunk_size = chunk_size
+        self.concurrency = concurrency
+        self.sent = 0
+        self.failed = 0
+        self.blocked = 0
+        self.started = time.monotonic()
+        self._recent = deque()
+        self._stop_requested = False
+
+    def request_stop(self) -> None:
+        """Остановиться после текущей пачки (контрольная точка сохранится)"""
+        self._stop_requested = True
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._recent and self._recent[0] < now - THROUGHPUT_WINDOW:
+            self._recent.popleft()
+        elapsed = max(now - self.started, 1e-9)
+        return {
+            "sent": self.sent,
+            "failed": self.failed,
+            "blocked": self.blocked,
+            "elapsed_seconds": round(elapsed, 1),
+            "messages_per_second": round((self.sent + self.failed + self.blocked) / elapsed, 2),
+            "current_messages_per_second": round(len(self._recent) / min(elapsed, THROUGHPUT_WINDOW), 2),
+        }
+
+    async def _status(self) -> Optional[str]:
+        async with self.session_factory() as db:
+            return await db.scalar(select(Broadcast.status).where(Broadcast.id == self.broadcast_id))
+
+    async def run(self) -> str:
+        """Отправить рассылку до конца или до остановки; возвращает итоговый статус"""
+        async with self.session_factory() as db:
+            broadcast = await db.get(Broadcast, self.broadcast_id)
+            if broadcast is None:
+                raise ValueError(f"Broadcast {self.broadcast_id} not found")
+            if broadcast.status not in ACTIVE_STATUSES:
+                # Поставлена на паузу или отменена, пока ждала ведущего
+                return broadcast.status
+            text, checkpoint = broadcast.text, broadcast.last_telegram_id or 0
+            broadcast.status = 'running'
+            if broadcast.started_at is None:
+                broadcast.started_at = datetime.utcnow()
+                broadcast.total_recipients = await db.scalar(
+                    select(func.count()).select_from(recipients_query(0).subquery())
+                )
+            await db.commit()
+
+        logger.info(f"📣 Рассылка #{self.broadcast_id} продолжается после telegram_id={checkpoint}")
+        async with aclosing(self._recipient_chunks(checkpoint)) as chunks:
+            async for chat_ids in chunks:
+                # Пауза или отмена из админки могла прийти в другой воркер - только через БД
+                status = await self._status()
+                if status != 'running':
+                    logger.info(f"⏸ Рассылка #{self.broadcast_id}: статус {status}, {self.stats()}")
+                    return status
+                await self._process_chunk(text, chat_ids)
+                if self._stop_requested:
+                    logger.info(f"⏸ Рассылка #{self.broadcast_id} остановлена: {self.stats()}")
+                    return 'paused'
+
+        async with self.session_factory() as db:
+            # Пауза, пришедшая во время последней пачки, не затирается
+            result = await db.execute(
+                update(Broadcast)
+                .where(Broadcast.id == self.broadcast_id, Broadcast.status == 'running')
+                .values(status='completed', finished_at=datetime.utcnow())
+            )
+            await db.commit()
+        if result.rowcount == 0:
+            return await self._status()
+        logger.info(f"✅ Рассылка #{self.broadcast_id} завершена: {self.stats()}")
+        return 'completed'
+
+    async def _recipient_chunks(self, checkpoint: int):
+        """Пачки получателей после контрольной точки"""
+        async with self.session_factory() as reader:
+            if reader.bind.dialect.name == 'postgresql':
+                # Серверный курсор в отдельной сессии: живет всю рассылку, записи идут в других
+                result = await reader.stream(
+                    recipients_query(checkpoint).execution_options(yield_per=self.chunk_size)
+                )
+                try:
+                    async for chunk in result.partitions():
+                        yield [row[0] for row in chunk]
+                finally:
+                    await result.close()
+                return
+
+        # SQLite не может писать, пока открыт читающий курсор - читаем keyset-страницами
+        while True:
+            async with self.session_factory() as reader:
+                chat_ids = (await reader.execute(
+                    recipients_query(checkpoint).limit(self.chunk_size)
+                )).scalars().all()
+            if not chat_ids:
+                return
+            yield chat_ids
+            checkpoint = chat_ids[-1]
+
+    async def _process_chunk(self, text: str, chat_ids: List[int]) -> None:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        blocked: Dict[int, str] = {}
+        counts = {"sent": 0, "failed": 0}
+
+        async def one(chat_id: int):
+            async with semaphore:
+                try:
+                    result = await self.send(chat_id, text)
+                except Exception as e:
+                    logger.error(f"Ошибка рассылки в чат {chat_id}: {e}")
+                    result = None
+            self._recent.append(time.monotonic())
+            if result is not None and result.ok:
+                counts["sent"] += 1
+            elif result is not None and result.status == 403:
+                blocked[chat_id] = result.description or "Forbidden"
+            else:
+                counts["failed"] += 1
+
+        await asyncio.gather(*(one(chat_id) for chat_id in chat_ids))
+
+        async with self.session_factory() as db:
+            existing = set((await db.execute(
+                select(BlockedUser.telegram_id).where(BlockedUser.telegram_id.in_(list(blocked)))
+            )).scalars()) if blocked else set()
+            db.add_all(
+                BlockedUser(telegram_id=chat_id, reason=reason)
+                for chat_id, reason in blocked.items() if chat_id not in existing
+            )
+            await db.execute(
+                update(Broadcast)
+                .where(Broadcast.id == self.broadcast_id)
+                .values(
+                    last_telegram_id=chat_ids[-1],
+                    sent_count=Broadcast.sent_count + counts["sent"],
+                    failed_count=Broadcast.failed_count + counts["failed"],
+                    blocked_count=Broadcast.blocked_count + len(blocked),
+                )
+            )
+            await db.commit()
+        self.sent += counts["sent"]
+        self.failed += counts["failed"]
+        self.blocked += len(blocked)
+
+
+class BroadcastManager:
+    """Рассылки ведущего процесса: опрос запрошенных, статистика, остановка"""
+
+    def __init__(self, session_factory=async_session, send: Callable[[int, str], Awaitable] = send_bulk,
+                 poll_interval: float = BROADCAST_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.send = send
+        self.poll_interval = poll_interval
+        self._runners: Dict[int, BroadcastRunner] = {}
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self._poll_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def is_running(self, broadcast_id: int) -> bool:
+        task = self._tasks.get(broadcast_id)
+        return task is not None and not task.done()
+
+    def start(self, broadcast_id: int) -> BroadcastRunner:
+        if self.is_running(broadcast_id):
+            return self._runners[broadcast_id]
+        runner = BroadcastRunner(broadcast_id, session_factory=self.session_factory, send=self.send)
+        self._runners[broadcast_id] = runner
+        self._tasks[broadcast_id] = asyncio.create_task(self._run(runner))
+        return runner
+
+    async def _run(self, runner: BroadcastRunner) -> None:
+        try:
+            await runner.run()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Рассылка #{runner.broadcast_id} прервана: {e}")
+
+    async def _set_status(self, broadcast_id: int, status: str, allowed) -> bool:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                update(Broadcast)
+                .where(Broadcast.id == broadcast_id, Broadcast.status.in_(allowed))
+                .values(status=status)
+            )
+            await db.commit()
+        return result.rowcount > 0
+
+    async def request_start(self, broadcast_id: int) -> None:
+        """Запросить запуск или продолжение: рассылку подхватит ведущий"""
+        await self._set_status(broadcast_id, 'pending', ('draft', 'paused'))
+        self.wake()
+
+    async def pause(self, broadcast_id: int) -> None:
+        """Отметить паузу; раннер ведущего остановится перед следующей пачкой"""
+        await self._set_status(broadcast_id, 'paused', ('draft', 'pending', 'running'))
+
+    def wake(self) -> None:
+        """Проверить запросы сразу, если этот процесс - ведущий"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def live_stats(self, broadcast_id: int) -> Optional[dict]:
+        runner = self._runners.get(broadcast_id)
+        if runner is None:
+            return None
+        return {**runner.stats(), "running": self.is_running(broadcast_id)}
+
+    async def pick_up(self) -> List[int]:
+        """Запустить pending и продолжить running (в том числе после рестарта)"""
+        async with self.session_factory() as db:
+            ids = (await db.execute(
+                select(Broadcast.id).where(Broadcast.status.in_(ACTIVE_STATUSES)).order_by(Broadcast.id)
+            )).scalars().all()
+        started = [broadcast_id for broadcast_id in ids if not self.is_running(broadcast_id)]
+        for broadcast_id in started:
+            logger.info(f"📣 Запускаем рассылку #{broadcast_id}")
+            self.start(broadcast_id)
+        return started
+
+    def start_polling(self) -> None:
+        """Только в ведущем процессе"""
+        if self._poll_task is None or self._poll_task.done():
+            self._wakeup = asyncio.Event()
+            self._poll_task = asyncio.create_task(self._poll())
+
+    async def _poll(self) -> None:
+        while True:
+            try:
+                await self.pick_up()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка опроса рассылок: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self) -> None:
+        """Остановка процесса: рассылки остаются running и продолжатся после рестарта"""
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            await asyncio.gather(self._poll_task, return_exceptions=True)
+            self._poll_task = None
+            self._wakeup = None
+        for runner in self._runners.values():
+            runner.request_stop()
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=BROADCAST_STOP_TIMEOUT)
+            # Недоотправленная пачка без контрольной точки уйдет повторно после рестарта
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+broadcast_manager = BroadcastManager()
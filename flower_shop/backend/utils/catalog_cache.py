@@ -0,0 +1,170 @@
+"""
+Снимок каталога товаров в памяти процесса
+
+Каталог меняется несколько раз в день через админку, а читается на каждом
+открытии Mini App. Снимок загружается один раз, хранит готовые выборки по
+категориям и популярности и целиком пересобирается после каждой записи.
+"""
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from shared.search_index import TrigramIndex
+
+from ..models.database import Product, async_session
+from .http_cache import EncodedBody, encode_body
+
+logger = logging.getLogger(__name__)
+
+# Инвалидация видна только текущему процессу, поэтому при нескольких воркерах
+# снимок дополнительно перечитывается не реже чем раз в CATALOG_CACHE_TTL секунд
+CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', '300'))
+
+# Поля товара, которые отдаются в публичном API
+PRODUCT_FIELDS = ("id", "name", "category", "description", "price", "photo_url", "is_popular")
+
+ViewKey = Tuple[Optional[str], Optional[bool]]
+
+EMPTY_VIEW = encode_body([])
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Неизменяемый снимок каталога"""
+    version: int
+    loaded_at: float
+    by_id: Dict[int, dict]  # все товары, включая недоступные
+    available_ids: FrozenSet[int]
+    views: Dict[ViewKey, Tuple[dict, ...]]  # (category, popular) -> доступные товары
+    encoded_views: Dict[ViewKey, EncodedBody]  # готовые тела ответов списка
+    encoded_products: Dict[int, EncodedBody]  # готовые тела ответов по ID
+
+    def select(self, category: Optional[str] = None, popular: Optional[bool] = None) -> Tuple[dict, ...]:
+        """Доступные товары с фильтрами как в GET /api/products"""
+        return self.views.get((category or None, popular), ())
+
+    def lookup(self, ids: Iterable[int]) -> dict:
+        """Разбить ID на найденные доступные, недоступные и отсутствующие"""
+        found, unavailable, missing = [], [], []
+        for product_id in dict.fromkeys(ids):
+            product = self.by_id.get(product_id)
+            if product is None:
+                missing.append(product_id)
+            elif product_id in self.available_ids:
+                found.append(product)
+            else:
+                unavailable.append(product)
+        return {"found": found, "unavailable": unavailable, "missing": missing}
+
+    def encoded_view(self, category: Optional[str] = None, popular: Optional[bool] = None) -> EncodedBody:
+        """Сериализованная выборка; ETag одинаков во всех воркерах, пока не изменилось содержимое"""
+        return self.encoded_views.get((category or None, popular), EMPTY_VIEW)
+
+
+def build_snapshot(rows, version: int) -> CatalogSnapshot:
+    """Собрать снимок из строк (поля PRODUCT_FIELDS + is_available)"""
+    by_id = {}
+    available_ids = set()
+    views: Dict[ViewKey, list] = {(None, None): [], (None, True): [], (None, False): []}
+
+    for row in rows:
+        product = {field: getattr(row, field) for field in PRODUCT_FIELDS}
+        by_id[product["id"]] = product
+        if not row.is_available:
+            continue
+        available_ids.add(product["id"])
+
+        popular = bool(product["is_popular"])
+        views[(None, None)].append(product)
+        views[(None, popular)].append(product)
+        if product["category"]:
+            views.setdefault((product["category"], None), []).append(product)
+            views.setdefault((product["category"], True), [])
+            views.setdefault((product["category"], False), [])
+            views[(product["category"], popular)].append(product)
+
+    return CatalogSnapshot(
+        version=version,
+        loaded_at=time.monotonic(),
+        by_id=by_id,
+        available_ids=frozenset(available_ids),
+        views={key: tuple(items) for key, items in views.items()},
+        encoded_views={key: encode_body(items) for key, items in views.items()},
+        encoded_products={product_id: encode_body(product) for product_id, product in by_id.items()},
+    )
+
+
+class CatalogCache:
+    """Версионированный снимок каталога с пересборкой по записи"""
+
+    def __init__(self, ttl: int = CATALOG_CACHE_TTL):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+        # Поисковый индекс по доступным товарам, обновляется вместе со снимком
+        self.search_index = TrigramIndex()
+
+    def _is_fresh(self, snapshot: Optional[CatalogSnapshot]) -> bool:
+        if snapshot is None:
+            return False
+        return not self.ttl or time.monotonic() - snapshot.loaded_at < self.ttl
+
+    async def get(self) -> CatalogSnapshot:
+        """Текущий снимок; загружается из БД только при первом обращении или по TTL"""
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+
+        async with self._lock:
+            # Пока ждали блокировку, снимок мог пересобрать другой запрос
+            if self._is_fresh(self._snapshot):
+                return self._snapshot
+            return await self._load()
+
+    async def refresh(self) -> None:
+        """Пересобрать снимок после изменения каталога (вызывать после commit)"""
+        async with self._lock:
+            try:
+                await self._load()
+            except Exception as e:
+                # Старый снимок больше не валиден: следующий запрос перечитает каталог
+                self._snapshot = None
+                logger.error(f"Ошибка пересборки каталога: {e}")
+
+    async def search(self, query: str, limit: int = 20) -> List[dict]:
+        """Поиск доступных товаров по названию и описанию, лучшие совпадения первыми"""
+        snapshot = await self.get()
+        return [
+            snapshot.by_id[doc_id]
+            for doc_id, _ in self.search_index.search(query, limit)
+            if doc_id in snapshot.by_id
+        ]
+
+    def invalidate(self) -> None:
+        """Сбросить снимок без немедленной загрузки"""
+        self._snapshot = None
+
+    async def _load(self) -> CatalogSnapshot:
+        async with async_session() as db:
+            result = await db.execute(
+                select(*(getattr(Product, field) for field in PRODUCT_FIELDS), Product.is_available)
+                .order_by(Product.id)
+            )
+            rows = result.all()
+
+        self._version += 1
+        snapshot = build_snapshot(rows, self._version)
+        # Индекс догоняет снимок инкрементально: переиндексируются только изменившиеся товары
+        self.search_index.sync((p["id"], p["name"], p["description"]) for p in snapshot.select())
+        # Подмена одной ссылкой: читатели видят либо старый, либо новый снимок целиком
+        self._snapshot = snapshot
+        logger.info(f"Каталог загружен: версия {snapshot.version}, товаров {len(snapshot.by_id)}")
+        return snapshot
+
+
+catalog_cache = CatalogCache()
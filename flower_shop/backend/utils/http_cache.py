@@ -0,0 +1,135 @@
+"""
+HTTP-кэширование ответов: ETag, If-None-Match, Cache-Control и заранее
+сериализованные (и сжатые) тела ответов
+"""
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson опционален
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli опционален
+    brotli = None
+
+# Сколько секунд клиент и CDN могут отдавать ответ без перепроверки
+CATALOG_MAX_AGE = int(os.getenv('CATALOG_MAX_AGE', '60'))
+# Сколько ещё секунд можно отдавать устаревший ответ, перепроверяя его в фоне
+CATALOG_STALE_WHILE_REVALIDATE = int(os.getenv('CATALOG_STALE_WHILE_REVALIDATE', '600'))
+# Тела меньше этого размера не сжимаем: выигрыш меньше накладных расходов
+MIN_COMPRESS_SIZE = 1024
+
+
+def dumps_json(payload) -> bytes:
+    """Сериализация в JSON-байты (orjson, если установлен)"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=str)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str).encode()
+
+
+def make_etag(payload) -> str:
+    """Сильный ETag по содержимому (dict/list или готовые байты)"""
+    if not isinstance(payload, (bytes, bytearray)):
+        payload = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode()
+    return '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+
+
+def _strip_encoding_suffix(etag: str) -> str:
+    for suffix in ('-gzip"', '-br"'):
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Проверка If-None-Match (слабое сравнение, как требует RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    etag = _strip_encoding_suffix(etag)
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if _strip_encoding_suffix(candidate) == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str) -> dict:
+    """Заголовки для кэшируемого ответа каталога"""
+    return {
+        "ETag": etag,
+        "Cache-Control": (
+            f"public, max-age={CATALOG_MAX_AGE}, "
+            f"stale-while-revalidate={CATALOG_STALE_WHILE_REVALIDATE}"
+        ),
+        "Vary": "Accept-Encoding",
+    }
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    """Готовое тело JSON-ответа и его сжатые варианты"""
+    etag: str
+    body: bytes
+    gzip_body: Optional[bytes] = None
+    br_body: Optional[bytes] = None
+
+
+def encode_body(payload) -> EncodedBody:
+    """Сериализовать и сжать тело один раз"""
+    body = dumps_json(payload)
+    gzip_body = br_body = None
+    if len(body) >= MIN_COMPRESS_SIZE:
+        # mtime=0 - одинаковые байты при каждой пересборке
+        gzip_body = gzip.compress(body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            br_body = brotli.compress(body, quality=11)
+    return EncodedBody(etag=make_etag(body), body=body, gzip_body=gzip_body, br_body=br_body)
+
+
+def _accepted_encodings(accept_encoding: Optional[str]) -> set:
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+class RawJSONResponse(Response):
+    """JSON-ответ из уже сериализованных байтов, без jsonable_encoder"""
+    media_type = "application/json"
+
+
+def cached_json_response(request: Request, encoded: EncodedBody) -> Response:
+    """304 по If-None-Match, иначе готовые байты в подходящей кодировке"""
+    accepted = _accepted_encodings(request.headers.get("accept-encoding"))
+    if encoded.br_body is not None and "br" in accepted:
+        body, coding = encoded.br_body, "br"
+    elif encoded.gzip_body is not None and "gzip" in accepted:
+        body, coding = encoded.gzip_body, "gzip"
+    else:
+        body, coding = encoded.body, None
+
+    # У каждого варианта кодирования свой сильный ETag
+    headers = cache_headers(encoded.etag if coding is None else f'{encoded.etag[:-1]}-{coding}"')
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+    return RawJSONResponse(body, headers=headers)
@@ -0,0 +1,176 @@
+"""
+Выбор ведущего процесса среди воркеров uvicorn/gunicorn
+
+Фоновые задачи (outbox, напоминания, возобновление рассылок) и set_webhook
+должны работать в одном процессе, даже если API обслуживают несколько
+воркеров. Ведущим становится процесс, взявший блокировку:
+- PostgreSQL: pg_try_advisory_lock на отдельном соединении. Блокировка
+  снимается сама, когда процесс или соединение умирают;
+- другие БД (SQLite): flock на файле рядом с базой, воркеры на одной машине.
+Остальные процессы раз в LEADER_RETRY_INTERVAL секунд пробуют занять место
+ведущего. LEADER_ELECTION=off - каждый процесс ведущий (один воркер).
+"""
+import asyncio
+import logging
+import os
+import tempfile
+import zlib
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from ..models.database import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+LEADER_ELECTION = os.getenv('LEADER_ELECTION', 'auto')
+LEADER_RETRY_INTERVAL = float(os.getenv('LEADER_RETRY_INTERVAL', '15'))
+LEADER_LOCK_NAME = os.getenv('LEADER_LOCK_NAME', 'flower_shop_leader')
+
+Callback = Callable[[], Awaitable[None]]
+
+
+class LeaderElection:
+    """Блокировка ведущего с колбэками на получение и потерю лидерства"""
+
+    def __init__(self, engine: AsyncEngine = default_engine, name: str = LEADER_LOCK_NAME,
+                 retry_interval: float = LEADER_RETRY_INTERVAL, mode: str = LEADER_ELECTION,
+                 lock_dir: Optional[str] = None):
+        self.engine = engine
+        self.name = name
+        self.retry_interval = retry_interval
+        self.mode = mode
+        self.lock_dir = lock_dir or tempfile.gettempdir()
+        self.is_leader = False
+        self._elected: List[Callback] = []
+        self._resigned: List[Callback] = []
+        self._connection = None
+        self._lock_file = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def lock_key(self) -> int:
+        """Ключ advisory lock: стабильный 32-битный хеш имени"""
+        return zlib.crc32(self.name.encode())
+
+    def on_elected(self, callback: Callback) -> None:
+        self._elected.append(callback)
+
+    def on_resigned(self, callback: Callback) -> None:
+        self._resigned.append(callback)
+
+    async def _acquire(self) -> bool:
+        if self.mode == 'off':
+            return True
+        if self.engine.dialect.name == 'postgresql':
+            connection = await self.engine.connect()
+            try:
+                acquired = await connection.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": self.lock_key})
+                await connection.commit()
+            except Exception:
+                await connection.close()
+                raise
+            if acquired:
+                # Соединение держим открытым весь срок лидерства
+                self._connection = connection
+                return True
+            await connection.close()
+            return False
+        return self._acquire_file_lock()
+
+    def _acquire_file_lock(self) -> bool:
+        try:
+            import fcntl
+        except ImportError:
+            # Windows: локальная разработка в одном процессе
+            return True
+        lock_file = open(os.path.join(self.lock_dir, f"{self.name}.lock"), 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _still_held(self) -> bool:
+        """Для PostgreSQL: соединение с блокировкой живо"""
+        if self._connection is None:
+            return True
+        try:
+            await self._connection.scalar(text("SELECT 1"))
+            await self._connection.commit()
+            return True
+        except Exception as e:
+            logger.error(f"❌ Потеряно соединение с блокировкой ведущего: {e}")
+            return False
+
+    async def _release(self) -> None:
+        if self._connection is not None:
+            try:
+                await self._connection.scalar(text("SELECT pg_advisory_unlock(:key)"), {"key": self.lock_key})
+                await self._connection.close()
+            except Exception:
+                # Разорванное соединение уже сняло блокировку
+                pass
+            self._connection = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    async def _run_callbacks(self, callbacks: List[Callback]) -> None:
+        for callback in callbacks:
+            try:
+                await callback()
+            except Exception as e:
+                logger.error(f"❌ Ошибка в задаче ведущего {getattr(callback, '__name__', callback)}: {e}")
+
+    async def _become_leader(self) -> None:
+        self.is_leader = True
+        logger.info(f"👑 Процесс {os.getpid()} стал ведущим")
+        await self._run_callbacks(self._elected)
+
+    async def _resign(self) -> None:
+        if self.is_leader:
+            self.is_leader = False
+            await self._run_callbacks(self._resigned)
+        await self._release()
+
+    async def try_acquire(self) -> bool:
+        """Одна попытка стать ведущим; при успехе запускает колбэки"""
+        if self.is_leader:
+            return True
+        try:
+            acquired = await self._acquire()
+        except Exception as e:
+            logger.error(f"❌ Не удалось проверить блокировку ведущего: {e}")
+            return False
+        if acquired:
+            await self._become_leader()
+        return acquired
+
+    async def start(self) -> None:
+        """Первая попытка сразу, дальше - в фоне"""
+        await self.try_acquire()
+        if self.mode != 'off' and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            if self.is_leader:
+                if not await self._still_held():
+                    await self._resign()
+            else:
+                await self.try_acquire()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self._resign()
+
+
+leader = LeaderElection()
@@ -0,0 +1,119 @@
+"""
+Сводка заказов пользователя (read-model) для кнопок бота
+
+Кнопки "📦 Мои заказы" и "🔁 Повторить" читают одну строку
+user_order_summaries по telegram_id вместо заказов с позициями. Строка
+пересчитывается в той же транзакции, что создание заказа или смена статуса,
+поэтому не расходится с заказами. Запись заказов редкая, чтение частое.
+Строки, заведенные миграцией 0007 без сводки (recent_orders IS NULL),
+собираются при первом чтении.
+"""
+import json
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import Order, OrderItem, UserOrderSummary
+
+# Сколько последних заказов хранить в сводке
+ORDER_SUMMARY_SIZE = int(os.getenv('ORDER_SUMMARY_SIZE', '5'))
+
+
+async def build_order_summary(db: AsyncSession, telegram_id: int, size: int = ORDER_SUMMARY_SIZE) -> dict:
+    """Последние заказы, их число и позиции последнего заказа"""
+    items_count = (
+        select(func.count(OrderItem.id))
+        .where(OrderItem.order_id == Order.id)
+        .scalar_subquery()
+        .label("items_count")
+    )
+    rows = (await db.execute(
+        select(Order.id, Order.status, Order.total, Order.delivery_date, Order.created_at, items_count)
+        .where(Order.telegram_id == telegram_id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+        .limit(size)
+    )).all()
+    orders_count = await db.scalar(select(func.count(Order.id)).where(Order.telegram_id == telegram_id))
+
+    recent = [{
+        "id": row.id,
+        "status": row.status,
+        "total": row.total,
+        "delivery_date": row.delivery_date,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "items_count": row.items_count,
+    } for row in rows]
+
+    last_items = []
+    if recent:
+        items = (await db.execute(
+            select(OrderItem.product_id, OrderItem.product_name, OrderItem.size, OrderItem.price, OrderItem.quantity)
+            .where(OrderItem.order_id == recent[0]["id"])
+            .order_by(OrderItem.id)
+        )).all()
+        last_items = [dict(item._mapping) for item in items]
+
+    return {
+        "telegram_id": telegram_id,
+        "orders_count": orders_count or 0,
+        "recent_orders": recent,
+        "last_order_id": recent[0]["id"] if recent else None,
+        "last_order_items": last_items,
+    }
+
+
+async def refresh_order_summary(db: AsyncSession, telegram_id: int) -> dict:
+    """Пересчитать сводку в текущей транзакции (коммитит вызывающий код)"""
+    summary = await build_order_summary(db, telegram_id)
+    values = {
+        "orders_count": summary["orders_count"],
+        "recent_orders": json.dumps(summary["recent_orders"], ensure_ascii=False),
+        "last_order_id": summary["last_order_id"],
+        "last_order_items": json.dumps(summary["last_order_items"], ensure_ascii=False),
+        "updated_at": datetime.utcnow(),
+    }
+    result = await db.execute(
+        update(UserOrderSummary).where(UserOrderSummary.telegram_id == telegram_id).values(**values)
+    )
+    if result.rowcount == 0:
+        dialect = db.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            # Первый заказ пользователя могут создать два запроса сразу
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            statement = insert(UserOrderSummary).values(telegram_id=telegram_id, **values)
+            statement = statement.on_conflict_do_update(index_elements=['telegram_id'], set_=values)
+        else:
+            from sqlalchemy import insert
+            statement = insert(UserOrderSummary).values(telegram_id=telegram_id, **values)
+        await db.execute(statement)
+    return summary
+
+
+async def load_order_summary(db: AsyncSession, telegram_id: int) -> dict:
+    """Сводка для API и бота; недостроенная строка собирается и сохраняется"""
+    row = await db.get(UserOrderSummary, telegram_id)
+    if row is not None and row.recent_orders is None:
+        summary = await refresh_order_summary(db, telegram_id)
+        await db.commit()
+        return summary
+    return summary_to_dict(telegram_id, row)
+
+
+def summary_to_dict(telegram_id: int, row: Optional[UserOrderSummary]) -> dict:
+    if row is None:
+        return {"telegram_id": telegram_id, "orders_count": 0, "recent_orders": [],
+                "last_order_id": None, "last_order_items": []}
+    return {
+        "telegram_id": telegram_id,
+        "orders_count": row.orders_count or 0,
+        "recent_orders": json.loads(row.recent_orders or "[]"),
+        "last_order_id": row.last_order_id,
+        "last_order_items": json.loads(row.last_order_items or "[]"),
+        "updated_at": row.updated_at.isoformat() if row.updated_at else None,
+    }
@@ -0,0 +1,298 @@
+"""
+Transactional outbox для уведомлений в Telegram
+
+Уведомления записываются в notification_outbox в той же транзакции, что и
+заказ, а отправляет их фоновый диспетчер: оформление заказа больше не ждет
+api.telegram.org.
+
+Строку отправляет тот, кто ее арендовал (status='sending', claim_token,
+locked_until). Итог записывается только при совпадении claim_token, поэтому
+строка, аренду которой перехватил другой воркер, не будет учтена дважды.
+Сообщение может уйти повторно, только если процесс упал между отправкой и
+записью результата (после истечения аренды).
+
+Уведомления админу о заказах можно копить ADMIN_DIGEST_WINDOW секунд и
+отправлять одной сводкой; крупные заказы уходят сразу и отдельным сообщением.
+"""
+import asyncio
+import json
+import logging
+import os
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import NotificationOutbox, async_session
+from .send_scheduler import PRIORITY_ADMIN, PRIORITY_CUSTOMER
+from .telegram_notify import (
+    ADMIN_CHAT_ID, render_admin_digest, render_admin_order, render_client_order, send_telegram_message, split_message,
+)
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = int(os.getenv('OUTBOX_BATCH_SIZE', '50'))
+OUTBOX_CONCURRENCY = int(os.getenv('OUTBOX_CONCURRENCY', '5'))
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '5'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '8'))
+# На сколько секунд строка закрепляется за отправителем
+OUTBOX_LEASE_SECONDS = 60
+# Пауза перед повтором: 2, 4, 8 ... секунд, но не больше 10 минут
+RETRY_BASE_SECONDS = 2
+RETRY_MAX_SECONDS = 600
+# Окно накопления заказов для сводки админу (0 - сообщение на каждый заказ)
+ADMIN_DIGEST_WINDOW = int(os.getenv('ADMIN_DIGEST_WINDOW', '0'))
+# Заказы от этой суммы (VND) отправляются админу сразу, не дожидаясь окна
+ADMIN_DIGEST_IMMEDIATE_TOTAL = int(os.getenv('ADMIN_DIGEST_IMMEDIATE_TOTAL', '5000000'))
+# Больше стольких заказов в одну сводку не собираем
+ADMIN_DIGEST_MAX_ORDERS = 50
+
+
+def enqueue(db: AsyncSession, kind: str, chat_id: int, payload: dict, delay: float = 0) -> None:
+    """Добавить уведомление в outbox (коммитит вызывающий код вместе со своими данными)"""
+    db.add(NotificationOutbox(
+        kind=kind,
+        chat_id=chat_id,
+        payload=json.dumps(payload, ensure_ascii=False),
+        status='pending',
+        attempts=0,
+        next_attempt_at=datetime.utcnow() + timedelta(seconds=delay),
+    ))
+
+
+def digest_delay(order_data: dict, window: int = ADMIN_DIGEST_WINDOW) -> int:
+    """Сколько уведомление админу ждет сводки"""
+    if window <= 0 or order_data['total'] >= ADMIN_DIGEST_IMMEDIATE_TOTAL:
+        return 0
+    return window
+
+
+def is_digest_order(kind: str, payload: dict) -> bool:
+    """Заказ, который можно отправить админу в сводке; крупные идут отдельно"""
+    return kind == 'order_admin' and "order" in payload and not payload.get("immediate")
+
+
+def enqueue_order_notifications(db: AsyncSession, order_id: int, order_data: dict) -> None:
+    """Уведомления о новом заказе админу и клиенту"""
+    if ADMIN_CHAT_ID:
+        # Краткие данные заказа нужны, чтобы собрать сводку без запроса к orders
+        order = {
+            "order_id": order_id,
+            "name": order_data['name'],
+            "phone": order_data['phone'],
+            "delivery_date": order_data['delivery_date'],
+            "delivery_time": order_data['delivery_time'],
+            "total": order_data['total'],
+            "items": [
+                {"product_name": item['product_name'], "size": item['size'], "quantity": item['quantity']}
+                for item in order_data['items']
+            ],
+        }
+        enqueue(
+            db, 'order_admin', int(ADMIN_CHAT_ID),
+            {
+                "text": render_admin_order(order_id, order_data),
+                "order": order,
+                "immediate": order_data['total'] >= ADMIN_DIGEST_IMMEDIATE_TOTAL,
+            },
+            delay=digest_delay(order_data),
+        )
+    else:
+        logger.warning(f"ADMIN_CHAT_ID не задан, уведомление админу о заказе #{order_id} пропущено")
+    enqueue(db, 'order_client', order_data['telegram_id'], {"text": render_client_order(order_id, order_data)})
+
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная пауза с jitter"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class OutboxDispatcher:
+    """Фоновая отправка уведомлений из outbox с ограничением параллельности и повторами"""
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        batch_size: int = OUTBOX_BATCH_SIZE,
+        concurrency: int = OUTBOX_CONCURRENCY,
+        poll_interval: float = OUTBOX_POLL_INTERVAL,
+        max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info("📤 Outbox-диспетчер запущен")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self) -> None:
+        """Сообщить о новых строках (после commit), чтобы не ждать интервала опроса"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка outbox-диспетчера: {e}")
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def dispatch_once(self) -> int:
+        """Арендовать и отправить одну пачку; возвращает число обработанных строк"""
+        claimed = await self._claim()
+        if not claimed:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(rows, text):
+            async with semaphore:
+                await self._deliver(rows, text)
+
+        await asyncio.gather(*(deliver(rows, text) for rows, text in self._group(claimed)))
+        return len(claimed)
+
+    @staticmethod
+    def _group(claimed: list) -> list:
+        """Несколько заказов для одного админского чата -> одна сводка"""
+        deliveries, digests = [], {}
+        for row in claimed:
+            if is_digest_order(row["kind"], row["payload"]):
+                digests.setdefault(row["chat_id"], []).append(row)
+            else:
+                deliveries.append(([row], row["payload"]["text"]))
+        for rows in digests.values():
+            if len(rows) == 1:
+                deliveries.append((rows, rows[0]["payload"]["text"]))
+            else:
+                orders = sorted((row["payload"]["order"] for row in rows), key=lambda order: order["order_id"])
+                deliveries.append((rows, render_admin_digest(orders)))
+        return deliveries
+
+    async def _claim(self) -> list:
+        now = datetime.utcnow()
+        token = str(uuid.uuid4())
+        async with self.session_factory() as db:
+            for_update = db.bind.dialect.name == 'postgresql'
+            query = (
+                select(NotificationOutbox)
+                .where(or_(
+                    and_(NotificationOutbox.status == 'pending', NotificationOutbox.next_attempt_at <= now),
+                    # Отправитель упал, не дописав результат - аренда истекла
+                    and_(NotificationOutbox.status == 'sending', NotificationOutbox.locked_until < now),
+                ))
+                .order_by(NotificationOutbox.next_attempt_at)
+                .limit(self.batch_size)
+            )
+            if for_update:
+                # Несколько воркеров разбирают очередь, не блокируя друг друга
+                query = query.with_for_update(skip_locked=True)
+            rows = list((await db.execute(query)).scalars().all())
+
+            # Пришло время сводки - забираем и заказы, чье окно еще не закончилось.
+            # Крупный заказ сводку не запускает: он уходит сразу и один
+            admin_chats = {row.chat_id for row in rows if is_digest_order(row.kind, json.loads(row.payload))}
+            if admin_chats:
+                waiting = (
+                    select(NotificationOutbox)
+                    .where(
+                        NotificationOutbox.kind == 'order_admin',
+                        NotificationOutbox.status == 'pending',
+                        NotificationOutbox.chat_id.in_(admin_chats),
+                        NotificationOutbox.next_attempt_at > now,
+                        NotificationOutbox.attempts == 0,
+                    )
+                    .order_by(NotificationOutbox.id)
+                    .limit(ADMIN_DIGEST_MAX_ORDERS)
+                )
+                if for_update:
+                    waiting = waiting.with_for_update(skip_locked=True)
+                rows.extend((await db.execute(waiting)).scalars().all())
+
+            for row in rows:
+                row.status = 'sending'
+                row.claim_token = token
+                row.locked_until = now + timedelta(seconds=OUTBOX_LEASE_SECONDS)
+                row.attempts = (row.attempts or 0) + 1
+            claimed = [
+                {
+                    "id": row.id,
+                    "kind": row.kind,
+                    "chat_id": row.chat_id,
+                    "payload": json.loads(row.payload),
+                    "attempts": row.attempts,
+                    "token": token,
+                }
+                for row in rows
+            ]
+            await db.commit()
+        return claimed
+
+    async def _deliver(self, rows: list, text: str) -> None:
+        """Отправить текст (частями, если длинный) и записать итог во все строки"""
+        kind, chat_id = rows[0]["kind"], rows[0]["chat_id"]
+        priority = PRIORITY_ADMIN if kind == 'order_admin' else PRIORITY_CUSTOMER
+        try:
+            ok, error = True, None
+            # При повторе после частичной отправки уже ушедшие части придут еще раз
+            for part in split_message(text):
+                if not await send_telegram_message(chat_id, part, priority):
+                    ok, error = False, "Telegram не принял сообщение"
+                    break
+        except Exception as e:
+            ok, error = False, str(e)
+
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            for row in rows:
+                attempts = row["attempts"]
+                if ok:
+                    values = {"status": 'sent', "sent_at": now, "last_error": None}
+                elif attempts >= self.max_attempts:
+                    values = {"status": 'failed', "last_error": error}
+                    logger.error(f"Уведомление {kind} #{row['id']} не отправлено после {attempts} попыток: {error}")
+                else:
+                    values = {
+                        "status": 'pending',
+                        "last_error": error,
+                        "next_attempt_at": now + timedelta(seconds=retry_delay(attempts)),
+                    }
+                values.update(claim_token=None, locked_until=None)
+                await db.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id == row["id"], NotificationOutbox.claim_token == row["token"])
+                    .values(**values)
+                )
+            await db.commit()
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,106 @@
+"""
+Расчет стоимости заказа на сервере
+
+Правила совпадают с webapp/src/utils/format.js; цены, присланные клиентом,
+не используются. Цены и наличие читаются из БД одним IN-запросом в
+транзакции заказа, а не из снимка каталога: снимок отдельный в каждом
+воркере и может отставать на CATALOG_CACHE_TTL.
+"""
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models.database import Product
+
+# Наценка за размер букета
+SIZE_MULTIPLIERS = {
+    'standard': 1.0,
+    'large': 1.3,
+    'xl': 1.5,
+}
+DELIVERY_COST = int(os.getenv('DELIVERY_COST', '100000'))
+# Бесплатная доставка от этой суммы товаров (VND)
+FREE_DELIVERY_THRESHOLD = int(os.getenv('FREE_DELIVERY_THRESHOLD', '3000000'))
+MAX_QUANTITY = 99
+
+
+class PricingError(ValueError):
+    """Заказ нельзя оценить: неизвестный товар, размер или количество"""
+
+
+@dataclass
+class PricedOrder:
+    items: List[dict] = field(default_factory=list)
+    items_total: int = 0
+    delivery_cost: int = 0
+    total: int = 0
+
+
+def item_price(base_price: int, size: str) -> int:
+    """Цена за единицу с учетом размера (округление как Math.round в JS)"""
+    if size not in SIZE_MULTIPLIERS:
+        raise PricingError(f"Unknown size: {size}")
+    return math.floor(base_price * SIZE_MULTIPLIERS[size] + 0.5)
+
+
+def delivery_cost(items_total: int) -> int:
+    return 0 if items_total >= FREE_DELIVERY_THRESHOLD else DELIVERY_COST
+
+
+def parse_items(items: list) -> List[dict]:
+    """Проверить позиции из запроса: product_id, size, quantity"""
+    if not items:
+        raise PricingError("Order must contain at least one item")
+    lines = []
+    for item in items:
+        try:
+            product_id = int(item['product_id'])
+            quantity = int(item.get('quantity', 1))
+        except (KeyError, TypeError, ValueError):
+            raise PricingError("Each item needs integer product_id and quantity")
+        if not 1 <= quantity <= MAX_QUANTITY:
+            raise PricingError(f"Invalid quantity for product {product_id}")
+        size = item.get('size') or 'standard'
+        if size not in SIZE_MULTIPLIERS:
+            raise PricingError(f"Unknown size: {size}")
+        lines.append({'product_id': product_id, 'size': size, 'quantity': quantity})
+    return lines
+
+
+async def load_products(db: AsyncSession, product_ids: Iterable[int]) -> Dict[int, dict]:
+    """Актуальные название, цена и наличие товаров заказа одним запросом"""
+    rows = (await db.execute(
+        select(Product.id, Product.name, Product.price, Product.is_available)
+        .where(Product.id.in_(set(product_ids)))
+    )).all()
+    return {row.id: dict(row._mapping) for row in rows}
+
+
+def price_order(lines: List[dict], products: Dict[int, dict]) -> PricedOrder:
+    """Пересчитать позиции (после parse_items) и итоги заказа по товарам из БД"""
+    priced = PricedOrder()
+    for line in lines:
+        product_id, size, quantity = line['product_id'], line['size'], line['quantity']
+        product = products.get(product_id)
+        if product is None:
+            raise PricingError(f"Product {product_id} not found")
+        if not product['is_available']:
+            raise PricingError(f"Product {product_id} is not available")
+
+        price = item_price(product['price'], size)
+        priced.items.append({
+            'product_id': product_id,
+            'product_name': product['name'],
+            'size': size,
+            'price': price,
+            'quantity': quantity,
+        })
+        priced.items_total += price * quantity
+
+    priced.delivery_cost = delivery_cost(priced.items_total)
+    priced.total = priced.items_total + priced.delivery_cost
+    return priced
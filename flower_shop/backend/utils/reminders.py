@@ -0,0 +1,221 @@
+"""
+Напоминания о событиях клиентов (дни рождения, годовщины)
+
+Время отправки хранится в индексированной колонке reminders.due_at (UTC).
+Планировщик держит в памяти min-heap напоминаний ближайшего горизонта
+(REMINDER_HORIZON секунд), спит до ближайшего и догружает следующий
+горизонт запросом по диапазону due_at - без полного просмотра таблицы.
+Планировщик работает только в ведущем воркере, а напоминание могли создать
+или изменить в любом: раз в REMINDER_RESCAN_INTERVAL секунд текущий
+горизонт перечитывается из БД.
+Сработавшее напоминание в одной транзакции переводится на следующий год
+(или отключается) и кладется в outbox, поэтому даже при нескольких
+процессах оно уходит один раз.
+"""
+import asyncio
+import heapq
+import logging
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from ..models.database import Reminder, async_session
+from .outbox import enqueue, outbox_dispatcher
+from .telegram_notify import render_reminder
+
+logger = logging.getLogger(__name__)
+
+EVENT_DATE_FORMAT = "%d.%m.%Y"
+# Напоминание приходит в REMINDER_HOUR:00 по местному времени магазина
+REMINDER_HOUR = int(os.getenv('REMINDER_HOUR', '9'))
+REMINDER_UTC_OFFSET = timedelta(hours=int(os.getenv('REMINDER_UTC_OFFSET', '7')))
+# На сколько секунд вперед напоминания держатся в памяти
+REMINDER_HORIZON = int(os.getenv('REMINDER_HORIZON', '3600'))
+# Как часто перечитывать горизонт ради изменений из других воркеров (сек)
+REMINDER_RESCAN_INTERVAL = int(os.getenv('REMINDER_RESCAN_INTERVAL', '120'))
+MAX_REMIND_DAYS_BEFORE = 60
+# Пауза перед повтором, если БД недоступна
+RETRY_SECONDS = 30
+
+
+def parse_event_date(value: str) -> date:
+    """DD.MM.YYYY -> date; ValueError, если формат неверный"""
+    return datetime.strptime((value or "").strip(), EVENT_DATE_FORMAT).date()
+
+
+def shift_year(day: date, year: int) -> date:
+    """Та же дата в другом году; 29 февраля в невисокосный год -> 28 февраля"""
+    try:
+        return day.replace(year=year)
+    except ValueError:
+        return day.replace(year=year, day=28)
+
+
+def due_at_for(event_date: date, days_before: int) -> datetime:
+    local = datetime.combine(event_date - timedelta(days=days_before), time(REMINDER_HOUR))
+    return local - REMINDER_UTC_OFFSET
+
+
+def compute_due_at(event_date: date, days_before: int, yearly: bool, now: datetime) -> Optional[datetime]:
+    """Ближайшее время отправки после now (UTC) или None, если разовое событие прошло"""
+    due = due_at_for(event_date, days_before)
+    if due > now or not yearly:
+        return due if due > now else None
+    for year in range(max(event_date.year, now.year - 1), now.year + 2):
+        due = due_at_for(shift_year(event_date, year), days_before)
+        if due > now:
+            return due
+    return None
+
+
+def occurrence_date(due_at: datetime, days_before: int) -> date:
+    """Дата события, о котором напоминает due_at"""
+    return (due_at + REMINDER_UTC_OFFSET).date() + timedelta(days=days_before)
+
+
+class ReminderScheduler:
+    """Min-heap напоминаний ближайшего горизонта с инкрементальной догрузкой"""
+
+    def __init__(self, session_factory=async_session, horizon: int = REMINDER_HORIZON,
+                 rescan_interval: float = REMINDER_RESCAN_INTERVAL):
+        self.session_factory = session_factory
+        self.horizon = timedelta(seconds=horizon)
+        self.rescan_interval = timedelta(seconds=rescan_interval)
+        self._heap: List[Tuple[datetime, int]] = []
+        # Актуальное время каждого напоминания в куче; устаревшие записи кучи пропускаются
+        self._scheduled: Dict[int, datetime] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._refilled_at: Optional[datetime] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self.fired = 0
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+            logger.info("⏰ Планировщик напоминаний запущен")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._heap.clear()
+        self._scheduled.clear()
+        self._loaded_until = None
+        self._refilled_at = None
+
+    def schedule(self, reminder_id: int, due_at: Optional[datetime]) -> None:
+        """Учесть новое или измененное напоминание (вызывать после commit)"""
+        if due_at is None:
+            self._scheduled.pop(reminder_id, None)
+            return
+        # Дальше загруженного горизонта - его подхватит догрузка
+        if self._loaded_until is None or due_at > self._loaded_until:
+            self._scheduled.pop(reminder_id, None)
+            return
+        self._push(reminder_id, due_at)
+        self._wakeup.set()
+
+    def _push(self, reminder_id: int, due_at: datetime) -> None:
+        if self._scheduled.get(reminder_id) == due_at:
+            return
+        self._scheduled[reminder_id] = due_at
+        heapq.heappush(self._heap, (due_at, reminder_id))
+
+    async def refill(self, now: datetime) -> int:
+        """Загрузить напоминания до now + horizon
+
+        Диапазон читается целиком, а не только после прошлой загрузки: при
+        нескольких воркерах напоминание могли создать в другом процессе, и
+        планировщик ведущего узнает о нем только из БД. Уже известные
+        напоминания _push пропускает.
+        """
+        until = now + self.horizon
+        query = select(Reminder.id, Reminder.due_at).where(
+            Reminder.is_active == True,  # noqa: E712
+            Reminder.due_at <= until,
+        )
+        async with self.session_factory() as db:
+            rows = (await db.execute(query)).all()
+        for reminder_id, due_at in rows:
+            self._push(reminder_id, due_at)
+        self._loaded_until = until
+        self._refilled_at = now
+        return len(rows)
+
+    def _pop_due(self, now: datetime) -> List[Tuple[datetime, int]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, reminder_id = heapq.heappop(self._heap)
+            if self._scheduled.get(reminder_id) == due_at:
+                del self._scheduled[reminder_id]
+                due.append((due_at, reminder_id))
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                now = datetime.utcnow()
+                # Следующий горизонт грузим заранее, на середине текущего;
+                # чаще - ради напоминаний, созданных в других воркерах
+                if (self._loaded_until is None or now + self.horizon / 2 >= self._loaded_until
+                        or now - self._refilled_at >= self.rescan_interval):
+                    await self.refill(now)
+                for due_at, reminder_id in self._pop_due(now):
+                    await self._fire(reminder_id, due_at)
+                wait = min(
+                    (self._loaded_until - self.horizon / 2 - now).total_seconds(),
+                    (self._refilled_at + self.rescan_interval - now).total_seconds(),
+                )
+                if self._heap:
+                    wait = min(wait, (self._heap[0][0] - now).total_seconds())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка планировщика напоминаний: {e}")
+                wait = RETRY_SECONDS
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(wait, 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, reminder_id: int, due_at: datetime) -> None:
+        now = datetime.utcnow()
+        async with self.session_factory() as db:
+            reminder = await db.get(Reminder, reminder_id)
+            if reminder is None or not reminder.is_active or reminder.due_at != due_at:
+                return
+            next_due = None
+            if reminder.is_yearly:
+                next_due = compute_due_at(
+                    parse_event_date(reminder.event_date), reminder.remind_days_before or 0, True, due_at
+                )
+            # Условное обновление: напоминание уже отправил другой процесс - rowcount 0
+            claimed = await db.execute(
+                update(Reminder)
+                .where(Reminder.id == reminder_id, Reminder.due_at == due_at, Reminder.is_active == True)  # noqa: E712
+                .values(due_at=next_due, is_active=next_due is not None, last_sent_at=now)
+            )
+            if claimed.rowcount != 1:
+                await db.rollback()
+                return
+            days_before = reminder.remind_days_before or 0
+            enqueue(db, 'reminder', reminder.telegram_id, {
+                "text": render_reminder(reminder.event_name, occurrence_date(due_at, days_before), days_before),
+            })
+            await db.commit()
+        self.fired += 1
+        logger.info(f"⏰ Напоминание #{reminder_id} отправлено в outbox (опоздание {(now - due_at).total_seconds():.1f} с)")
+        outbox_dispatcher.wake()
+        self.schedule(reminder_id, next_due)
+
+
+reminder_scheduler = ReminderScheduler()
@@ -0,0 +1,323 @@
+"""
+Планировщик отправки сообщений в Telegram с учетом лимитов Bot API
+
+Лимиты Telegram: ~30 сообщений в секунду всего, ~1 в секунду в один чат и
+20 в минуту в одну группу. Каждый лимит - token bucket; сообщения ждут в
+очередях по приоритетам (клиенты > админ > рассылки), а 429 с retry_after
+откладывает отправку в этот чат вместо потери сообщения.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_CUSTOMER = 'customer'
+PRIORITY_ADMIN = 'admin'
+PRIORITY_BULK = 'bulk'
+# Порядок очередей: первая непустая очередь, чей чат не ограничен, отправляется первой
+LANES = (PRIORITY_CUSTOMER, PRIORITY_ADMIN, PRIORITY_BULK)
+
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', '1'))
+TELEGRAM_GROUP_PER_MINUTE = float(os.getenv('TELEGRAM_GROUP_PER_MINUTE', '20'))
+SEND_CONCURRENCY = int(os.getenv('SEND_CONCURRENCY', '8'))
+# Сколько сообщений всего может ждать в очередях
+SEND_QUEUE_LIMIT = int(os.getenv('SEND_QUEUE_LIMIT', '1000'))
+SEND_MAX_ATTEMPTS = 5
+# Сколько сообщений очереди просматриваем в поисках чата без ограничения
+SCAN_LIMIT = 200
+# Больше стольких чатов - забываем ведра, которые давно не использовались
+MAX_TRACKED_CHATS = 10000
+LATENCY_SAMPLES = 1000
+
+
+@dataclass
+class SendResult:
+    """Ответ Bot API на sendMessage"""
+    ok: bool
+    status: int = 0
+    retry_after: Optional[float] = None  # из parameters.retry_after при 429
+    description: Optional[str] = None
+
+
+# Сообщение не отправлялось: вытеснено из очереди или планировщик остановлен
+DROPPED = SendResult(ok=False, description="dropped by send scheduler")
+
+
+class TokenBucket:
+    """rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен (0 - уже есть)"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass
+class _Job:
+    chat_id: int
+    text: str
+    priority: str
+    future: asyncio.Future
+    enqueued_at: float
+    attempts: int = 0
+    not_before: float = 0.0
+
+
+@dataclass
+class SchedulerStats:
+    sent: int = 0
+    failed: int = 0
+    dropped: int = 0
+    retried: int = 0
+    rate_limited: int = 0
+    latencies: Deque[float] = field(default_factory=lambda: deque(maxlen=LATENCY_SAMPLES))
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class SendScheduler:
+    """Очереди с приоритетами поверх функции отправки send(chat_id, text) -> SendResult"""
+
+    def __init__(
+        self,
+        send: Callable[[int, str], Awaitable],
+        global_rate: float = TELEGRAM_GLOBAL_RATE,
+        chat_rate: float = TELEGRAM_CHAT_RATE,
+        group_per_minute: float = TELEGRAM_GROUP_PER_MINUTE,
+        concurrency: int = SEND_CONCURRENCY,
+        max_queue: int = SEND_QUEUE_LIMIT,
+        max_attempts: int = SEND_MAX_ATTEMPTS,
+    ):
+        self._send = send
+        self.chat_rate = chat_rate
+        self.group_rate = group_per_minute / 60
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.max_attempts = max_attempts
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._lanes: Dict[str, Deque[_Job]] = {lane: deque() for lane in LANES}
+        self._chat_buckets: Dict[int, TokenBucket] = {}
+        # До какого момента чат заблокирован после 429 (time.monotonic)
+        self._chat_blocked: Dict[int, float] = {}
+        # В один чат - не больше одного сообщения одновременно, чтобы не путать порядок
+        self._in_flight: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.stats = SchedulerStats()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        if not self.running:
+            self._wakeup = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._task = asyncio.create_task(self._run())
+            logger.info("🚦 Планировщик отправки в Telegram запущен")
+
+    async def stop(self) -> None:
+        """Остановить планировщик; ожидающие сообщения завершаются неудачей"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for lane in self._lanes.values():
+            while lane:
+                self._finish(lane.popleft(), DROPPED)
+
+    async def send(self, chat_id: int, text: str, priority: str = PRIORITY_CUSTOMER) -> bool:
+        """Поставить сообщение в очередь и дождаться результата"""
+        return (await self.deliver(chat_id, text, priority)).ok
+
+    async def deliver(self, chat_id: int, text: str, priority: str = PRIORITY_CUSTOMER) -> SendResult:
+        """Как send, но возвращает ответ Bot API (нужен статус, например 403)"""
+        if priority not in self._lanes:
+            raise ValueError(f"Unknown priority: {priority}")
+        if not self.running:
+            # Вне приложения (скрипты, тесты) отправляем напрямую
+            return await self._send(chat_id, text)
+
+        job = _Job(chat_id, text, priority, asyncio.get_running_loop().create_future(), time.monotonic())
+        if not self._make_room(priority):
+            self.stats.dropped += 1
+            logger.warning(f"Очередь отправки переполнена, сообщение в чат {chat_id} ({priority}) отброшено")
+            return DROPPED
+        self._lanes[priority].append(job)
+        self._wakeup.set()
+        return await job.future
+
+    def _make_room(self, priority: str) -> bool:
+        """Освободить место: вытесняется самое старое сообщение более низкого приоритета"""
+        if self.queue_depth() < self.max_queue:
+            return True
+        for lane in reversed(LANES[LANES.index(priority) + 1:]):
+            if self._lanes[lane]:
+                victim = self._lanes[lane].popleft()
+                self.stats.dropped += 1
+                logger.warning(f"Очередь отправки переполнена, вытеснено сообщение в чат {victim.chat_id} ({lane})")
+                self._finish(victim, DROPPED)
+                return True
+        return False
+
+    def queue_depth(self) -> int:
+        return sum(len(lane) for lane in self._lanes.values())
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= MAX_TRACKED_CHATS:
+                self._forget_idle_chats()
+            # Отрицательный chat_id - группа или канал
+            bucket = TokenBucket(self.group_rate if chat_id < 0 else self.chat_rate)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _forget_idle_chats(self) -> None:
+        now = time.monotonic()
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            if bucket.delay(now) == 0 and chat_id not in self._in_flight and self._chat_blocked.get(chat_id, 0) <= now:
+                del self._chat_buckets[chat_id]
+                self._chat_blocked.pop(chat_id, None)
+
+    def _next_job(self, now: float):
+        """Сообщение, которое можно отправить сейчас, или (None, через сколько секунд проверить снова)"""
+        if not self.queue_depth():
+            return None, None
+        global_wait = self._global.delay(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        wait = None
+        for lane in LANES:
+            queue = self._lanes[lane]
+            for index, job in enumerate(queue):
+                if index >= SCAN_LIMIT:
+                    break
+                if job.chat_id in self._in_flight:
+                    continue
+                job_wait = max(
+                    job.not_before - now,
+                    self._chat_blocked.get(job.chat_id, 0) - now,
+                    self._chat_bucket(job.chat_id).delay(now),
+                )
+                if job_wait > 0:
+                    wait = job_wait if wait is None else min(wait, job_wait)
+                    continue
+                del queue[index]
+                self._chat_bucket(job.chat_id).consume(now)
+                self._global.consume(now)
+                return job, None
+        return None, wait
+
+    async def _run(self) -> None:
+        while True:
+            job, wait = self._next_job(time.monotonic())
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._slots.acquire()
+            self._in_flight.add(job.chat_id)
+            task = asyncio.create_task(self._deliver(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _deliver(self, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = await self._send(job.chat_id, job.text)
+        except Exception as e:
+            logger.error(f"Ошибка отправки в чат {job.chat_id}: {e}")
+            result = SendResult(ok=False, description=str(e))
+        finally:
+            self._in_flight.discard(job.chat_id)
+            self._slots.release()
+
+        now = time.monotonic()
+        status = result.status
+        if result.ok:
+            self.stats.sent += 1
+            self.stats.latencies.append(now - job.enqueued_at)
+            self._finish(job, result)
+        elif (status == 429 or status == 0 or status >= 500) and job.attempts < self.max_attempts:
+            if status == 429:
+                self.stats.rate_limited += 1
+                # Telegram сам называет паузу; jitter разводит повторы по времени
+                self._chat_blocked[job.chat_id] = now + (result.retry_after or 1) * random.uniform(1.0, 1.2)
+            else:
+                job.not_before = now + min(2 ** job.attempts, 30) * random.uniform(0.5, 1.0)
+            self.stats.retried += 1
+            # Повтор идет первым в своей очереди, чтобы не нарушать порядок сообщений в чате
+            self._lanes[job.priority].appendleft(job)
+        else:
+            self.stats.failed += 1
+            self._finish(job, result)
+        self._wakeup.set()
+
+    @staticmethod
+    def _finish(job: _Job, result: SendResult) -> None:
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def metrics(self) -> dict:
+        latencies = list(self.stats.latencies)
+        now = time.monotonic()
+        return {
+            "running": self.running,
+            "queue_depth": {lane: len(queue) for lane, queue in self._lanes.items()},
+            "in_flight": len(self._in_flight),
+            "sent": self.stats.sent,
+            "failed": self.stats.failed,
+            "dropped": self.stats.dropped,
+            "retried": self.stats.retried,
+            "rate_limited": self.stats.rate_limited,
+            "blocked_chats": sum(1 for until in self._chat_blocked.values() if until > now),
+            "latency_ms": {
+                name: round(value * 1000, 1) if value is not None else None
+                for name, value in (
+                    ("p50", _percentile(latencies, 0.5)),
+                    ("p95", _percentile(latencies, 0.95)),
+                    ("p99", _percentile(latencies, 0.99)),
+                )
+            },
+        }
@@ -1,41 +1,109 @@
 """
 Утилиты для отправки уведомлений в Telegram
 """
+import asyncio
 import aiohttp
 import os
 import logging
+from typing import Optional
+
+from .send_scheduler import SendScheduler, SendResult, PRIORITY_CUSTOMER, PRIORITY_ADMIN
 
 logger = logging.getLogger(__name__)
 
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID')
+# Можно направить на локальный Bot API сервер или заглушку в тестах
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')
+# Сколько одновременных соединений держит пул к Bot API
+TELEGRAM_CONNECTOR_LIMIT = int(os.getenv('TELEGRAM_CONNECTOR_LIMIT', '20'))
+TELEGRAM_TIMEOUT = float(os.getenv('TELEGRAM_TIMEOUT', '10'))
+# Максимальная длина текста sendMessage
+TELEGRAM_MESSAGE_LIMIT = 4096
+# Кэш DNS и время жизни простаивающего keep-alive соединения (сек)
+DNS_CACHE_TTL = 300
+KEEPALIVE_TIMEOUT = 60
 
-async def send_telegram_message(chat_id: int, text: str):
-    """Отправить сообщение в Telegram"""
-    if not BOT_TOKEN:
-        logger.error("BOT_TOKEN не найден")
-        return
-    
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    
-    async with aiohttp.ClientSession() as session:
+class TelegramNotifier:
+    """Клиент Bot API с одной долгоживущей сессией и пулом keep-alive соединений"""
+
+    def __init__(self, token: Optional[str] = BOT_TOKEN, api_url: str = TELEGRAM_API_URL,
+                 limit: int = TELEGRAM_CONNECTOR_LIMIT, timeout: float = TELEGRAM_TIMEOUT):
+        self.token = token
+        self.api_url = api_url
+        self.limit = limit
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def start(self) -> aiohttp.ClientSession:
+        """Открыть сессию (на старте приложения); повторный вызов вернет текущую"""
+        loop = asyncio.get_running_loop()
+        # Сессия привязана к event loop: в другом цикле (скрипты, тесты) открываем новую
+        if self._session is not None and not self._session.closed and self._loop is loop:
+            return self._session
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            ttl_dns_cache=DNS_CACHE_TTL,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._loop = loop
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._loop = None
+
+    async def send_message(self, chat_id: int, text: str, parse_mode: str = "HTML") -> SendResult:
+        if not self.token:
+            logger.error("BOT_TOKEN не найден")
+            return SendResult(ok=False, description="BOT_TOKEN is not set")
+
+        session = await self.start()
+        url = f"{self.api_url}/bot{self.token}/sendMessage"
         try:
             async with session.post(url, json={
                 "chat_id": chat_id,
                 "text": text,
-                "parse_mode": "HTML"
+                "parse_mode": parse_mode
             }) as response:
                 if response.status == 200:
+                    # Тело успешного ответа не нужно, но его надо дочитать, чтобы соединение вернулось в пул
+                    await response.read()
                     logger.info(f"Сообщение отправлено в чат {chat_id}")
-                else:
-                    logger.error(f"Ошибка отправки сообщения: {response.status}")
+                    return SendResult(ok=True, status=200)
+                try:
+                    data = await response.json(content_type=None)
+                except Exception:
+                    data = {}
+                retry_after = (data.get("parameters") or {}).get("retry_after")
+                logger.error(f"Ошибка отправки сообщения: {response.status} {data.get('description', '')}")
+                return SendResult(
+                    ok=False,
+                    status=response.status,
+                    retry_after=float(retry_after) if retry_after is not None else None,
+                    description=data.get("description"),
+                )
         except Exception as e:
             logger.error(f"Ошибка отправки сообщения: {e}")
+            return SendResult(ok=False, description=str(e))
 
-async def send_order_notification(order_id: int, order_data: dict):
-    """Отправить уведомление о заказе"""
-    
-    # Уведомление админу
+notifier = TelegramNotifier()
+# Лимиты Bot API и приоритеты; пока планировщик не запущен, send отправляет напрямую
+send_scheduler = SendScheduler(notifier.send_message)
+
+async def send_telegram_message(chat_id: int, text: str, priority: str = PRIORITY_CUSTOMER) -> bool:
+    """Отправить сообщение в Telegram; True, если Telegram принял сообщение"""
+    return await send_scheduler.send(chat_id, text, priority)
+
+def render_admin_order(order_id: int, order_data: dict) -> str:
+    """Текст уведомления админу о новом заказе"""
     admin_text = f"""🆕 <b>Новый заказ #{order_id}</b>
 
 👤 <b>Клиент:</b> {order_data['name']}
@@ -55,10 +123,11 @@ async def send_order_notification(order_id: int, order_data: dict):
     if order_data.get('card_text'):
         admin_text += f"\n💌 <b>Открытка:</b> {order_data['card_text']}"
     
-    await send_telegram_message(int(ADMIN_CHAT_ID), admin_text)
-    
-    # Уведомление клиенту
-    client_text = f"""✅ <b>Заказ #{order_id} принят!</b>
+    return admin_text
+
+def render_client_order(order_id: int, order_data: dict) -> str:
+    """Текст подтверждения заказа клиенту"""
+    return f"""✅ <b>Заказ #{order_id} принят!</b>
 
 Спасибо за заказ! Мы свяжемся с вами для подтверждения деталей.
 
@@ -66,8 +135,62 @@ async def send_order_notification(order_id: int, order_data: dict):
 💰 <b>Сумма:</b> {order_data['total']:,} VND
 
 <b>Статус:</b> Ожидаем подтверждения"""
+
+def render_admin_digest(orders: list) -> str:
+    """Сводка нескольких заказов одним сообщением: строка на заказ и его позиции"""
+    total = sum(order['total'] for order in orders)
+    lines = [
+        f"🧾 <b>Новые заказы: {len(orders)}</b>",
+        f"💰 <b>Итого:</b> {total:,} VND",
+        "",
+    ]
+    for order in orders:
+        lines.append(
+            f"<b>#{order['order_id']}</b> {order['name']} · {order['phone']} · "
+            f"{order['delivery_date']} {order['delivery_time']} · {order['total']:,} VND"
+        )
+        for item in order['items']:
+            lines.append(f"  • {item['product_name']} ({item['size']}) x{item['quantity']}")
+    return "\n".join(lines)
+
+def render_reminder(event_name: str, event_date, days_before: int) -> str:
+    """Текст напоминания о событии клиента"""
+    when = "сегодня" if days_before == 0 else f"через {days_before} дн."
+    return f"""🔔 <b>Напоминание</b>
+
+{event_name} - {event_date:%d.%m.%Y} ({when})
+
+🌸 Закажите букет заранее, и мы доставим его точно в срок!"""
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> list:
+    """Разбить текст на части не длиннее limit по границам строк"""
+    parts, current = [], ""
+    for line in text.split("\n"):
+        # Строку длиннее лимита приходится резать посередине
+        while len(line) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(line[:limit])
+            line = line[limit:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > limit:
+            parts.append(current)
+            current = line
+        else:
+            current = candidate
+    if current or not parts:
+        parts.append(current)
+    return parts
+
+async def send_order_notification(order_id: int, order_data: dict):
+    """Отправить уведомление о заказе сразу (без outbox)"""
     
-    await send_telegram_message(order_data['telegram_id'], client_text)
+    # Уведомление админу
+    await send_telegram_message(int(ADMIN_CHAT_ID), render_admin_order(order_id, order_data), PRIORITY_ADMIN)
+    
+    # Уведомление клиенту
+    await send_telegram_message(order_data['telegram_id'], render_client_order(order_id, order_data))
 
 async def send_status_update(telegram_id: int, order_id: int, status: str):
     """Отправить обновление статуса заказа"""
@@ -0,0 +1,228 @@
+"""
+Нагрузочный стенд бота: воспроизведение апдейтов через Dispatcher
+с хендлерами из bot/handlers и подменным Bot API.
+
+Апдейты берутся из JSONL, записанного ботом с UPDATE_RECORD_FILE
+(bot/recorder.py, уже обезличены), или генерируются: /start, кнопки
+клавиатуры и произвольный текст от --users пользователей. Каждый апдейт
+проходит тот же путь, что в webhook: валидация Update и dp.feed_update.
+Ответы бота уходят на локальный aiohttp-сервер вместо api.telegram.org,
+--api-latency добавляет задержку Telegram.
+
+Отчет: пропускная способность, p50/p95/p99 времени обработки, задержка от
+планового времени прихода (растет, когда стенд не успевает) и лаг event loop.
+
+Запуск из каталога flower_shop:
+    python -m benchmarks.bench_bot_replay --updates 5000 --rate 500 --concurrency 50
+    python -m benchmarks.bench_bot_replay --input updates.jsonl --loops 3 --middlewares
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from typing import List
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bot'))
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import Update
+
+TOKEN = "42:BENCH"
+TEXTS = ["/start", "🛍 Магазин", "🔁 Повторить", "📦 Мои заказы", "💬 Поддержка", "привет, есть розы?"]
+LAG_INTERVAL = 0.01
+SAMPLE_SUMMARY = {
+    "orders_count": 2,
+    "recent_orders": [{"id": 2, "status": "delivered", "total": 1200000, "created_at": "2025-10-15T10:00:00"},
+                      {"id": 1, "status": "delivered", "total": 800000, "created_at": "2025-10-10T10:00:00"}],
+    "last_order_id": 2,
+    "last_order_items": [{"product_id": 1, "product_name": "Розы премиум", "size": "large",
+                          "price": 1200000, "quantity": 1}],
+}
+
+
+def synthetic_updates(count: int, users: int) -> List[dict]:
+    """Смесь команд, кнопок и текста от users пользователей"""
+    rng = random.Random(42)
+    updates = []
+    for index in range(count):
+        user_id = rng.randint(1, users)
+        updates.append({
+            "update_id": index + 1,
+            "message": {
+                "message_id": index + 1,
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": "Bench"},
+                "text": rng.choice(TEXTS),
+            },
+        })
+    return updates
+
+
+def load_updates(path: str) -> List[dict]:
+    with open(path, encoding='utf-8') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+async def start_fake_telegram(latency: float) -> tuple:
+    """Отвечает на любой метод Bot API (для send*/edit* - правдоподобное сообщение) и сводку заказов"""
+    calls = {"count": 0}
+
+    async def handle(request: web.Request) -> web.Response:
+        calls["count"] += 1
+        # aiogram шлет параметры как multipart/form-data
+        params = dict(await request.post())
+        if latency:
+            await asyncio.sleep(latency)
+        method = request.match_info["method"].lower()
+        if method.startswith(("send", "edit")):
+            chat_id = int(params.get("chat_id", 1))
+            result = {"message_id": calls["count"], "date": int(time.time()),
+                      "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def order_summary(request: web.Request) -> web.Response:
+        # Сводка заказов для кнопок бота (в проде - backend API)
+        return web.json_response(SAMPLE_SUMMARY)
+
+    app = web.Application()
+    app.router.add_post("/bot{token}/{method}", handle)
+    app.router.add_get("/api/orders/{telegram_id}/summary", order_summary)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}", calls
+
+
+def build_dispatcher(middlewares: bool) -> Dispatcher:
+    """Те же роутеры (и по желанию middleware), что в bot/bot.py"""
+    from handlers import start
+    dp = Dispatcher()
+    if middlewares:
+        from dedup import DedupMiddleware, UpdateDeduplicator
+        from throttling import setup_throttling
+        dp.update.outer_middleware(DedupMiddleware(UpdateDeduplicator()))
+        setup_throttling(dp)
+    dp.include_router(start.router)
+    return dp
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def monitor_loop_lag(samples: List[float], stop: asyncio.Event) -> None:
+    """Насколько позже запланированного просыпается sleep - лаг event loop"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        samples.append(time.perf_counter() - started - LAG_INTERVAL)
+
+
+async def replay(dp: Dispatcher, bot: Bot, updates: List[dict], rate: float, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, delays, lags = [], [], []
+    errors = 0
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(lags, stop))
+
+    async def one(index: int, data: dict, arrival: float):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                update = Update.model_validate(data, context={"bot": bot})
+                await dp.feed_update(bot, update)
+            except Exception:
+                errors += 1
+            finished = time.perf_counter()
+            latencies.append(finished - started)
+            delays.append(finished - arrival)
+
+    started = time.perf_counter()
+    tasks = []
+    for index, data in enumerate(updates):
+        arrival = started + index / rate if rate else started
+        pause = arrival - time.perf_counter()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        tasks.append(asyncio.create_task(one(index, data, arrival)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await lag_task
+
+    def ms(value: float) -> float:
+        return round(value * 1000, 2)
+
+    return {
+        "updates": len(updates),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(updates) / elapsed, 1),
+        "latency_ms": {f"p{int(q * 100)}": ms(percentile(latencies, q)) for q in (0.5, 0.95, 0.99)},
+        "delay_ms": {f"p{int(q * 100)}": ms(percentile(delays, q)) for q in (0.5, 0.95, 0.99)},
+        "loop_lag_ms": {"p50": ms(percentile(lags, 0.5)), "p99": ms(percentile(lags, 0.99)),
+                        "max": ms(max(lags) if lags else 0.0)},
+    }
+
+
+async def run(args) -> dict:
+    updates = load_updates(args.input) if args.input else synthetic_updates(args.updates, args.users)
+    # Повторы записи получают новые update_id, иначе dedup отбросит их
+    replayed = []
+    for loop in range(args.loops):
+        for data in updates:
+            replayed.append({**data, "update_id": len(replayed) + 1})
+
+    runner, api_url, calls = await start_fake_telegram(args.api_latency / 1000)
+    from order_summary import order_summaries
+    order_summaries.api_url = api_url
+    session = AiohttpSession(api=TelegramAPIServer.from_base(api_url))
+    bot = Bot(token=TOKEN, session=session)
+    try:
+        report = await replay(build_dispatcher(args.middlewares), bot, replayed, args.rate, args.concurrency)
+        report["api_calls"] = calls["count"]
+        return report
+    finally:
+        await bot.session.close()
+        await order_summaries.close()
+        await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="JSONL с записанными апдейтами")
+    parser.add_argument("--updates", type=int, default=2000, help="сколько сгенерировать без --input")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--loops", type=int, default=1, help="сколько раз проиграть запись")
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду, 0 - без ограничения")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--api-latency", type=float, default=0, help="задержка подменного Bot API, мс")
+    parser.add_argument("--middlewares", action="store_true", help="dedup и throttling, как в проде")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level)
+    report = asyncio.run(run(args))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Микро-бенчмарк GET /api/products: прежний путь (список dict + jsonable_encoder)
+против готовых байтов из снимка каталога.
+
+Запуск из каталога flower_shop:
+    python -m benchmarks.bench_catalog --products 500 --requests 2000
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+from fastapi import FastAPI, Request
+
+from backend.utils.catalog_cache import build_snapshot
+from backend.utils.http_cache import cached_json_response
+
+
+class Row:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def make_rows(count: int):
+    categories = ["roses", "exotic", "mix", "mono"]
+    return [
+        Row(
+            id=i,
+            name=f"🌹 Букет №{i}",
+            category=categories[i % len(categories)],
+            description="Свежие цветы с доставкой по Нячангу. " * 8,
+            price=500000 + i * 1000,
+            photo_url=f"https://images.example.com/{i}.jpg",
+            is_popular=i % 5 == 0,
+            is_available=True,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def legacy_app(rows) -> FastAPI:
+    """Путь до кэширования: dict на каждый товар и стандартный JSONResponse"""
+    app = FastAPI()
+
+    @app.get("/api/products")
+    async def get_products(category: str = None, popular: bool = None):
+        products = [p for p in rows if p.is_available]
+        if category:
+            products = [p for p in products if p.category == category]
+        if popular is not None:
+            products = [p for p in products if p.is_popular == popular]
+        return [
+            {
+                "id": p.id,
+                "name": p.name,
+                "category": p.category,
+                "description": p.description,
+                "price": p.price,
+                "photo_url": p.photo_url,
+                "is_popular": p.is_popular
+            }
+            for p in products
+        ]
+
+    return app
+
+
+def cached_app(rows) -> FastAPI:
+    """Текущий путь: готовые байты выборки из снимка"""
+    app = FastAPI()
+    snapshot = build_snapshot(rows, version=1)
+
+    @app.get("/api/products")
+    async def get_products(request: Request, category: str = None, popular: bool = None):
+        return cached_json_response(request, snapshot.encoded_view(category, popular))
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int, headers: dict = None) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.get("/api/products", headers=headers)  # прогрев
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await client.get("/api/products", headers=headers)
+            assert response.status_code in (200, 304)
+        elapsed = time.perf_counter() - started
+    return requests / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.products)
+    etag = build_snapshot(rows, version=1).encoded_view().etag
+
+    scenarios = [
+        ("legacy: dict list + jsonable_encoder", legacy_app(rows), None),
+        ("cached: raw bytes", cached_app(rows), None),
+        ("cached: raw bytes, gzip", cached_app(rows), {"Accept-Encoding": "gzip"}),
+        ("cached: If-None-Match -> 304", cached_app(rows), {"If-None-Match": etag}),
+    ]
+
+    print(f"Каталог: {args.products} товаров, запросов на сценарий: {args.requests}")
+    baseline = None
+    for title, app, headers in scenarios:
+        rps = await measure(app, args.requests, headers)
+        baseline = baseline or rps
+        print(f"{title:<40} {rps:>10.0f} req/s  x{rps / baseline:.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""
+Бенчмарк отправки уведомлений: новая aiohttp-сессия на каждое сообщение
+(прежний send_telegram_message) против общей сессии TelegramNotifier.
+
+Bot API подменяется локальным aiohttp-сервером, поэтому сеть и TLS не
+участвуют; на api.telegram.org разница больше, так как каждая новая сессия
+платит еще и за TLS-рукопожатие.
+
+Запуск из каталога flower_shop:
+    python -m benchmarks.bench_notifier --messages 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+from aiohttp import web
+
+from backend.utils.telegram_notify import TelegramNotifier
+
+TOKEN = "bench"
+
+
+async def fake_send_message(request: web.Request) -> web.Response:
+    await request.json()
+    return web.json_response({"ok": True, "result": {"message_id": 1}})
+
+
+async def start_fake_telegram() -> tuple:
+    app = web.Application()
+    app.router.add_post(f"/bot{TOKEN}/sendMessage", fake_send_message)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+async def measure(send, messages: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index: int):
+        async with semaphore:
+            assert await send(index)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    return messages / (time.perf_counter() - started)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+
+    runner, api_url = await start_fake_telegram()
+    url = f"{api_url}/bot{TOKEN}/sendMessage"
+
+    async def session_per_message(index: int) -> bool:
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json={"chat_id": index, "text": "bench", "parse_mode": "HTML"}) as response:
+                return response.status == 200
+
+    notifier = TelegramNotifier(token=TOKEN, api_url=api_url, limit=args.concurrency)
+    await notifier.start()
+
+    async def shared_session(index: int) -> bool:
+        return (await notifier.send_message(index, "bench")).ok
+
+    print(f"Сообщений: {args.messages}, параллельно: {args.concurrency}")
+    baseline = None
+    try:
+        for title, send in (("session per message", session_per_message), ("shared pooled session", shared_session)):
+            rate = await measure(send, args.messages, args.concurrency)
+            baseline = baseline or rate
+            print(f"{title:<24} {rate:>8.0f} msg/s  x{rate / baseline:.2f}")
+    finally:
+        await notifier.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -3,14 +3,25 @@ Telegram Bot для заказа цветов в Нячанге
 Создан по ТЗ - точно как указано в требованиях
 """
 import os
+import sys
 import logging
 import asyncio
+
+# Общий с backend пакет flower_shop/shared (в образе бота лежит рядом, см. bot/Dockerfile)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 from aiohttp import web
 from dotenv import load_dotenv
 
+from dedup import DedupMiddleware, create_deduplicator
+from catalog import catalog_index
+from order_summary import order_summaries
+from recorder import setup_recorder
+from storage import create_storage, setup_storage_cache
+from throttling import setup_throttling
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -29,18 +40,33 @@ logger = logging.getLogger(__name__)
 BOT_TOKEN = os.getenv('BOT_TOKEN')
 if not BOT_TOKEN:
     raise ValueError("BOT_TOKEN не найден в переменных окружения")
+# Секрет в заголовке X-Telegram-Bot-Api-Secret-Token (пусто - не проверяется)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
 
 async def main():
     """Основная функция запуска бота"""
     try:
         # Создаем бота и диспетчер
         bot = Bot(token=BOT_TOKEN)
-        storage = MemoryStorage()
+        # Redis или таблица в БД: диалоги переживают редеплой и работают с несколькими репликами
+        storage = create_storage()
         dp = Dispatcher(storage=storage)
+        # Кэш состояния FSM только на время апдейта
+        setup_storage_cache(dp)
+        # Запись апдейтов для нагрузочного стенда (UPDATE_RECORD_FILE)
+        recorder = setup_recorder(dp)
+        # Повторные доставки Telegram отбрасываем по update_id
+        deduplicator = create_deduplicator(prefix=str(bot.id))
+        dp.update.outer_middleware(DedupMiddleware(deduplicator))
+        # Лимит частоты на пользователя, до хендлеров
+        throttling = setup_throttling(dp)
         
         # Регистрация handlers через Router
-        from handlers import start as start
+        from handlers import start as start, inline as inline
         dp.include_router(start.router)
+        dp.include_router(inline.router)
+        # Каталог для inline-поиска держим в памяти и обновляем в фоне
+        catalog_index.start()
         
         # Настраиваем webhook для Railway
         webhook_path = "/webhook"
@@ -53,18 +79,12 @@ async def main():
         else:
             webhook_url = os.getenv("WEBHOOK_URL", f"https://flowersbot-production.up.railway.app{webhook_path}")
         
-        # Устанавливаем webhook
+        # Устанавливаем webhook: всегда, даже если URL не изменился - getWebhookInfo
+        # не возвращает секрет, а новый WEBHOOK_SECRET должен дойти до Telegram
         logger.info(f"🔗 Устанавливаем webhook: {webhook_url}")
         try:
-            webhook_info = await bot.get_webhook_info()
-            logger.info(f"📊 Текущий webhook: {webhook_info.url}")
-            
-            if webhook_info.url != webhook_url:
-                logger.info(f"🔄 Обновляем webhook с {webhook_info.url} на {webhook_url}")
-                await bot.set_webhook(webhook_url)
-                logger.info("✅ Webhook установлен успешно")
-            else:
-                logger.info("✅ Webhook уже установлен правильно")
+            await bot.set_webhook(webhook_url, secret_token=WEBHOOK_SECRET or None)
+            logger.info("✅ Webhook установлен успешно")
         except Exception as e:
             logger.error(f"❌ Ошибка установки webhook: {e}")
             raise
@@ -98,6 +118,11 @@ async def main():
             return web.Response(text=f"Webhook URL: {info.url}\nPending: {info.pending_update_count}", status=200)
         app.router.add_get("/test-webhook", test_webhook)
 
+        # Счетчики ограничения частоты
+        async def throttling_metrics(request: web.Request) -> web.Response:
+            return web.json_response(throttling.metrics())
+        app.router.add_get("/metrics/throttling", throttling_metrics)
+
         # Корневой эндпоинт для простого ответа
         async def root(request: web.Request) -> web.Response:
             return web.Response(text="BOT OK", status=200)
@@ -107,6 +132,7 @@ async def main():
         webhook_requests_handler = SimpleRequestHandler(
             dispatcher=dp,
             bot=bot,
+            secret_token=WEBHOOK_SECRET or None,
         )
         webhook_requests_handler.register(app, path=webhook_path)
         
@@ -122,6 +148,14 @@ async def main():
         raise
     finally:
         await bot.session.close()
+        if 'storage' in locals():
+            await storage.close()
+        if 'deduplicator' in locals():
+            await deduplicator.close()
+        await order_summaries.close()
+        await catalog_index.stop()
+        if locals().get('recorder'):
+            recorder.close()
 
 if __name__ == "__main__":
     try:
@@ -0,0 +1,114 @@
+"""
+Каталог товаров в памяти бота для inline-поиска (@bot розы)
+
+Inline-запрос приходит на каждое нажатие клавиши, поэтому бот не ходит за
+ним в API: каталог загружается из GET /api/products и индексируется тем же
+триграммным индексом, что и поиск в backend. Раз в CATALOG_REFRESH секунд
+бот перечитывает каталог с If-None-Match: пока каталог не изменился, API
+отвечает 304 без тела и индекс не пересобирается. В едином процессе с API
+(unified_server.py) вместо HTTP передается source - снимок каталога backend.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+import aiohttp
+from shared.search_index import TrigramIndex
+
+from order_summary import API_URL
+
+logger = logging.getLogger(__name__)
+
+CATALOG_REFRESH = float(os.getenv('CATALOG_REFRESH', '60'))
+# Больше 50 результатов на одну страницу Telegram не принимает
+INLINE_PAGE_SIZE = 20
+MAX_INLINE_RESULTS = 50
+API_TIMEOUT = 10
+
+
+class CatalogIndex:
+    """Доступные товары и триграммный индекс по названию и описанию"""
+
+    def __init__(self, api_url: str = API_URL, refresh_interval: float = CATALOG_REFRESH,
+                 source: Optional[Callable[[], Awaitable[Optional[List[dict]]]]] = None):
+        self.api_url = api_url
+        self.refresh_interval = refresh_interval
+        # source() -> список товаров или None, если каталог не изменился
+        self.source = source or self._fetch_api
+        self.products: dict = {}
+        self.ordered: List[dict] = []  # для пустого запроса: популярные, затем новые
+        self.index = TrigramIndex()
+        self.etag: Optional[str] = None
+        self.loaded_at: Optional[float] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def load(self, products: List[dict]) -> int:
+        """Заменить каталог; переиндексируются только изменившиеся товары"""
+        changed = self.index.sync((p["id"], p.get("name"), p.get("description")) for p in products)
+        self.products = {p["id"]: p for p in products}
+        # API отдает товары по id; новее - больший id (created_at в снимке нет)
+        self.ordered = sorted(products, key=lambda p: (not p.get("is_popular"), -p["id"]))
+        self.loaded_at = time.monotonic()
+        return changed
+
+    async def _fetch_api(self) -> Optional[List[dict]]:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=API_TIMEOUT))
+        headers = {"If-None-Match": self.etag} if self.etag else {}
+        async with self._session.get(f"{self.api_url}/api/products", headers=headers) as response:
+            if response.status == 304:
+                return None
+            response.raise_for_status()
+            products = await response.json()
+            self.etag = response.headers.get("ETag")
+        return products
+
+    async def refresh(self) -> bool:
+        """Перечитать каталог из источника; False - не изменился"""
+        products = await self.source()
+        if products is None:
+            self.loaded_at = time.monotonic()
+            return False
+        changed = self.load(products)
+        logger.info(f"🗂 Каталог для inline-поиска: {len(products)} товаров, изменено {changed}")
+        return True
+
+    def search(self, query: str, offset: int = 0, limit: int = INLINE_PAGE_SIZE) -> Tuple[List[dict], Optional[int]]:
+        """Страница результатов и offset следующей (None - больше нет)"""
+        if query.strip():
+            ids = [doc_id for doc_id, _ in self.index.search(query, MAX_INLINE_RESULTS)]
+            found = [self.products[doc_id] for doc_id in ids if doc_id in self.products]
+        else:
+            found = self.ordered[:MAX_INLINE_RESULTS]
+        page = found[offset:offset + limit]
+        next_offset = offset + limit if offset + limit < len(found) else None
+        return page, next_offset
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Пока API недоступен, отвечаем по последнему загруженному каталогу
+                logger.error(f"❌ Не удалось обновить каталог: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._session is not None:
+            await self._session.close()
+
+
+catalog_index = CatalogIndex()
@@ -0,0 +1,245 @@
+"""
+Защита от повторной доставки апдейтов по update_id
+
+Telegram повторяет апдейт, если webhook не ответил вовремя или вернул ошибку,
+и без проверки та же кнопка или заказ обрабатываются дважды.
+UpdateDeduplicator помнит последние DEDUP_WINDOW update_id (кольцевой буфер
+плюс множество): проверка O(1), память ограничена окном.
+
+Если webhook принимают несколько реплик или воркеров, нужна общая проверка,
+локальное окно остается быстрым первым фильтром:
+- redis: SET NX с TTL (REDIS_URL);
+- sql: INSERT ... ON CONFLICT DO NOTHING в таблицу processed_updates
+  (миграция backend 0009), строки старше DEDUP_TTL удаляются.
+Низкую границу по update_id не используем: после недели без апдейтов Telegram
+начинает нумерацию со случайного значения.
+"""
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+from sqlalchemy import Column, DateTime, MetaData, String, Table, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from storage import database_url
+
+logger = logging.getLogger(__name__)
+
+# memory, redis или sql; по умолчанию redis при REDIS_URL, иначе sql при DATABASE_URL
+DEDUP_STORAGE = os.getenv('DEDUP_STORAGE', '')
+REDIS_URL = os.getenv('REDIS_URL', '')
+DEDUP_WINDOW = int(os.getenv('DEDUP_WINDOW', '10000'))
+# Сколько секунд update_id хранится в Redis/БД
+DEDUP_TTL = int(os.getenv('DEDUP_TTL', '86400'))
+# Как часто удалять старые update_id из таблицы (сек)
+PURGE_INTERVAL = 600
+
+# Схема таблицы - в миграциях backend (0009_processed_updates)
+metadata = MetaData()
+
+processed_updates_table = Table(
+    'processed_updates',
+    metadata,
+    Column('key', String(64), primary_key=True),
+    Column('created_at', DateTime, nullable=False),
+)
+
+
+class UpdateDeduplicator:
+    """Скользящее окно последних update_id в памяти процесса"""
+
+    def __init__(self, window: int = DEDUP_WINDOW):
+        self.window = window
+        self._order = deque()
+        self._seen = set()
+        self.duplicates = 0
+
+    def __contains__(self, update_id: int) -> bool:
+        return update_id in self._seen
+
+    def add(self, update_id: int) -> bool:
+        """Запомнить update_id; False - такой уже был"""
+        if update_id in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen.add(update_id)
+        self._order.append(update_id)
+        if len(self._order) > self.window:
+            self._seen.discard(self._order.popleft())
+        return True
+
+    def forget(self, update_id: int) -> None:
+        """Забыть update_id, например если апдейт не приняли в обработку"""
+        if update_id not in self._seen:
+            return
+        self._seen.discard(update_id)
+        # Убираем и из буфера: иначе после повторного add в нем две копии, и
+        # вытеснение старой удалит из _seen id, который еще внутри окна.
+        # O(окна), но forget редкий (очередь полна, ошибка хранилища)
+        self._order.remove(update_id)
+
+    async def check(self, update_id: int) -> bool:
+        return self.add(update_id)
+
+    async def release(self, update_id: int) -> None:
+        self.forget(update_id)
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisDeduplicator(UpdateDeduplicator):
+    """Локальное окно плюс общий для реплик ключ в Redis (SET NX EX)"""
+
+    def __init__(self, redis, window: int = DEDUP_WINDOW, ttl: int = DEDUP_TTL, prefix: str = "update"):
+        super().__init__(window)
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, update_id: int) -> str:
+        return f"dedup:{self.prefix}:{update_id}"
+
+    async def check(self, update_id: int) -> bool:
+        if not self.add(update_id):
+            return False
+        try:
+            is_new = await self.redis.set(self._key(update_id), 1, nx=True, ex=self.ttl)
+        except Exception as e:
+            # Redis недоступен - не теряем апдейт, полагаемся на локальное окно
+            logger.warning(f"⚠️ Redis недоступен для проверки апдейта {update_id}: {e}")
+            return True
+        if not is_new:
+            self.duplicates += 1
+            return False
+        return True
+
+    async def release(self, update_id: int) -> None:
+        self.forget(update_id)
+        try:
+            await self.redis.delete(self._key(update_id))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось снять отметку апдейта {update_id}: {e}")
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+class SQLDeduplicator(UpdateDeduplicator):
+    """Локальное окно плюс общая для воркеров таблица processed_updates"""
+
+    def __init__(self, engine: AsyncEngine, window: int = DEDUP_WINDOW, ttl: int = DEDUP_TTL,
+                 prefix: str = "update", owns_engine: bool = False):
+        super().__init__(window)
+        self.engine = engine
+        self.ttl = ttl
+        self.prefix = prefix
+        self.owns_engine = owns_engine
+        self._last_purge = 0.0
+
+    def _key(self, update_id: int) -> str:
+        return f"{self.prefix}:{update_id}"
+
+    def _insert(self, key: str):
+        values = {"key": key, "created_at": datetime.utcnow()}
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return processed_updates_table.insert().values(**values)
+        return insert(processed_updates_table).values(**values).on_conflict_do_nothing(index_elements=['key'])
+
+    async def check(self, update_id: int) -> bool:
+        if not self.add(update_id):
+            return False
+        try:
+            async with self.engine.begin() as conn:
+                is_new = (await conn.execute(self._insert(self._key(update_id)))).rowcount == 1
+        except IntegrityError:
+            is_new = False
+        except Exception as e:
+            # БД недоступна - не теряем апдейт, полагаемся на локальное окно
+            logger.warning(f"⚠️ БД недоступна для проверки апдейта {update_id}: {e}")
+            return True
+        if not is_new:
+            self.duplicates += 1
+            return False
+        await self._maybe_purge()
+        return True
+
+    async def _maybe_purge(self) -> None:
+        """Удалить update_id старше ttl: Telegram столько повторы не шлет"""
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        table = processed_updates_table
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(delete(table).where(
+                    table.c.created_at < datetime.utcnow() - timedelta(seconds=self.ttl)
+                ))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось очистить processed_updates: {e}")
+
+    async def release(self, update_id: int) -> None:
+        self.forget(update_id)
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(delete(processed_updates_table).where(
+                    processed_updates_table.c.key == self._key(update_id)
+                ))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось снять отметку апдейта {update_id}: {e}")
+
+    async def close(self) -> None:
+        if self.owns_engine:
+            await self.engine.dispose()
+
+
+class DedupMiddleware(BaseMiddleware):
+    """Внешний middleware на dp.update: повторные апдейты не доходят до хендлеров"""
+
+    def __init__(self, deduplicator: UpdateDeduplicator):
+        self.deduplicator = deduplicator
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update) and not await self.deduplicator.check(event.update_id):
+            logger.info(f"🔁 Повторный апдейт {event.update_id} пропущен")
+            return None
+        return await handler(event, data)
+
+
+def create_deduplicator(kind: Optional[str] = None, prefix: str = "update",
+                        engine: Optional[AsyncEngine] = None) -> UpdateDeduplicator:
+    """Дедупликатор по DEDUP_STORAGE; prefix разделяет ботов в одном Redis/таблице"""
+    kind = (kind or DEDUP_STORAGE).lower()
+    if not kind:
+        kind = 'redis' if REDIS_URL else ('sql' if (engine is not None or os.getenv('DATABASE_URL')) else 'memory')
+    if kind == 'memory':
+        if int(os.getenv('WEB_CONCURRENCY', '1')) > 1:
+            logger.warning("⚠️ Повторы апдейтов проверяются только в памяти воркера, а воркеров несколько")
+        return UpdateDeduplicator()
+    if kind == 'redis':
+        from redis.asyncio import Redis
+        logger.info("🔁 Проверка повторных апдейтов через Redis")
+        return RedisDeduplicator(Redis.from_url(REDIS_URL or 'redis://localhost:6379/0'), prefix=prefix)
+    if kind == 'sql':
+        owns_engine = engine is None
+        if engine is None:
+            engine = create_async_engine(database_url(os.getenv('DATABASE_URL', '')), pool_pre_ping=True)
+        logger.info("🔁 Проверка повторных апдейтов через БД")
+        return SQLDeduplicator(engine, prefix=prefix, owns_engine=owns_engine)
+    raise ValueError(f"Unknown DEDUP_STORAGE: {kind}")
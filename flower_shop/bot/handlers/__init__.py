@@ -1,3 +1,4 @@
 from . import start_handler as start
+from . import inline_handler as inline
 
-__all__ = ["start"]
+__all__ = ["start", "inline"]
@@ -0,0 +1,50 @@
+"""
+Inline-режим: поиск по каталогу в любом чате (@bot розы)
+"""
+import html
+import logging
+from aiogram import Bot, Router
+from aiogram.types import (InlineQuery, InlineQueryResultArticle, InputTextMessageContent,
+                           InlineKeyboardMarkup, InlineKeyboardButton)
+
+from catalog import catalog_index
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+# Одинаковые для всех пользователей результаты Telegram кэширует у себя
+INLINE_CACHE_TIME = 300
+
+
+def product_result(product: dict, bot_username: str) -> InlineQueryResultArticle:
+    """Карточка товара: название, цена, описание и кнопка заказа в боте"""
+    price = f"{product.get('price') or 0:,} VND"
+    description = product.get("description") or ""
+    return InlineQueryResultArticle(
+        id=str(product["id"]),
+        title=product["name"],
+        description=f"{price} · {description}"[:200],
+        thumbnail_url=product.get("photo_url") or None,
+        input_message_content=InputTextMessageContent(
+            message_text=f"🌸 <b>{html.escape(product['name'])}</b>\n💰 {price}\n\n{html.escape(description)}",
+            parse_mode='HTML',
+        ),
+        reply_markup=InlineKeyboardMarkup(inline_keyboard=[[
+            InlineKeyboardButton(text="🛍 Заказать", url=f"https://t.me/{bot_username}?start=product_{product['id']}")
+        ]]),
+    )
+
+
+@router.inline_query()
+async def inline_search(inline_query: InlineQuery, bot: Bot):
+    """Ответ из каталога в памяти, страницы по INLINE_PAGE_SIZE"""
+    offset = int(inline_query.offset) if inline_query.offset.isdigit() else 0
+    products, next_offset = catalog_index.search(inline_query.query, offset)
+    me = await bot.me()
+    await inline_query.answer(
+        [product_result(product, me.username) for product in products],
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=False,
+        next_offset=str(next_offset) if next_offset is not None else "",
+    )
@@ -2,19 +2,38 @@
 Обработчики команд бота - точно по ТЗ
 """
 import logging
+from typing import Optional
+from urllib.parse import urlencode
 from aiogram import Router, F
-from aiogram.filters import CommandStart
+from aiogram.filters import CommandObject, CommandStart
 from aiogram.types import Message, WebAppInfo, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
 import os
 
+from catalog import catalog_index
+from order_summary import order_summaries, render_orders, render_repeat, repeat_url
+
 logger = logging.getLogger(__name__)
 
 router = Router()
 
 WEBAPP_URL = os.getenv('WEBAPP_URL', 'https://flowersbot-production.up.railway.app/webapp')
+# /start product_<id> - кнопка "Заказать" из inline-поиска (handlers/inline_handler.py)
+PRODUCT_PAYLOAD = "product_"
+
+def product_id_from_payload(payload: Optional[str]) -> Optional[int]:
+    """ID товара из deep link или None"""
+    if not payload or not payload.startswith(PRODUCT_PAYLOAD):
+        return None
+    value = payload[len(PRODUCT_PAYLOAD):]
+    return int(value) if value.isdigit() else None
+
+def product_url(webapp_url: str, product_id: int) -> str:
+    """Ссылка в Mini App сразу на карточку товара: ?product=<id>"""
+    query = urlencode({"product": product_id})
+    return f"{webapp_url}{'&' if '?' in webapp_url else '?'}{query}"
 
 @router.message(CommandStart())
-async def cmd_start(message: Message):
+async def cmd_start(message: Message, command: CommandObject):
     """Команда /start - точно по ТЗ"""
     logger.info(f"🎯 Получена команда /start от пользователя {message.from_user.id}")
     
@@ -33,6 +52,21 @@ async def cmd_start(message: Message):
         parse_mode='HTML'
     )
 
+    # Пришли из inline-поиска: сразу открываем выбранный букет
+    product_id = product_id_from_payload(command.args)
+    if product_id is not None:
+        product = catalog_index.products.get(product_id)
+        keyboard = InlineKeyboardMarkup(inline_keyboard=[
+            [InlineKeyboardButton(
+                text="🛍 Заказать",
+                web_app=WebAppInfo(url=product_url(WEBAPP_URL, product_id))
+            )]
+        ])
+        await message.answer(
+            f"🌸 {product['name']}" if product else "🌸 Выбранный букет:",
+            reply_markup=keyboard
+        )
+
 @router.message(F.text == "🛍 Магазин")
 async def shop_button(message: Message):
     """Кнопка 🛍 Магазин - открывает Mini App"""
@@ -52,22 +86,23 @@ async def shop_button(message: Message):
 
 @router.message(F.text == "🔁 Повторить")
 async def repeat_button(message: Message):
-    """Кнопка 🔁 Повторить - показывает последний заказ"""
+    """Кнопка 🔁 Повторить - последний заказ и ссылка с готовой корзиной"""
     logger.info(f"🔁 Запрос повтора заказа от {message.from_user.id}")
     
+    summary = await order_summaries.get(message.from_user.id)
+    if summary is None or not summary.get("last_order_id"):
+        await message.answer(render_orders(summary), parse_mode='HTML')
+        return
+    
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(
-            text="🛍 Повторить заказ #123",
-            web_app=WebAppInfo(url=f"{WEBAPP_URL}?repeat=123")
+            text=f"🛍 Повторить заказ #{summary['last_order_id']}",
+            web_app=WebAppInfo(url=repeat_url(WEBAPP_URL, summary))
         )]
     ])
     
     await message.answer(
-        "🔁 <b>Повторить последний заказ</b>\n\n"
-        "📦 Заказ #123\n"
-        "🌹 Розы премиум\n"
-        "💰 1,200,000 VND\n\n"
-        "Нажмите кнопку чтобы повторить:",
+        render_repeat(summary),
         reply_markup=keyboard,
         parse_mode='HTML'
     )
@@ -77,18 +112,8 @@ async def orders_button(message: Message):
     """Кнопка 📦 Мои заказы - история заказов"""
     logger.info(f"📦 Запрос истории заказов от {message.from_user.id}")
     
-    await message.answer(
-        "📦 <b>Ваши заказы:</b>\n\n"
-        "📦 Заказ #123\n"
-        "💰 1,200,000 VND\n"
-        "📅 15.10.2025\n"
-        "Статус: Доставлен\n\n"
-        "📦 Заказ #122\n"
-        "💰 800,000 VND\n"
-        "📅 10.10.2025\n"
-        "Статус: Доставлен",
-        parse_mode='HTML'
-    )
+    summary = await order_summaries.get(message.from_user.id)
+    await message.answer(render_orders(summary), parse_mode='HTML')
 
 @router.message(F.text == "💬 Поддержка")
 async def support_button(message: Message):
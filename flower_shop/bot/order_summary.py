@@ -0,0 +1,155 @@
+"""
+Сводка заказов для кнопок "📦 Мои заказы" и "🔁 Повторить"
+
+Бот берет готовую сводку из API (GET /api/orders/{telegram_id}/summary, одна
+строка read-model) и держит ее в TTL/LRU кэше процесса: повторные нажатия
+не ходят ни в API, ни в базу. Новый заказ или смена статуса видны в боте
+не позже чем через ORDER_SUMMARY_TTL секунд. Одновременные нажатия одного
+пользователя делят один запрос к API. В едином процессе с API
+(unified_server.py) вместо HTTP передается fetch - чтение read-model из БД.
+"""
+import asyncio
+import html
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlencode
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+API_URL = (os.getenv('API_URL') or os.getenv('VITE_API_URL') or 'http://localhost:8000').rstrip('/')
+ORDER_SUMMARY_TTL = float(os.getenv('ORDER_SUMMARY_TTL', '30'))
+ORDER_SUMMARY_CACHE_SIZE = 10000
+API_TIMEOUT = 5
+
+STATUS_LABELS = {
+    'pending': '🕐 Ожидает подтверждения',
+    'confirmed': '✅ Подтвержден',
+    'making': '💐 Собирается',
+    'delivering': '🚚 В пути',
+    'delivered': '🎉 Доставлен',
+    'cancelled': '❌ Отменен',
+}
+SIZE_LABELS = {'standard': '', 'large': ' (L)', 'xl': ' (XL)'}
+
+
+def format_vnd(amount: Optional[int]) -> str:
+    return f"{amount or 0:,} VND"
+
+
+def format_date(created_at: Optional[str]) -> str:
+    return f"{created_at[8:10]}.{created_at[5:7]}.{created_at[:4]}" if created_at else ""
+
+
+def render_orders(summary: Optional[dict]) -> str:
+    """Текст для кнопки 📦 Мои заказы"""
+    if summary is None:
+        return "⚠️ Не удалось загрузить заказы, попробуйте через минуту"
+    orders = summary.get("recent_orders") or []
+    if not orders:
+        return "📦 У вас пока нет заказов.\n\nНажмите 🛍 Магазин, чтобы выбрать букет!"
+    lines = ["📦 <b>Ваши заказы:</b>"]
+    for order in orders:
+        lines.append(
+            f"\n📦 Заказ #{order['id']}\n"
+            f"💰 {format_vnd(order.get('total'))}\n"
+            f"📅 {format_date(order.get('created_at'))}\n"
+            f"Статус: {STATUS_LABELS.get(order.get('status'), order.get('status'))}"
+        )
+    hidden = summary.get("orders_count", 0) - len(orders)
+    if hidden > 0:
+        lines.append(f"\n…и еще {hidden} более ранних")
+    return "\n".join(lines)
+
+
+def render_repeat(summary: dict) -> str:
+    """Текст для кнопки 🔁 Повторить (summary с last_order_id)"""
+    last = summary["recent_orders"][0]
+    items = "\n".join(
+        f"🌹 {html.escape(item['product_name'] or '')}{SIZE_LABELS.get(item['size'], '')} × {item['quantity']}"
+        for item in summary.get("last_order_items") or []
+    )
+    return (
+        "🔁 <b>Повторить последний заказ</b>\n\n"
+        f"📦 Заказ #{last['id']}\n"
+        f"{items}\n"
+        f"💰 {format_vnd(last.get('total'))}\n\n"
+        "Нажмите кнопку - корзина заполнится автоматически:"
+    )
+
+
+def repeat_url(webapp_url: str, summary: dict) -> str:
+    """Ссылка в Mini App с корзиной: ?repeat=<id>&cart=<product_id>:<size>:<qty>,..."""
+    cart = ",".join(
+        f"{item['product_id']}:{item['size']}:{item['quantity']}"
+        for item in summary.get("last_order_items") or []
+        if item.get('product_id') is not None
+    )
+    query = urlencode({"repeat": summary["last_order_id"], "cart": cart})
+    return f"{webapp_url}{'&' if '?' in webapp_url else '?'}{query}"
+
+
+class OrderSummaryCache:
+    """TTL/LRU кэш сводок поверх API с объединением одновременных запросов"""
+
+    def __init__(self, api_url: str = API_URL, ttl: float = ORDER_SUMMARY_TTL,
+                 max_size: int = ORDER_SUMMARY_CACHE_SIZE,
+                 fetch: Optional[Callable[[int], Awaitable[dict]]] = None):
+        self.api_url = api_url
+        self.fetch = fetch or self._fetch_api
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache: "OrderedDict[int, Tuple[float, dict]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.hits = 0
+        self.misses = 0
+
+    async def _fetch_api(self, telegram_id: int) -> dict:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=API_TIMEOUT))
+        async with self._session.get(f"{self.api_url}/api/orders/{telegram_id}/summary") as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def get(self, telegram_id: int) -> Optional[dict]:
+        """Сводка пользователя; None - API недоступен и в кэше ничего нет"""
+        entry = self._cache.get(telegram_id)
+        now = time.monotonic()
+        if entry is not None and entry[0] > now:
+            self._cache.move_to_end(telegram_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+
+        future = self._inflight.get(telegram_id)
+        if future is None:
+            future = asyncio.ensure_future(self.fetch(telegram_id))
+            self._inflight[telegram_id] = future
+            future.add_done_callback(lambda _: self._inflight.pop(telegram_id, None))
+        try:
+            summary = await asyncio.shield(future)
+        except Exception as e:
+            logger.error(f"❌ Не удалось получить сводку заказов {telegram_id}: {e}")
+            # Устаревшая сводка лучше, чем ошибка
+            return entry[1] if entry is not None else None
+
+        self._cache[telegram_id] = (time.monotonic() + self.ttl, summary)
+        self._cache.move_to_end(telegram_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return summary
+
+    def invalidate(self, telegram_id: int) -> None:
+        self._cache.pop(telegram_id, None)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+
+order_summaries = OrderSummaryCache()
@@ -0,0 +1,99 @@
+"""
+Запись входящих апдейтов для нагрузочного стенда (benchmarks/bench_bot_replay.py)
+
+При UPDATE_RECORD_FILE апдейты дописываются в JSONL в обезличенном виде:
+id пользователей и чатов заменяются стабильным хешем, имя - заглушкой,
+фамилия, username, телефоны и геопозиция удаляются. Текст остается только
+для команд и кнопок клавиатуры, остальной заменяется заглушкой той же длины,
+как и данные из Web App (оформление заказа: имя, телефон, адрес).
+"""
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+logger = logging.getLogger(__name__)
+
+UPDATE_RECORD_FILE = os.getenv('UPDATE_RECORD_FILE', '')
+# Соль хеша id: без нее id можно восстановить перебором
+UPDATE_RECORD_SALT = os.getenv('UPDATE_RECORD_SALT', 'flowers')
+
+KEYBOARD_TEXTS = {"🛍 Магазин", "🔁 Повторить", "📦 Мои заказы", "💬 Поддержка"}
+PRIVATE_FIELDS = {"last_name", "username", "phone_number", "contact",
+                  "location", "venue", "photo", "bio", "email"}
+ID_FIELDS = {"id", "user_id"}
+# Обязательные в Bot API поля не удаляем, а заменяем
+REPLACED_FIELDS = {"first_name": "User"}
+
+
+def _anonymous_id(value: int, salt: str) -> int:
+    digest = hashlib.sha256(f"{salt}:{value}".encode()).digest()
+    number = int.from_bytes(digest[:6], 'big')
+    # Группы в Telegram - отрицательные id, знак сохраняем
+    return -number if value < 0 else number
+
+
+def anonymize(data: Any, salt: str = UPDATE_RECORD_SALT, parent: Optional[str] = None) -> Any:
+    """Обезличить апдейт (dict из Update.model_dump)"""
+    if isinstance(data, list):
+        return [anonymize(item, salt, parent) for item in data]
+    if not isinstance(data, dict):
+        return data
+    result = {}
+    for key, value in data.items():
+        if key in PRIVATE_FIELDS:
+            continue
+        if key in REPLACED_FIELDS:
+            result[key] = REPLACED_FIELDS[key]
+        elif key in ID_FIELDS and isinstance(value, int) and parent in ('from', 'from_user', 'chat', 'user', 'sender_chat'):
+            result[key] = _anonymous_id(value, salt)
+        elif key == 'text' and isinstance(value, str):
+            result[key] = value if value.startswith('/') or value in KEYBOARD_TEXTS else 'x' * len(value)
+        elif key == 'data' and parent == 'web_app_data' and isinstance(value, str):
+            result[key] = 'x' * len(value)
+        else:
+            result[key] = anonymize(value, salt, key)
+    return result
+
+
+class UpdateRecorder(BaseMiddleware):
+    """Outer middleware на dp.update: дописывает апдейт в файл и передает дальше"""
+
+    def __init__(self, path: str, salt: str = UPDATE_RECORD_SALT):
+        self.path = path
+        self.salt = salt
+        self.recorded = 0
+        self._file = open(path, 'a', encoding='utf-8')
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        if isinstance(event, Update):
+            try:
+                payload = event.model_dump(mode='json', exclude_none=True, by_alias=True)
+                self._file.write(json.dumps(anonymize(payload, self.salt), ensure_ascii=False) + "\n")
+                self._file.flush()
+                self.recorded += 1
+            except Exception as e:
+                logger.warning(f"⚠️ Не удалось записать апдейт {event.update_id}: {e}")
+        return await handler(event, data)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def setup_recorder(dp) -> Optional[UpdateRecorder]:
+    """Включить запись, если задан UPDATE_RECORD_FILE"""
+    if not UPDATE_RECORD_FILE:
+        return None
+    recorder = UpdateRecorder(UPDATE_RECORD_FILE)
+    dp.update.outer_middleware(recorder)
+    logger.info(f"📼 Запись апдейтов в {UPDATE_RECORD_FILE}")
+    return recorder
@@ -0,0 +1,297 @@
+"""
+Хранилища FSM для бота вместо MemoryStorage
+
+Состояние диалогов переживает перезапуск и доступно всем репликам:
+- redis: aiogram RedisStorage с TTL на состояние и данные (REDIS_URL);
+- sql: таблица fsm_storage в базе магазина (DATABASE_URL), ее создает
+  миграция backend 0008;
+- memory: как раньше, для локальной отладки.
+
+Поверх redis/sql работает кэш чтения на время одного апдейта
+(UpdateCacheMiddleware): запись проходит в хранилище сразу, а повторные
+чтения в рамках апдейта не ходят в сеть. Между апдейтами кэш не живет,
+поэтому воркеры и реплики, обрабатывающие апдейты одного пользователя,
+не видят устаревших состояний.
+"""
+import asyncio
+import contextvars
+import copy
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Mapping, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from sqlalchemy import Column, DateTime, MetaData, String, Table, Text, delete, inspect, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+logger = logging.getLogger(__name__)
+
+# memory, redis или sql; по умолчанию redis при REDIS_URL, иначе sql при DATABASE_URL
+FSM_STORAGE = os.getenv('FSM_STORAGE', '')
+REDIS_URL = os.getenv('REDIS_URL', '')
+# Сколько секунд живут незавершенные диалоги (0 - без ограничения)
+FSM_STATE_TTL = int(os.getenv('FSM_STATE_TTL', str(7 * 24 * 3600)))
+FSM_DATA_TTL = int(os.getenv('FSM_DATA_TTL', str(7 * 24 * 3600)))
+# Как часто удалять истекшие записи из таблицы (сек)
+PURGE_INTERVAL = 600
+
+# Схема таблицы - в миграциях backend (0008_fsm_storage), здесь только для запросов
+metadata = MetaData()
+
+fsm_storage_table = Table(
+    'fsm_storage',
+    metadata,
+    Column('key', String(255), primary_key=True),
+    Column('state', String(255)),
+    Column('data', Text),
+    Column('state_expires_at', DateTime),
+    Column('data_expires_at', DateTime),
+)
+
+
+def build_key(key: StorageKey) -> str:
+    """bot:chat:user[:thread][:business] :destiny - как DefaultKeyBuilder в aiogram"""
+    parts = [str(key.bot_id), str(key.chat_id), str(key.user_id)]
+    thread_id = getattr(key, 'thread_id', None)
+    if thread_id:
+        parts.append(str(thread_id))
+    business_connection_id = getattr(key, 'business_connection_id', None)
+    if business_connection_id:
+        parts.append(str(business_connection_id))
+    parts.append(key.destiny)
+    return ":".join(parts)
+
+
+def database_url(url: str) -> str:
+    """postgres:// и postgresql:// -> асинхронный драйвер, как в backend"""
+    if url.startswith('postgres://'):
+        return url.replace('postgres://', 'postgresql+asyncpg://', 1)
+    if url.startswith('postgresql://'):
+        return url.replace('postgresql://', 'postgresql+asyncpg://', 1)
+    return url
+
+
+def _state_name(state) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _is_live(expires_at: Optional[datetime], now: datetime) -> bool:
+    return expires_at is None or expires_at > now
+
+
+class SQLStorage(BaseStorage):
+    """Состояние и данные FSM в таблице fsm_storage (одна строка на ключ)"""
+
+    def __init__(self, engine: AsyncEngine, state_ttl: Optional[int] = FSM_STATE_TTL,
+                 data_ttl: Optional[int] = FSM_DATA_TTL, owns_engine: bool = False):
+        self.engine = engine
+        self.state_ttl = state_ttl or None
+        self.data_ttl = data_ttl or None
+        self.owns_engine = owns_engine
+        self._ready = False
+        self._lock = asyncio.Lock()
+        self._last_purge = 0.0
+
+    async def _ensure_table(self) -> None:
+        """Таблицу создают миграции backend; здесь только понятная ошибка, если их не применили"""
+        if self._ready:
+            return
+        async with self._lock:
+            if not self._ready:
+                async with self.engine.connect() as conn:
+                    exists = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table('fsm_storage'))
+                if not exists:
+                    raise RuntimeError("Таблица fsm_storage не найдена: примените миграции backend (alembic upgrade head)")
+                self._ready = True
+
+    def _expires(self, ttl: Optional[float]) -> Optional[datetime]:
+        return datetime.utcnow() + timedelta(seconds=ttl) if ttl else None
+
+    async def _upsert(self, key: str, values: dict) -> None:
+        await self._ensure_table()
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                update(fsm_storage_table).where(fsm_storage_table.c.key == key).values(**values)
+            )
+            if result.rowcount == 0:
+                dialect = self.engine.dialect.name
+                if dialect in ('postgresql', 'sqlite'):
+                    # Параллельная вставка того же ключа другой репликой - обновляем ее строку
+                    if dialect == 'postgresql':
+                        from sqlalchemy.dialects.postgresql import insert
+                    else:
+                        from sqlalchemy.dialects.sqlite import insert
+                    statement = insert(fsm_storage_table).values(key=key, **values)
+                    statement = statement.on_conflict_do_update(index_elements=['key'], set_=values)
+                else:
+                    statement = fsm_storage_table.insert().values(key=key, **values)
+                await conn.execute(statement)
+        await self._maybe_purge()
+
+    async def _maybe_purge(self) -> None:
+        """Удалить строки, у которых истекли и состояние, и данные"""
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+        self._last_purge = time.monotonic()
+        now = datetime.utcnow()
+        table = fsm_storage_table
+        # Состояние уже записано: ошибка очистки не должна ронять апдейт
+        try:
+            async with self.engine.begin() as conn:
+                await conn.execute(delete(table).where(
+                    (table.c.state.is_(None)) | (table.c.state_expires_at <= now),
+                    (table.c.data.is_(None)) | (table.c.data_expires_at <= now),
+                ))
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось очистить fsm_storage: {e}")
+
+    async def _row(self, key: str):
+        await self._ensure_table()
+        async with self.engine.connect() as conn:
+            return (await conn.execute(
+                select(fsm_storage_table).where(fsm_storage_table.c.key == key)
+            )).first()
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        state = _state_name(state)
+        await self._upsert(build_key(key), {
+            "state": state,
+            "state_expires_at": self._expires(self.state_ttl) if state is not None else None,
+        })
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._row(build_key(key))
+        if row is None or not _is_live(row.state_expires_at, datetime.utcnow()):
+            return None
+        return row.state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        if not isinstance(data, dict):
+            raise TypeError(f"Data must be a dict, got {type(data).__name__}")
+        await self._upsert(build_key(key), {
+            "data": json.dumps(data, ensure_ascii=False) if data else None,
+            "data_expires_at": self._expires(self.data_ttl) if data else None,
+        })
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._row(build_key(key))
+        if row is None or row.data is None or not _is_live(row.data_expires_at, datetime.utcnow()):
+            return {}
+        return json.loads(row.data)
+
+    async def close(self) -> None:
+        if self.owns_engine:
+            await self.engine.dispose()
+
+
+# Кэш текущего апдейта; None - вне апдейта (кэш не используется)
+_update_cache: contextvars.ContextVar[Optional[Dict[Tuple[str, str], Any]]] = contextvars.ContextVar(
+    'fsm_update_cache', default=None,
+)
+
+
+class UpdateCacheMiddleware(BaseMiddleware):
+    """Открывает кэш CachedStorage на время обработки одного апдейта"""
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any],
+    ) -> Any:
+        token = _update_cache.set({})
+        try:
+            return await handler(event, data)
+        finally:
+            _update_cache.reset(token)
+
+
+class CachedStorage(BaseStorage):
+    """Write-through кэш чтения поверх другого хранилища в пределах одного апдейта"""
+
+    def __init__(self, storage: BaseStorage):
+        self.storage = storage
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, cache_key: Tuple[str, str]):
+        cache = _update_cache.get()
+        if cache is None or cache_key not in cache:
+            self.misses += 1
+            return False, None
+        self.hits += 1
+        return True, cache[cache_key]
+
+    def _put(self, cache_key: Tuple[str, str], value: Any) -> None:
+        cache = _update_cache.get()
+        if cache is not None:
+            cache[cache_key] = value
+
+    async def set_state(self, key: StorageKey, state=None) -> None:
+        await self.storage.set_state(key, state)
+        self._put((build_key(key), "state"), _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        cache_key = (build_key(key), "state")
+        found, value = self._get(cache_key)
+        if not found:
+            value = await self.storage.get_state(key)
+            self._put(cache_key, value)
+        return value
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.storage.set_data(key, data)
+        self._put((build_key(key), "data"), copy.deepcopy(dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        cache_key = (build_key(key), "data")
+        found, value = self._get(cache_key)
+        if not found:
+            value = await self.storage.get_data(key)
+            self._put(cache_key, value)
+        # Вызывающий код может менять словарь - отдаем копию
+        return copy.deepcopy(value)
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+def setup_storage_cache(dp) -> None:
+    """Кэш FSM на время апдейта; без middleware CachedStorage читает хранилище напрямую"""
+    if isinstance(dp.storage, CachedStorage):
+        dp.update.outer_middleware(UpdateCacheMiddleware())
+
+
+def create_storage(kind: Optional[str] = None, engine: Optional[AsyncEngine] = None) -> BaseStorage:
+    """Хранилище FSM по FSM_STORAGE; engine - уже созданный движок приложения"""
+    kind = (kind or FSM_STORAGE).lower()
+    if not kind:
+        kind = 'redis' if REDIS_URL else ('sql' if (engine is not None or os.getenv('DATABASE_URL')) else 'memory')
+
+    if kind == 'memory':
+        logger.warning("⚠️ FSM в памяти: состояние диалогов не переживет перезапуск")
+        return MemoryStorage()
+    if kind == 'redis':
+        # redis - опциональная зависимость, нужна только в этом режиме
+        from aiogram.fsm.storage.redis import RedisStorage
+        storage = RedisStorage.from_url(
+            REDIS_URL or 'redis://localhost:6379/0',
+            state_ttl=FSM_STATE_TTL or None,
+            data_ttl=FSM_DATA_TTL or None,
+        )
+    elif kind == 'sql':
+        owns_engine = engine is None
+        if engine is None:
+            engine = create_async_engine(database_url(os.getenv('DATABASE_URL', '')), pool_pre_ping=True)
+        storage = SQLStorage(engine, owns_engine=owns_engine)
+    else:
+        raise ValueError(f"Unknown FSM_STORAGE: {kind}")
+
+    logger.info(f"💾 FSM хранилище: {kind}")
+    return CachedStorage(storage)
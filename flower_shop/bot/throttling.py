@@ -0,0 +1,172 @@
+"""
+Ограничение частоты апдейтов от одного пользователя
+
+Outer middleware срабатывает до фильтров и хендлеров: апдейт сверх лимита
+не доходит ни до логирования в хендлерах, ни до запросов к API и БД.
+У каждого пользователя свой token bucket на правило. Правило выбирается по
+тексту кнопки или callback data, остальное идет по общему лимиту. Кнопки,
+которые ходят в базу, получают более строгие лимиты.
+
+Бакеты лежат в OrderedDict с вытеснением по времени простоя (THROTTLE_TTL) и
+по размеру. Простоявший бакет все равно был бы полон, поэтому удалять его
+безопасно.
+"""
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject
+
+logger = logging.getLogger(__name__)
+
+# Общий лимит: THROTTLE_RATE апдейтов в секунду, всплеск до THROTTLE_BURST
+THROTTLE_RATE = float(os.getenv('THROTTLE_RATE', '1'))
+THROTTLE_BURST = float(os.getenv('THROTTLE_BURST', '5'))
+# reply - один раз предупредить "не так быстро", drop - молча отбросить
+THROTTLE_MODE = os.getenv('THROTTLE_MODE', 'reply')
+THROTTLE_TTL = float(os.getenv('THROTTLE_TTL', '600'))
+THROTTLE_MAX_USERS = 100000
+# Как часто можно предупреждать одного пользователя (сек)
+WARN_INTERVAL = 10
+
+DEFAULT_RULE = "default"
+# Кнопки с запросами к API/БД: rule -> (rate, burst)
+DEFAULT_LIMITS: Dict[str, Tuple[float, float]] = {
+    "orders": (0.2, 2),
+    "repeat": (0.2, 2),
+    # Inline-запрос приходит на каждое нажатие клавиши, ответ - из памяти
+    "inline": (5, 20),
+}
+DEFAULT_RULES: Dict[str, str] = {
+    "📦 Мои заказы": "orders",
+    "🔁 Повторить": "repeat",
+}
+
+SLOW_DOWN_TEXT = "⏳ Слишком много запросов, подождите пару секунд"
+
+
+class UserBuckets:
+    """Token bucket на (пользователь, правило) с вытеснением простаивающих"""
+
+    def __init__(self, ttl: float = THROTTLE_TTL, max_size: int = THROTTLE_MAX_USERS):
+        self.ttl = ttl
+        self.max_size = max_size
+        # key -> [tokens, updated_at]; список вместо объекта - меньше памяти
+        self._buckets: "OrderedDict[Tuple[int, str], list]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def consume(self, key: Tuple[int, str], rate: float, burst: float, now: Optional[float] = None) -> bool:
+        """Списать токен; False - лимит исчерпан"""
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [burst, now]
+            self._buckets[key] = bucket
+        else:
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        self._evict(now)
+        if bucket[0] < 1:
+            return False
+        bucket[0] -= 1
+        return True
+
+    def _evict(self, now: float) -> None:
+        # Самые старые по последнему обращению - в начале
+        while self._buckets:
+            key, bucket = next(iter(self._buckets.items()))
+            if len(self._buckets) <= self.max_size and now - bucket[1] < self.ttl:
+                break
+            del self._buckets[key]
+
+
+def _event_text(event: TelegramObject) -> Optional[str]:
+    if isinstance(event, Message):
+        return event.text
+    if isinstance(event, CallbackQuery):
+        return event.data
+    return None
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """Outer middleware на dp.message / dp.callback_query / dp.inline_query"""
+
+    def __init__(self, rate: float = THROTTLE_RATE, burst: float = THROTTLE_BURST,
+                 limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 rules: Optional[Dict[str, str]] = None, mode: str = THROTTLE_MODE,
+                 buckets: Optional[UserBuckets] = None):
+        self.limits = {DEFAULT_RULE: (rate, burst), **(DEFAULT_LIMITS if limits is None else limits)}
+        self.rules = DEFAULT_RULES if rules is None else rules
+        self.mode = mode
+        self.buckets = buckets or UserBuckets()
+        self._warned: "OrderedDict[int, float]" = OrderedDict()
+        self.allowed = 0
+        self.throttled: Dict[str, int] = {}
+
+    def rule_for(self, event: TelegramObject) -> str:
+        if isinstance(event, InlineQuery):
+            return "inline"
+        return self.rules.get(_event_text(event), DEFAULT_RULE)
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = getattr(event, 'from_user', None)
+        if user is None:
+            return await handler(event, data)
+
+        rule = self.rule_for(event)
+        rate, burst = self.limits.get(rule, self.limits[DEFAULT_RULE])
+        if self.buckets.consume((user.id, rule), rate, burst):
+            self.allowed += 1
+            return await handler(event, data)
+
+        self.throttled[rule] = self.throttled.get(rule, 0) + 1
+        logger.debug(f"🐢 Лимит {rule} для пользователя {user.id}")
+        if self.mode == 'reply':
+            await self._slow_down(event, user.id)
+        return None
+
+    async def _slow_down(self, event: TelegramObject, user_id: int) -> None:
+        """Предупреждение не чаще WARN_INTERVAL - иначе ответы сами станут спамом"""
+        now = time.monotonic()
+        if now - self._warned.get(user_id, float('-inf')) < WARN_INTERVAL:
+            return
+        self._warned[user_id] = now
+        self._warned.move_to_end(user_id)
+        while len(self._warned) > self.buckets.max_size:
+            self._warned.popitem(last=False)
+        try:
+            if isinstance(event, (Message, CallbackQuery)):
+                await event.answer(SLOW_DOWN_TEXT)
+            elif isinstance(event, InlineQuery):
+                await event.answer([], cache_time=1)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось предупредить пользователя {user_id}: {e}")
+
+    def metrics(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "throttled": dict(self.throttled),
+            "throttled_total": sum(self.throttled.values()),
+            "tracked_buckets": len(self.buckets),
+            "mode": self.mode,
+        }
+
+
+def setup_throttling(dp, **kwargs) -> ThrottlingMiddleware:
+    """Один экземпляр на все типы событий от пользователя - общие бакеты"""
+    middleware = ThrottlingMiddleware(**kwargs)
+    dp.message.outer_middleware(middleware)
+    dp.callback_query.outer_middleware(middleware)
+    dp.inline_query.outer_middleware(middleware)
+    return middleware
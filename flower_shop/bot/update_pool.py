@@ -0,0 +1,137 @@
+"""
+Фоновая обработка апдейтов webhook с быстрым ответом Telegram
+
+Webhook проверяет апдейт, кладет его в очередь и сразу отвечает 200:
+Telegram не ждет обработчиков и не тормозит доставку следующих апдейтов.
+Апдейты раскладываются по очередям воркеров по chat_id, поэтому сообщения
+одного чата обрабатываются строго по порядку, а разные чаты - параллельно.
+Если очередь полна, webhook отвечает 503 и Telegram повторит доставку позже.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '8'))
+# Сколько апдейтов всего может ждать обработки
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1000'))
+# Сколько ждать обработки очереди при остановке (сек)
+DRAIN_TIMEOUT = 10
+LAG_SAMPLES = 1000
+
+
+def update_chat_id(update: Update) -> Optional[int]:
+    """Чат (или пользователь) апдейта - ключ, по которому сохраняется порядок"""
+    try:
+        event = update.event
+    except Exception:
+        return None
+    chat = getattr(event, 'chat', None)
+    if chat is None:
+        message = getattr(event, 'message', None)
+        chat = getattr(message, 'chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None) or getattr(event, 'user', None)
+    return user.id if user is not None else None
+
+
+def _percentile(values, q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class UpdatePool:
+    """Ограниченный пул воркеров с очередью на каждый воркер (шардирование по чату)"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = UPDATE_WORKERS,
+                 queue_size: int = UPDATE_QUEUE_SIZE):
+        self.dp = dp
+        self.bot = bot
+        self.workers = workers
+        self.queue_size = queue_size
+        self._queues: List[asyncio.Queue] = []
+        self._tasks: List[asyncio.Task] = []
+        self._pending = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self._lags = deque(maxlen=LAG_SAMPLES)
+        self._durations = deque(maxlen=LAG_SAMPLES)
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(queue)) for queue in self._queues]
+        logger.info(f"⚙️ Пул обработки апдейтов: {self.workers} воркеров, очередь {self.queue_size}")
+
+    async def stop(self) -> None:
+        """Дообработать очередь (не дольше DRAIN_TIMEOUT) и остановить воркеры"""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self._queues)), DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ Не обработано апдейтов при остановке: {self._pending}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, update: Update) -> bool:
+        """Поставить апдейт в очередь; False - очередь полна (ответить 503)"""
+        if self._pending >= self.queue_size:
+            self.rejected += 1
+            return False
+        chat_id = update_chat_id(update)
+        shard = (chat_id if chat_id is not None else update.update_id) % self.workers
+        self._queues[shard].put_nowait((time.monotonic(), update))
+        self._pending += 1
+        self.accepted += 1
+        return True
+
+    async def _worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            enqueued_at, update = await queue.get()
+            started = time.monotonic()
+            self._lags.append(started - enqueued_at)
+            try:
+                await self.dp.feed_update(self.bot, update)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"❌ Ошибка обработки апдейта {update.update_id}: {e}")
+            finally:
+                self._durations.append(time.monotonic() - started)
+                self._pending -= 1
+                queue.task_done()
+
+    def metrics(self) -> dict:
+        lags, durations = list(self._lags), list(self._durations)
+
+        def ms(value):
+            return round(value * 1000, 1) if value is not None else None
+
+        return {
+            "workers": self.workers,
+            "queue_depth": self._pending,
+            "queue_size": self.queue_size,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "lag_ms": {"p50": ms(_percentile(lags, 0.5)), "p95": ms(_percentile(lags, 0.95)),
+                       "max": ms(max(lags) if lags else None)},
+            "handler_ms": {"p50": ms(_percentile(durations, 0.5)), "p95": ms(_percentile(durations, 0.95))},
+        }
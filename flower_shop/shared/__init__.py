@@ -0,0 +1,3 @@
+"""
+Общий код backend и бота (без зависимостей от их пакетов)
+"""
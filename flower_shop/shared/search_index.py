@@ -0,0 +1,151 @@
+"""
+Триграммный инвертированный индекс для поиска товаров в памяти
+
+Текст нормализуется (регистр, диакритика вьетнамского, ё/й, эмодзи и
+пунктуация), каждое слово разбивается на триграммы с отступами, поэтому
+работают и подстроки, и короткие префиксы при наборе ("ро" -> "Розы").
+"""
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Совпадение в названии весит вдвое больше, чем в описании
+NAME_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+# Доля триграмм запроса, которая должна совпасть, чтобы товар попал в выдачу
+MIN_MATCH_RATIO = 0.5
+# Сколько кандидатов (в долях limit) проходит точное ранжирование
+RERANK_FACTOR = 4
+
+# Буквы, которые NFKD не раскладывает на базу + диакритику
+_EXTRA_FOLDING = str.maketrans({"đ": "d", "ł": "l", "ø": "o", "ß": "ss"})
+
+
+def normalize(text: Optional[str]) -> str:
+    """Нижний регистр, без диакритики и символов, кроме букв и цифр"""
+    if not text:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", text.casefold().translate(_EXTRA_FOLDING))
+    chars = []
+    for ch in decomposed:
+        if unicodedata.combining(ch):
+            continue
+        chars.append(ch if ch.isalnum() else " ")
+    return " ".join("".join(chars).split())
+
+
+def trigrams(text: str) -> Set[str]:
+    """Триграммы слов с двумя пробелами в начале и одним в конце (как в pg_trgm)"""
+    grams = set()
+    for word in text.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return grams
+
+
+def query_trigrams(text: str) -> Set[str]:
+    """Триграммы запроса: последнее слово может быть недописано, без хвостового пробела"""
+    words = text.split()
+    if not words:
+        return set()
+    grams = trigrams(" ".join(words[:-1]))
+    padded = f"  {words[-1]}"
+    for i in range(len(padded) - 2):
+        grams.add(padded[i:i + 3])
+    return grams
+
+
+class TrigramIndex:
+    """Инвертированный индекс триграмма -> документы с инкрементальным обновлением"""
+
+    def __init__(self):
+        self._name_postings: Dict[str, Set[int]] = defaultdict(set)
+        self._description_postings: Dict[str, Set[int]] = defaultdict(set)
+        self._documents: Dict[int, Tuple[Tuple[str, str], Set[str], Set[str], str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def __contains__(self, doc_id: int) -> bool:
+        return doc_id in self._documents
+
+    def add(self, doc_id: int, name: Optional[str], description: Optional[str] = None) -> None:
+        """Добавить или переиндексировать документ (если текст не изменился - ничего не делает)"""
+        source = (name or "", description or "")
+        existing = self._documents.get(doc_id)
+        if existing is not None:
+            if existing[0] == source:
+                return
+            self.remove(doc_id)
+
+        normalized_name = normalize(name)
+        name_grams = trigrams(normalized_name)
+        description_grams = trigrams(normalize(description)) - name_grams
+        for gram in name_grams:
+            self._name_postings[gram].add(doc_id)
+        for gram in description_grams:
+            self._description_postings[gram].add(doc_id)
+        self._documents[doc_id] = (source, name_grams, description_grams, normalized_name)
+
+    def remove(self, doc_id: int) -> None:
+        document = self._documents.pop(doc_id, None)
+        if document is None:
+            return
+        _, name_grams, description_grams, _ = document
+        for postings, grams in ((self._name_postings, name_grams), (self._description_postings, description_grams)):
+            for gram in grams:
+                ids = postings.get(gram)
+                if ids is not None:
+                    ids.discard(doc_id)
+                    if not ids:
+                        del postings[gram]
+
+    def sync(self, documents: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> int:
+        """Привести индекс к набору документов; переиндексируются только изменившиеся"""
+        seen = set()
+        changed = 0
+        for doc_id, name, description in documents:
+            seen.add(doc_id)
+            existing = self._documents.get(doc_id)
+            if existing is None or existing[0] != (name or "", description or ""):
+                self.add(doc_id, name, description)
+                changed += 1
+        for doc_id in [doc_id for doc_id in self._documents if doc_id not in seen]:
+            self.remove(doc_id)
+            changed += 1
+        return changed
+
+    def search(self, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """Ранжированный список (doc_id, score)"""
+        normalized = normalize(query)
+        grams = query_trigrams(normalized)
+        if not grams:
+            return []
+
+        # Counter.update по множествам выполняется в C; совпадение в названии учитывается дважды
+        hits: Counter = Counter()
+        for gram in grams:
+            ids = self._name_postings.get(gram)
+            if ids:
+                hits.update(ids)
+                hits.update(ids)
+            ids = self._description_postings.get(gram)
+            if ids:
+                hits.update(ids)
+
+        required = max(1, int(len(grams) * MIN_MATCH_RATIO + 0.5)) * DESCRIPTION_WEIGHT
+        # Точное ранжирование только для лучших кандидатов по весу совпавших триграмм
+        candidates = [(score, doc_id) for doc_id, score in hits.most_common(limit * RERANK_FACTOR) if score >= required]
+
+        results = []
+        for score, doc_id in candidates:
+            score /= len(grams) * NAME_WEIGHT
+            name = self._documents[doc_id][3]
+            # Подстрока или начало слова в названии - самый релевантный случай
+            if normalized in name:
+                score += 1.0 if (name.startswith(normalized) or f" {normalized}" in name) else 0.5
+            results.append((doc_id, score))
+
+        results.sort(key=lambda item: (-item[1], item[0]))
+        return results[:limit]
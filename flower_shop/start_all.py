@@ -1,64 +1,218 @@
 #!/usr/bin/env python3
 """
 Скрипт для запуска Backend API и Bot одновременно
+
+Супервизор дочерних процессов:
+- бот стартует, как только backend ответил 200 на /health (а не через
+  фиксированную паузу): он берет каталог и сводки заказов из API;
+- упавший процесс перезапускается с экспоненциальной паузой
+  (RESTART_BACKOFF..RESTART_BACKOFF_MAX), пауза сбрасывается, если процесс
+  проработал STABLE_AFTER секунд;
+- SIGTERM/SIGINT пересылаются детям: сначала боту (дообработать очередь
+  апдейтов, пока API еще отвечает), затем backend. Кто не завершился за
+  STOP_TIMEOUT секунд, получает SIGKILL;
+- BACKEND_WORKERS воркеров uvicorn (auto - по числу CPU).
 """
 import asyncio
-import subprocess
+import logging
 import os
+import signal
 import sys
-import logging
+from typing import Dict, List, Optional
+
+import aiohttp
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-async def start_backend():
-    """Запуск Backend API"""
-    logger.info("🚀 Запуск Backend API...")
-    process = subprocess.Popen([
-        sys.executable, "-m", "uvicorn", 
-        "backend.main:app", 
-        "--host", "0.0.0.0", 
-        "--port", os.getenv("PORT", "8000")
-    ], cwd="flower_shop")
-    return process
-
-async def start_bot():
-    """Запуск Bot"""
-    logger.info("🤖 Запуск Bot...")
-    process = subprocess.Popen([
-        sys.executable, "bot/bot.py"
-    ], cwd="flower_shop")
-    return process
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BACKEND_PORT = int(os.getenv('PORT', '8000'))
+# У бота свой aiohttp-сервер webhook, порт не должен совпадать с API
+BOT_PORT = int(os.getenv('BOT_PORT', '8080'))
+BACKEND_WORKERS = os.getenv('BACKEND_WORKERS', '1')
+READY_TIMEOUT = float(os.getenv('READY_TIMEOUT', '60'))
+READY_INTERVAL = 0.2
+RESTART_BACKOFF = 1.0
+RESTART_BACKOFF_MAX = 30.0
+STABLE_AFTER = 60.0
+STOP_TIMEOUT = float(os.getenv('STOP_TIMEOUT', '30'))
+
+
+def backend_workers(value: str = BACKEND_WORKERS) -> int:
+    """Число воркеров uvicorn: auto - по числу CPU"""
+    if value.strip().lower() == 'auto':
+        return os.cpu_count() or 1
+    return max(1, int(value))
+
+
+async def wait_ready(url: str, timeout: float = READY_TIMEOUT, interval: float = READY_INTERVAL,
+                     process: Optional[asyncio.subprocess.Process] = None) -> bool:
+    """Опрос health-эндпоинта до 200; False - таймаут или процесс завершился"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=max(interval, 1))) as session:
+        while loop.time() < deadline:
+            if process is not None and process.returncode is not None:
+                return False
+            try:
+                async with session.get(url) as response:
+                    if response.status == 200:
+                        return True
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                # Порт еще не слушается
+                pass
+            await asyncio.sleep(interval)
+    return False
+
+
+class Child:
+    """Дочерний процесс с проверкой готовности и перезапуском"""
+
+    def __init__(self, name: str, cmd: List[str], health_url: Optional[str] = None,
+                 env: Optional[Dict[str, str]] = None, cwd: str = BASE_DIR,
+                 backoff: float = RESTART_BACKOFF, backoff_max: float = RESTART_BACKOFF_MAX,
+                 stable_after: float = STABLE_AFTER, ready_timeout: float = READY_TIMEOUT,
+                 stop_signal: int = signal.SIGTERM):
+        self.name = name
+        self.cmd = cmd
+        self.health_url = health_url
+        self.env = env
+        self.cwd = cwd
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.stable_after = stable_after
+        self.ready_timeout = ready_timeout
+        # Сигнал, по которому процесс завершается штатно
+        self.stop_signal = stop_signal
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.ready = asyncio.Event()
+        self.restarts = 0
+        self._stopping = asyncio.Event()
+
+    async def _spawn(self) -> None:
+        # Своя сессия: Ctrl+C терминала не доходит до детей напрямую,
+        # сигналы им пересылает только супервизор (иначе uvicorn получит
+        # SIGINT дважды и завершится без дообработки запросов)
+        self.process = await asyncio.create_subprocess_exec(
+            *self.cmd, cwd=self.cwd, env=self.env, start_new_session=True,
+        )
+        logger.info(f"🚀 {self.name}: запущен, pid {self.process.pid}")
+
+    async def _check_ready(self) -> None:
+        if self.health_url is None:
+            self.ready.set()
+            return
+        if await wait_ready(self.health_url, self.ready_timeout, process=self.process):
+            logger.info(f"✅ {self.name}: готов")
+            self.ready.set()
+        elif self.process.returncode is None:
+            logger.error(f"❌ {self.name}: нет ответа от {self.health_url} за {self.ready_timeout} с, перезапуск")
+            self.process.kill()
+
+    async def run(self) -> None:
+        """Держать процесс запущенным до stop()"""
+        loop = asyncio.get_running_loop()
+        delay = self.backoff
+        while not self._stopping.is_set():
+            started = loop.time()
+            await self._spawn()
+            if self._stopping.is_set():
+                # stop() пришел, пока процесс запускался
+                self.process.send_signal(self.stop_signal)
+            await self._check_ready()
+            code = await self.process.wait()
+            self.ready.clear()
+            if self._stopping.is_set():
+                break
+            if loop.time() - started >= self.stable_after:
+                delay = self.backoff
+            self.restarts += 1
+            logger.warning(f"⚠️ {self.name}: завершился с кодом {code}, перезапуск через {delay:.1f} с")
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+            delay = min(delay * 2, self.backoff_max)
+
+    async def stop(self, timeout: float = STOP_TIMEOUT) -> Optional[int]:
+        """Переслать stop_signal и дождаться завершения; после timeout - SIGKILL"""
+        self._stopping.set()
+        process = self.process
+        if process is None or process.returncode is not None:
+            return None if process is None else process.returncode
+        logger.info(f"🛑 {self.name}: остановка")
+        process.send_signal(self.stop_signal)
+        try:
+            return await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self.name}: не завершился за {timeout} с, SIGKILL")
+            process.kill()
+            return await process.wait()
+
+
+def backend_child() -> Child:
+    """Backend API"""
+    return Child(
+        "Backend API",
+        [
+            sys.executable, "-m", "uvicorn",
+            "backend.main:app",
+            "--host", "0.0.0.0",
+            "--port", str(BACKEND_PORT),
+            "--workers", str(backend_workers()),
+        ],
+        health_url=f"http://127.0.0.1:{BACKEND_PORT}/health",
+    )
+
+
+def bot_child() -> Child:
+    """Bot: webhook на BOT_PORT, API - локальный backend, если не задан явно"""
+    env = dict(os.environ, PORT=str(BOT_PORT))
+    env.setdefault("API_URL", f"http://127.0.0.1:{BACKEND_PORT}")
+    return Child(
+        "Bot",
+        [sys.executable, os.path.join("bot", "bot.py")],
+        health_url=f"http://127.0.0.1:{BOT_PORT}/health",
+        env=env,
+        # bot.py не ставит обработчик SIGTERM; по SIGINT он доходит до finally и закрывает сессии
+        stop_signal=signal.SIGINT,
+    )
+
 
 async def main():
     """Запуск всех сервисов"""
-    try:
-        logger.info("🌸 Запуск Цветы Нячанг...")
-        
-        # Запускаем Backend
-        backend_process = await start_backend()
-        
-        # Ждем немного чтобы Backend запустился
-        await asyncio.sleep(3)
-        
-        # Запускаем Bot
-        bot_process = await start_bot()
-        
+    logger.info("🌸 Запуск Цветы Нячанг...")
+    loop = asyncio.get_running_loop()
+    stop_requested = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_requested.set)
+
+    backend = backend_child()
+    children = [backend]
+    tasks = [asyncio.create_task(backend.run())]
+
+    # Бот ходит в API, поэтому ждем готовности backend, а не фиксированную паузу
+    ready = asyncio.create_task(backend.ready.wait())
+    stopped = asyncio.create_task(stop_requested.wait())
+    await asyncio.wait([ready, stopped], return_when=asyncio.FIRST_COMPLETED)
+    ready.cancel()
+    if not stop_requested.is_set():
+        if os.getenv('BOT_TOKEN'):
+            bot = bot_child()
+            children.append(bot)
+            tasks.append(asyncio.create_task(bot.run()))
+        else:
+            logger.warning("⚠️ BOT_TOKEN не задан: бот не запущен")
         logger.info("✅ Все сервисы запущены!")
-        
-        # Ждем завершения
-        await asyncio.gather(
-            asyncio.create_task(asyncio.to_thread(backend_process.wait)),
-            asyncio.create_task(asyncio.to_thread(bot_process.wait))
-        )
-        
-    except KeyboardInterrupt:
-        logger.info("🛑 Остановка сервисов...")
-        backend_process.terminate()
-        bot_process.terminate()
-    except Exception as e:
-        logger.error(f"❌ Ошибка: {e}")
-        raise
+
+    await stopped
+    logger.info("🛑 Остановка сервисов...")
+    # Сначала бот: он дообрабатывает апдейты, пока API еще отвечает
+    for child in reversed(children):
+        await child.stop()
+    await asyncio.gather(*tasks)
+
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,52 @@
+"""
+Общая тестовая БД: временный SQLite с миграциями и известным набором товаров
+
+DATABASE_URL задается здесь, до импорта backend тестовыми модулями (pytest
+загружает conftest раньше них): приложение и тесты работают с чистой базой,
+а не с той, что настроена в окружении.
+"""
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+TEST_DB_DIR = tempfile.mkdtemp(prefix='flower_shop_tests_')
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{os.path.join(TEST_DB_DIR, 'test.db')}"
+
+# Каталог, на который опираются проверки тестов
+PRODUCTS = [
+    {"name": "🌹 Розы классические", "category": "roses", "price": 800000, "is_popular": True, "is_available": True},
+    {"name": "🌹 Розы белые", "category": "roses", "price": 900000, "is_popular": False, "is_available": True},
+    {"name": "🌺 Орхидеи фаленопсис", "category": "exotic", "price": 1800000, "is_popular": True, "is_available": True},
+    {"name": "🌷 Тюльпаны", "category": "mono", "price": 600000, "is_popular": False, "is_available": True},
+    {"name": "💐 Сезонный букет", "category": "mix", "price": 700000, "is_popular": False, "is_available": False},
+]
+
+
+@pytest.fixture(scope="session", autouse=True)
+def products():
+    """Миграции и товары PRODUCTS во временной БД; товары с id из базы"""
+    from sqlalchemy import insert, select
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    from backend.models.database import DATABASE_URL, Product, run_migrations
+
+    async def runner():
+        engine = create_async_engine(DATABASE_URL)
+        await run_migrations(bind=engine)
+        async with engine.begin() as conn:
+            await conn.execute(insert(Product), PRODUCTS)
+            rows = (await conn.execute(
+                select(Product.id, Product.name, Product.category, Product.price,
+                       Product.is_popular, Product.is_available).order_by(Product.id)
+            )).all()
+        await engine.dispose()
+        return [dict(row._mapping) for row in rows]
+
+    yield asyncio.run(runner())
+    shutil.rmtree(TEST_DB_DIR, ignore_errors=True)
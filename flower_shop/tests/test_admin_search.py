@@ -0,0 +1,61 @@
+"""
+Тесты поиска товаров в админке (SQLite FTS5)
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from backend.models.database import Product, run_migrations
+from backend.admin.routes import product_search_filter, setup_search_functions
+
+
+def search(tmp_path, queries):
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'search.db'}")
+        setup_search_functions(engine)
+        await run_migrations(bind=engine)
+        async with AsyncSession(engine) as db:
+            db.add_all([
+                Product(name="🌹 Розы премиум", description="Красные розы", price=1500000),
+                Product(name="Орхидея", description="Экзотика в горшке", price=900000),
+                Product(name="Hoa hồng đỏ", description="100% fresh", price=700000),
+            ])
+            await db.commit()
+            # Изменение имени подхватывается триггером
+            orchid = await db.scalar(select(Product).where(Product.name == "Орхидея"))
+            orchid.name = "Орхидея белая"
+            await db.commit()
+
+            results = {}
+            for q in queries:
+                rows = await db.execute(
+                    select(Product.name).where(product_search_filter(q, "sqlite")).order_by(Product.id)
+                )
+                results[q] = rows.scalars().all()
+        await engine.dispose()
+        return results
+    return asyncio.run(runner())
+
+
+def test_search_filter(tmp_path):
+    results = search(tmp_path, ["розы", "РОЗ", "белая", "горш", "hồng", "ро", "РО", "ĐỎ", "100%", '"'])
+    assert results["розы"] == ["🌹 Розы премиум"]
+    assert results["РОЗ"] == ["🌹 Розы премиум"]
+    assert results["белая"] == ["Орхидея белая"]
+    assert results["горш"] == ["Орхидея белая"]
+    assert results["hồng"] == ["Hoa hồng đỏ"]
+    # Короткий запрос - LIKE без индекса, регистр и диакритика как в индексе каталога
+    assert results["ро"] == results["РО"] == ["🌹 Розы премиум"]
+    assert results["ĐỎ"] == ["Hoa hồng đỏ"]
+    assert results["100%"] == ["Hoa hồng đỏ"]
+    assert results['"'] == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
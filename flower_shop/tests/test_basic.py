@@ -28,57 +28,55 @@ def test_root():
     assert "message" in data
     assert "status" in data
 
-def test_get_products():
+def test_get_products(products):
     """Тест получения списка товаров"""
     response = client.get("/api/products")
     assert response.status_code == 200
-    products = response.json()
-    assert isinstance(products, list)
+    data = response.json()
+    assert isinstance(data, list)
+    # Только товары в наличии из тестовой БД
+    assert len(data) == len([p for p in products if p["is_available"]])
     
-    # Если есть товары, проверяем структуру
-    if len(products) > 0:
-        product = products[0]
-        assert "id" in product
-        assert "name" in product
-        assert "price" in product
-        assert "category" in product
-        assert "photo_url" in product
+    product = data[0]
+    assert "id" in product
+    assert "name" in product
+    assert "price" in product
+    assert "category" in product
+    assert "photo_url" in product
 
-def test_get_products_with_filters():
+def test_get_products_with_filters(products):
     """Тест получения товаров с фильтрами"""
     # Тест фильтра по категории
     response = client.get("/api/products?category=roses")
     assert response.status_code == 200
+    assert {p["id"] for p in response.json()} == {
+        p["id"] for p in products if p["category"] == "roses" and p["is_available"]
+    }
     
     # Тест фильтра по популярности
     response = client.get("/api/products?popular=true")
     assert response.status_code == 200
+    assert {p["id"] for p in response.json()} == {
+        p["id"] for p in products if p["is_popular"] and p["is_available"]
+    }
 
-def test_get_product_by_id():
+def test_get_product_by_id(products):
     """Тест получения товара по ID"""
-    # Сначала получаем список товаров
-    response = client.get("/api/products")
+    expected = products[0]
+    response = client.get(f"/api/products/{expected['id']}")
     assert response.status_code == 200
-    products = response.json()
     
-    if len(products) > 0:
-        product_id = products[0]["id"]
-        
-        # Получаем товар по ID
-        response = client.get(f"/api/products/{product_id}")
-        assert response.status_code == 200
-        
-        product = response.json()
-        assert product["id"] == product_id
-        assert "name" in product
-        assert "price" in product
+    product = response.json()
+    assert product["id"] == expected["id"]
+    assert product["name"] == expected["name"]
+    assert product["price"] == expected["price"]
 
 def test_get_nonexistent_product():
     """Тест получения несуществующего товара"""
     response = client.get("/api/products/99999")
     assert response.status_code == 404
 
-def test_create_order():
+def test_create_order(products):
     """Тест создания заказа"""
     order_data = {
         "telegram_id": 123456,
@@ -89,7 +87,7 @@ def test_create_order():
         "delivery_time": "15:00-18:00",
         "items": [
             {
-                "product_id": 1,
+                "product_id": products[0]["id"],
                 "product_name": "Test Product",
                 "size": "standard",
                 "price": 500000,
@@ -117,9 +115,10 @@ def test_get_user_orders():
     orders = response.json()
     assert isinstance(orders, list)
 
-def test_update_order_status():
+def test_update_order_status(products):
     """Тест обновления статуса заказа"""
-    # Сначала создаем заказ
+    # Сначала создаем заказ (пустой заказ API отклоняет)
+    product = products[0]
     order_data = {
         "telegram_id": 123456,
         "name": "Test User",
@@ -127,7 +126,7 @@ def test_update_order_status():
         "address": "Test Address",
         "delivery_date": "2025-01-20",
         "delivery_time": "15:00-18:00",
-        "items": [],
+        "items": [{"product_id": product["id"], "size": "standard", "quantity": 1}],
         "items_total": 500000,
         "delivery_cost": 100000,
         "total": 600000
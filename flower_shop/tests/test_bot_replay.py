@@ -0,0 +1,90 @@
+"""
+Тесты записи апдейтов и нагрузочного стенда бота
+"""
+import asyncio
+import json
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bot'))
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from benchmarks.bench_bot_replay import build_dispatcher, replay, start_fake_telegram, synthetic_updates
+from recorder import UpdateRecorder, anonymize
+
+RAW = {
+    "update_id": 1,
+    "message": {
+        "message_id": 1,
+        "date": 1700000000,
+        "chat": {"id": 555, "type": "private", "first_name": "Анна", "username": "anna"},
+        "from": {"id": 555, "is_bot": False, "first_name": "Анна", "username": "anna"},
+        "text": "мой телефон +84 123",
+    },
+}
+
+
+def test_anonymize():
+    """Id заменены стабильно, имена и свободный текст удалены, кнопки сохранены"""
+    data = anonymize(RAW, salt="test")
+    message = data["message"]
+    assert message["chat"]["id"] == message["from"]["id"] != 555
+    assert message["from"]["first_name"] == "User" and "username" not in message["chat"]
+    assert message["text"] == "x" * len(RAW["message"]["text"])
+    assert message["message_id"] == 1
+    button = anonymize({**RAW, "message": {**RAW["message"], "text": "📦 Мои заказы"}}, salt="test")
+    assert button["message"]["text"] == "📦 Мои заказы"
+    assert anonymize(RAW, salt="test") == data
+
+    # Данные оформления заказа из Web App
+    checkout = json.dumps({"name": "Анна", "phone": "+84901234567", "address": "Nha Trang"}, ensure_ascii=False)
+    web_app = {**RAW, "message": {**RAW["message"], "web_app_data": {"data": checkout, "button_text": "🛍 Магазин"}}}
+    web_app_data = anonymize(web_app, salt="test")["message"]["web_app_data"]
+    assert web_app_data == {"data": "x" * len(checkout), "button_text": "🛍 Магазин"}
+
+
+def test_recorder_writes_replayable_jsonl(tmp_path):
+    path = tmp_path / "updates.jsonl"
+    recorder = UpdateRecorder(str(path), salt="test")
+    dp = Dispatcher()
+    dp.update.outer_middleware(recorder)
+
+    async def runner():
+        bot = Bot(token="42:TEST")
+        await dp.feed_update(bot, Update.model_validate(RAW))
+        await bot.session.close()
+
+    asyncio.run(runner())
+    recorder.close()
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 1
+    assert Update.model_validate(json.loads(lines[0])).message.from_user.first_name == "User"
+
+
+def test_replay_against_fake_api():
+    """Стенд прогоняет апдейты через хендлеры и считает перцентили"""
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    async def runner():
+        server, api_url, calls = await start_fake_telegram(0)
+        bot = Bot(token="42:BENCH", session=AiohttpSession(api=TelegramAPIServer.from_base(api_url)))
+        try:
+            report = await replay(build_dispatcher(middlewares=True), bot,
+                                  synthetic_updates(100, 50), rate=0, concurrency=10)
+        finally:
+            await bot.session.close()
+            await server.cleanup()
+        return report, calls["count"]
+
+    report, api_calls = asyncio.run(runner())
+    assert report["updates"] == 100 and report["errors"] == 0
+    assert report["latency_ms"]["p50"] <= report["latency_ms"]["p99"]
+    assert api_calls > 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,164 @@
+"""
+Тесты рассылок: поток получателей, контрольные точки, заблокировавшие бота
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from collections import Counter
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.database import BlockedUser, Broadcast, Order, run_migrations
+from backend.utils.broadcast import BroadcastManager, BroadcastRunner
+from backend.utils.send_scheduler import SendResult
+
+# 12 клиентов, у некоторых по несколько заказов; 5 заблокировал бота раньше, 7 - во время рассылки
+CUSTOMERS = list(range(1, 13))
+ALREADY_BLOCKED = 5
+BLOCKS_DURING = 7
+
+
+async def prepare(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'broadcast.db'}")
+    await run_migrations(bind=engine)
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as db:
+        for telegram_id in CUSTOMERS + [2, 3, 3]:
+            db.add(Order(
+                telegram_id=telegram_id, name="Client", phone="+84", address="Nha Trang",
+                delivery_date="2025-03-08", delivery_time="10:00-12:00",
+                items_total=0, delivery_cost=0, total=0,
+            ))
+        db.add(BlockedUser(telegram_id=ALREADY_BLOCKED, reason="Forbidden"))
+        broadcast = Broadcast(text="🌷 Весенняя коллекция")
+        db.add(broadcast)
+        await db.commit()
+    return engine, factory, broadcast.id
+
+
+def make_sender(sent):
+    async def send(chat_id, text):
+        sent.append(chat_id)
+        if chat_id == BLOCKS_DURING:
+            return SendResult(ok=False, status=403, description="Forbidden: bot was blocked by the user")
+        return SendResult(ok=True, status=200)
+    return send
+
+
+def test_broadcast_completes(tmp_path):
+    """Каждый клиент получает одно сообщение, 403 записывается в blocked_users"""
+    sent = []
+
+    async def runner():
+        engine, factory, broadcast_id = await prepare(tmp_path)
+        status = await BroadcastRunner(broadcast_id, factory, make_sender(sent), chunk_size=4).run()
+        async with factory() as db:
+            broadcast = await db.get(Broadcast, broadcast_id)
+            blocked = set((await db.execute(select(BlockedUser.telegram_id))).scalars())
+        await engine.dispose()
+        return status, broadcast, blocked
+
+    status, broadcast, blocked = asyncio.run(runner())
+    assert status == "completed"
+    assert sorted(sent) == [c for c in CUSTOMERS if c != ALREADY_BLOCKED]
+    assert broadcast.status == "completed"
+    assert broadcast.total_recipients == len(CUSTOMERS) - 1
+    assert broadcast.sent_count == len(CUSTOMERS) - 2
+    assert broadcast.blocked_count == 1
+    assert broadcast.last_telegram_id == max(CUSTOMERS)
+    assert blocked == {ALREADY_BLOCKED, BLOCKS_DURING}
+
+
+def test_broadcast_resumes_from_checkpoint(tmp_path):
+    """Остановка после пачки и повторный запуск не дают дублей"""
+    sent = []
+
+    async def runner():
+        engine, factory, broadcast_id = await prepare(tmp_path)
+        first = BroadcastRunner(broadcast_id, factory, make_sender(sent), chunk_size=4)
+        send = make_sender(sent)
+
+        async def stop_after_first_chunk(chat_id, text):
+            first.request_stop()
+            return await send(chat_id, text)
+
+        first.send = stop_after_first_chunk
+        paused = await first.run()
+        async with factory() as db:
+            checkpoint = (await db.get(Broadcast, broadcast_id)).last_telegram_id
+        resumed = await BroadcastRunner(broadcast_id, factory, make_sender(sent), chunk_size=4).run()
+        async with factory() as db:
+            broadcast = await db.get(Broadcast, broadcast_id)
+        await engine.dispose()
+        return paused, checkpoint, resumed, broadcast
+
+    paused, checkpoint, resumed, broadcast = asyncio.run(runner())
+    assert paused == "paused"
+    assert checkpoint == 4
+    assert resumed == "completed"
+    assert Counter(sent) == Counter(c for c in CUSTOMERS if c != ALREADY_BLOCKED)
+    assert broadcast.sent_count + broadcast.blocked_count == len(CUSTOMERS) - 1
+
+
+def test_pause_from_another_worker_stops_runner(tmp_path):
+    """Пауза пишется только в БД; раннер ведущего видит ее перед следующей пачкой"""
+    sent = []
+
+    async def runner():
+        engine, factory, broadcast_id = await prepare(tmp_path)
+        # Админка в другом воркере: отдельный менеджер без раннеров
+        admin = BroadcastManager(session_factory=factory)
+        send = make_sender(sent)
+
+        async def pause_during_first_chunk(chat_id, text):
+            if len(sent) == 0:
+                await admin.pause(broadcast_id)
+            return await send(chat_id, text)
+
+        status = await BroadcastRunner(broadcast_id, factory, pause_during_first_chunk, chunk_size=4).run()
+        async with factory() as db:
+            broadcast = await db.get(Broadcast, broadcast_id)
+        await engine.dispose()
+        return status, broadcast
+
+    status, broadcast = asyncio.run(runner())
+    assert status == "paused"
+    assert broadcast.status == "paused" and broadcast.finished_at is None
+    assert len(sent) == 4 and broadcast.last_telegram_id == 4
+
+
+def test_leader_picks_up_requested_broadcasts(tmp_path):
+    """Черновик не отправляется; после запроса запуска его подхватывает опрос ведущего"""
+    sent = []
+
+    async def runner():
+        engine, factory, broadcast_id = await prepare(tmp_path)
+        async with factory() as db:
+            (await db.get(Broadcast, broadcast_id)).status = "draft"
+            await db.commit()
+        manager = BroadcastManager(session_factory=factory, send=make_sender(sent))
+        assert await manager.pick_up() == []
+
+        await manager.request_start(broadcast_id)
+        assert await manager.pick_up() == [broadcast_id]
+        # Уже запущенную повторно не стартуем
+        assert await manager.pick_up() == []
+        await manager._tasks[broadcast_id]
+        async with factory() as db:
+            broadcast = await db.get(Broadcast, broadcast_id)
+        await engine.dispose()
+        return broadcast
+
+    broadcast = asyncio.run(runner())
+    assert broadcast.status == "completed"
+    assert sorted(sent) == [c for c in CUSTOMERS if c != ALREADY_BLOCKED]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
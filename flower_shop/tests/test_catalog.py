@@ -0,0 +1,165 @@
+"""
+Тесты снимка каталога и публичных эндпоинтов товаров
+"""
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from backend.main import app
+from backend.utils.catalog_cache import build_snapshot
+
+client = TestClient(app)
+
+
+class Row:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def make_row(id, category="roses", is_popular=False, is_available=True):
+    return Row(
+        id=id, name=f"Товар {id}", category=category, description="", price=500000,
+        photo_url=None, is_popular=is_popular, is_available=is_available,
+    )
+
+
+def test_snapshot_views():
+    """Готовые выборки по категории и популярности"""
+    snapshot = build_snapshot([
+        make_row(1, "roses", is_popular=True),
+        make_row(2, "roses"),
+        make_row(3, "mix", is_popular=True),
+        make_row(4, "mix", is_available=False),
+    ], version=1)
+
+    assert [p["id"] for p in snapshot.select()] == [1, 2, 3]
+    assert [p["id"] for p in snapshot.select("roses")] == [1, 2]
+    assert [p["id"] for p in snapshot.select(popular=True)] == [1, 3]
+    assert [p["id"] for p in snapshot.select("mix", False)] == []
+    assert snapshot.select("unknown") == ()
+    # Недоступный товар не попадает в список, но доступен по ID
+    assert snapshot.by_id[4]["id"] == 4
+
+
+def test_catalog_refreshed_after_write():
+    """Создание, изменение и удаление товара сразу видны в каталоге"""
+    response = client.post("/api/products", json={
+        "name": "Тестовый букет", "category": "mono", "price": 700000, "is_available": True,
+    })
+    assert response.status_code == 200
+    product_id = response.json()["id"]
+
+    ids = [p["id"] for p in client.get("/api/products?category=mono").json()]
+    assert product_id in ids
+
+    response = client.patch(f"/api/products/{product_id}", json={"price": 750000})
+    assert response.status_code == 200
+    assert client.get(f"/api/products/{product_id}").json()["price"] == 750000
+
+    response = client.delete(f"/api/products/{product_id}")
+    assert response.status_code == 200
+    assert client.get(f"/api/products/{product_id}").status_code == 404
+
+
+def test_products_etag(products):
+    """Повторный запрос с If-None-Match получает 304 без тела"""
+    response = client.get("/api/products")
+    assert response.status_code == 200
+    assert {p["id"] for p in response.json()} == {p["id"] for p in products if p["is_available"]}
+    etag = response.headers["etag"]
+    assert "stale-while-revalidate" in response.headers["cache-control"]
+
+    response = client.get("/api/products", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    # Другая выборка - другой ETag
+    response = client.get("/api/products?popular=true", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert {p["id"] for p in response.json()} == {p["id"] for p in products if p["is_popular"] and p["is_available"]}
+
+
+def test_product_etag_changes_on_update():
+    """ETag товара меняется вместе с содержимым"""
+    product_id = client.post("/api/products", json={"name": "Букет", "category": "mix", "price": 600000}).json()["id"]
+    etag = client.get(f"/api/products/{product_id}").headers["etag"]
+    assert client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    client.patch(f"/api/products/{product_id}", json={"price": 650000})
+    response = client.get(f"/api/products/{product_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+    client.delete(f"/api/products/{product_id}")
+
+
+def test_products_gzip_body():
+    """Сжатое тело отдается готовым и совпадает с несжатым"""
+    plain = client.get("/api/products", headers={"Accept-Encoding": "identity"})
+    compressed = client.get("/api/products", headers={"Accept-Encoding": "gzip"})
+    assert compressed.json() == plain.json()
+    if compressed.headers.get("content-encoding") == "gzip":
+        assert compressed.headers["etag"] != plain.headers["etag"]
+        # ETag сжатого варианта тоже подходит для If-None-Match
+        response = client.get("/api/products", headers={"If-None-Match": compressed.headers["etag"]})
+        assert response.status_code == 304
+
+
+def test_products_pagination_and_fields(products):
+    """Курсорная пагинация проходит весь каталог без повторов"""
+    full = [p for p in products if p["is_available"]]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "fields": "name,price"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/api/products", params=params).json()
+        for item in page["items"]:
+            assert set(item) == {"id", "name", "price"}
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert sorted(seen) == sorted(p["id"] for p in full)
+    assert len(seen) == len(set(seen))
+
+
+def test_products_pagination_errors():
+    """Неизвестные поля и поврежденный курсор - 400"""
+    assert client.get("/api/products", params={"fields": "secret"}).status_code == 400
+    assert client.get("/api/products", params={"cursor": "garbage"}).status_code == 400
+
+
+def test_products_batch_lookup():
+    """Проверка корзины одним запросом: found / unavailable / missing"""
+    available = client.post("/api/products", json={"name": "В наличии", "category": "mix", "price": 500000}).json()["id"]
+    hidden = client.post("/api/products", json={
+        "name": "Нет в наличии", "category": "mix", "price": 500000, "is_available": False,
+    }).json()["id"]
+
+    response = client.get("/api/products", params={"ids": f"{available},{hidden},999999"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [p["id"] for p in data["found"]] == [available]
+    assert [p["id"] for p in data["unavailable"]] == [hidden]
+    assert data["missing"] == [999999]
+
+    response = client.post("/api/products/lookup", json={"ids": [hidden, available]})
+    assert response.json()["found"][0]["price"] == 500000
+
+    assert client.get("/api/products", params={"ids": "1,x"}).status_code == 400
+    assert client.post("/api/products/lookup", json={"ids": list(range(500))}).status_code == 400
+
+    client.delete(f"/api/products/{available}")
+    client.delete(f"/api/products/{hidden}")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
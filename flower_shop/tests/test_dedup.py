@@ -0,0 +1,133 @@
+"""
+Тесты защиты от повторной доставки апдейтов
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bot'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.models.database import run_migrations
+from dedup import DedupMiddleware, RedisDeduplicator, SQLDeduplicator, UpdateDeduplicator, create_deduplicator
+
+
+def message_update(update_id: int) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            "text": "🛍 Магазин",
+        },
+    })
+
+
+def test_window():
+    """Повтор в окне отбрасывается, память ограничена окном"""
+    dedup = UpdateDeduplicator(window=3)
+    assert [dedup.add(i) for i in (1, 2, 1, 3, 2)] == [True, True, False, True, False]
+    assert dedup.duplicates == 2
+    dedup.add(4)
+    assert 1 not in dedup and len(dedup._seen) == 3
+    # Не принятый в обработку апдейт можно принять снова
+    dedup.forget(4)
+    assert dedup.add(4) is True
+
+
+def test_forget_then_readd_keeps_window():
+    """После forget и повторного add вытеснение не выбрасывает id из окна"""
+    dedup = UpdateDeduplicator(window=3)
+    for i in (1, 2, 3):
+        dedup.add(i)
+    dedup.forget(1)
+    assert dedup.add(1) is True
+    # Вытесняется 2 - самый старый, 1 добавлен заново и остается в окне
+    dedup.add(4)
+    assert 2 not in dedup and 1 in dedup
+    assert list(dedup._order) == [3, 1, 4] and dedup._seen == {3, 1, 4}
+    assert dedup.add(1) is False
+
+
+def test_middleware_drops_replay():
+    handled = []
+    dp = Dispatcher()
+    dp.update.outer_middleware(DedupMiddleware(UpdateDeduplicator()))
+
+    @dp.message()
+    async def shop(message):
+        handled.append(message.message_id)
+
+    async def runner():
+        bot = Bot(token="42:TEST")
+        for update_id in (10, 10, 11, 10):
+            await dp.feed_update(bot, message_update(update_id))
+        await bot.session.close()
+
+    asyncio.run(runner())
+    assert handled == [10, 11]
+
+
+def test_redis_shared_between_replicas():
+    """Вторая реплика видит апдейт, принятый первой"""
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def runner():
+        redis = fakeredis.FakeAsyncRedis()
+        first = RedisDeduplicator(redis, ttl=60)
+        second = RedisDeduplicator(redis, ttl=60)
+        results = [await first.check(5), await second.check(5), await second.check(6)]
+        await second.release(6)
+        results.append(await first.check(6))
+        ttl = await redis.ttl(first._key(5))
+        return results, ttl
+
+    results, ttl = asyncio.run(runner())
+    assert results == [True, False, True, True]
+    assert 0 < ttl <= 60
+
+
+def test_sql_shared_between_workers(tmp_path):
+    """Без Redis воркеры делят таблицу processed_updates"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'dedup.db'}")
+        await run_migrations(bind=engine)
+        first = SQLDeduplicator(engine, ttl=60)
+        second = SQLDeduplicator(engine, ttl=60)
+        results = [await first.check(5), await second.check(5), await second.check(6)]
+        await second.release(6)
+        results.append(await first.check(6))
+        other_bot = SQLDeduplicator(engine, prefix="other")
+        results.append(await other_bot.check(5))
+        await engine.dispose()
+        return results, second.duplicates
+
+    results, duplicates = asyncio.run(runner())
+    assert results == [True, False, True, True, True]
+    assert duplicates == 1
+
+
+def test_create_deduplicator(monkeypatch, tmp_path):
+    import dedup as dedup_module
+    monkeypatch.setattr(dedup_module, "DEDUP_STORAGE", "")
+    monkeypatch.setattr(dedup_module, "REDIS_URL", "")
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    assert type(create_deduplicator()) is UpdateDeduplicator
+
+    # С БД и без Redis - общая таблица, а не окно в памяти воркера
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'dedup.db'}")
+    assert type(create_deduplicator(engine=engine)) is SQLDeduplicator
+    with pytest.raises(ValueError):
+        create_deduplicator("mongo")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,189 @@
+"""
+Тесты хранилищ FSM бота (SQL, Redis, кэш чтения)
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bot'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.models.database import run_migrations
+from storage import CachedStorage, SQLStorage, UpdateCacheMiddleware, create_storage
+
+KEY = StorageKey(bot_id=1, chat_id=100, user_id=100)
+OTHER_KEY = StorageKey(bot_id=1, chat_id=200, user_id=200)
+
+
+class Checkout(StatesGroup):
+    address = State()
+
+
+async def exercise(storage):
+    """Общий сценарий: состояние, данные, сброс"""
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+    await storage.set_state(KEY, Checkout.address)
+    await storage.update_data(KEY, {"cart": [1, 2]})
+    await storage.update_data(KEY, {"name": "Anna"})
+    assert await storage.get_state(KEY) == Checkout.address.state
+    assert await storage.get_data(KEY) == {"cart": [1, 2], "name": "Anna"}
+    assert await storage.get_state(OTHER_KEY) is None
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+
+
+def test_sql_storage(tmp_path):
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'fsm.db'}")
+        await run_migrations(bind=engine)
+        storage = SQLStorage(engine)
+        await exercise(storage)
+
+        # Диалог переживает перезапуск: новое хранилище на той же БД видит состояние
+        await storage.set_state(KEY, Checkout.address)
+        await storage.set_data(KEY, {"step": 2})
+        restarted = SQLStorage(engine)
+        state, data = await restarted.get_state(KEY), await restarted.get_data(KEY)
+        await engine.dispose()
+        return state, data
+
+    assert asyncio.run(runner()) == (Checkout.address.state, {"step": 2})
+
+
+def test_sql_storage_ttl(tmp_path):
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'ttl.db'}")
+        await run_migrations(bind=engine)
+        storage = SQLStorage(engine, state_ttl=0.2, data_ttl=0.2)
+        await storage.set_state(KEY, "Checkout:address")
+        await storage.set_data(KEY, {"step": 1})
+        fresh = (await storage.get_state(KEY), await storage.get_data(KEY))
+        await asyncio.sleep(0.3)
+        expired = (await storage.get_state(KEY), await storage.get_data(KEY))
+        await engine.dispose()
+        return fresh, expired
+
+    fresh, expired = asyncio.run(runner())
+    assert fresh == ("Checkout:address", {"step": 1})
+    assert expired == (None, {})
+
+
+def test_sql_storage_purge_failure_keeps_write(tmp_path, monkeypatch):
+    """Ошибка очистки старых строк не роняет запись состояния"""
+    import storage as storage_module
+
+    def broken_delete(*args, **kwargs):
+        raise RuntimeError("database is locked")
+
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'purge.db'}")
+        await run_migrations(bind=engine)
+        storage = SQLStorage(engine)
+        storage._last_purge = float('-inf')
+        monkeypatch.setattr(storage_module, "delete", broken_delete)
+        await storage.set_state(KEY, Checkout.address)
+        state = await storage.get_state(KEY)
+        await engine.dispose()
+        return state
+
+    assert asyncio.run(runner()) == Checkout.address.state
+
+
+def test_sql_storage_requires_migrations(tmp_path):
+    """Таблицу создают миграции backend, а не бот при первом обращении"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'empty.db'}")
+        try:
+            with pytest.raises(RuntimeError, match="fsm_storage"):
+                await SQLStorage(engine).get_state(KEY)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(runner())
+
+
+def test_redis_storage():
+    """RedisStorage aiogram на встроенном fake-сервере"""
+    fakeredis = pytest.importorskip("fakeredis")
+    from aiogram.fsm.storage.redis import RedisStorage
+
+    async def runner():
+        redis = fakeredis.FakeAsyncRedis()
+        storage = RedisStorage(redis=redis, state_ttl=60, data_ttl=60)
+        await exercise(storage)
+        await storage.set_state(KEY, Checkout.address)
+        ttl = await redis.ttl(storage.key_builder.build(KEY, "state"))
+        await storage.close()
+        return ttl
+
+    assert 0 < asyncio.run(runner()) <= 60
+
+
+def test_cached_storage(tmp_path):
+    """Повторные чтения в рамках апдейта идут из кэша, запись сразу видна"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'cache.db'}")
+        await run_migrations(bind=engine)
+        storage = CachedStorage(SQLStorage(engine))
+        await exercise(storage)
+        await storage.set_data(KEY, {"cart": [1]})
+
+        async def handler(event, data):
+            for _ in range(5):
+                data = await storage.get_data(KEY)
+                data["cart"].append(99)
+            return await storage.get_data(KEY)
+
+        misses = storage.misses
+        result = await UpdateCacheMiddleware()(handler, None, {}), storage.hits, storage.misses - misses
+        await engine.dispose()
+        return result
+
+    data, hits, misses = asyncio.run(runner())
+    assert data == {"cart": [1]}
+    assert hits >= 5 and misses == 1
+
+
+def test_cached_storage_sees_other_workers_between_updates(tmp_path):
+    """Кэш не переживает апдейт: запись другого воркера видна в следующем апдейте"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'workers.db'}")
+        await run_migrations(bind=engine)
+        first, second = CachedStorage(SQLStorage(engine)), CachedStorage(SQLStorage(engine))
+        middleware = UpdateCacheMiddleware()
+
+        async def read(event, data):
+            return await first.get_state(KEY)
+
+        async def write(event, data):
+            await second.set_state(KEY, Checkout.address)
+
+        before = await middleware(read, None, {})
+        await middleware(write, None, {})
+        after = await middleware(read, None, {})
+        await engine.dispose()
+        return before, after
+
+    assert asyncio.run(runner()) == (None, Checkout.address.state)
+
+
+def test_create_storage(monkeypatch):
+    import storage as storage_module
+    monkeypatch.setattr(storage_module, "FSM_STORAGE", "")
+    monkeypatch.setattr(storage_module, "REDIS_URL", "")
+    monkeypatch.delenv("DATABASE_URL", raising=False)
+    assert type(create_storage()).__name__ == "MemoryStorage"
+    with pytest.raises(ValueError):
+        create_storage("mongo")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
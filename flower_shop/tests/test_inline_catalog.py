@@ -0,0 +1,139 @@
+"""
+Тесты inline-поиска по каталогу в памяти бота
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bot'))
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.methods import AnswerInlineQuery, GetMe, SendMessage
+from aiogram.types import Update, User
+
+from catalog import CatalogIndex, catalog_index
+from handlers import inline, start
+
+PRODUCTS = [
+    {"id": i, "name": f"Розы {color}", "description": "Свежие розы из Далата", "price": 500000 + i,
+     "photo_url": None, "category": "roses", "is_popular": i < 3}
+    for i, color in enumerate(["красные", "белые", "розовые", "желтые", "кремовые"] * 6, start=1)
+] + [{"id": 100, "name": "Пионы", "description": "Нежные пионы", "price": 900000, "photo_url": None}]
+
+
+def test_search_pages():
+    index = CatalogIndex(api_url="http://unused")
+    index.load(PRODUCTS)
+    page, next_offset = index.search("розы", 0, 20)
+    assert len(page) == 20 and next_offset == 20
+    rest, last = index.search("розы", next_offset, 20)
+    assert len(rest) == 10 and last is None
+    assert {p["id"] for p in page} | {p["id"] for p in rest} == set(range(1, 31))
+    assert [p["id"] for p in index.search("пион")[0]] == [100]
+    # Пустой запрос - популярные, затем новые
+    assert [p["id"] for p in index.search("")[0][:4]] == [2, 1, 100, 30]
+
+
+def test_refresh_uses_etag():
+    """Неизмененный каталог приходит как 304 и не переиндексируется"""
+    requests = []
+
+    async def products(request):
+        requests.append(request.headers.get("If-None-Match"))
+        if request.headers.get("If-None-Match") == '"v1"':
+            return web.Response(status=304)
+        return web.json_response(PRODUCTS, headers={"ETag": '"v1"'})
+
+    async def runner():
+        app = web.Application()
+        app.router.add_get("/api/products", products)
+        server = web.AppRunner(app)
+        await server.setup()
+        site = web.TCPSite(server, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        index = CatalogIndex(api_url=f"http://127.0.0.1:{port}")
+        changed = [await index.refresh(), await index.refresh()]
+        await index.stop()
+        await server.cleanup()
+        return index, changed
+
+    index, changed = asyncio.run(runner())
+    assert changed == [True, False]
+    assert requests == [None, '"v1"']
+    assert len(index.products) == len(PRODUCTS)
+
+
+def test_inline_handler_answers_with_pagination():
+    calls = []
+    catalog_index.load(PRODUCTS)
+    dp = Dispatcher()
+    dp.include_router(inline.router)
+
+    async def runner():
+        bot = Bot(token="42:TEST")
+
+        async def fake_request(bot, method, timeout=None):
+            calls.append(method)
+            if isinstance(method, GetMe):
+                return User(id=42, is_bot=True, first_name="Flowers", username="flowers_bot")
+            return True
+
+        bot.session.make_request = fake_request
+        update = Update.model_validate({
+            "update_id": 1,
+            "inline_query": {"id": "q1", "query": "розы", "offset": "20", "chat_type": "private",
+                             "from": {"id": 7, "is_bot": False, "first_name": "Test"}},
+        })
+        await dp.feed_update(bot, update)
+        await bot.session.close()
+
+    asyncio.run(runner())
+    answer = next(method for method in calls if isinstance(method, AnswerInlineQuery))
+    assert len(answer.results) == 10 and answer.next_offset == ""
+    assert answer.cache_time == inline.INLINE_CACHE_TIME and answer.is_personal is False
+    assert "flowers_bot?start=product_" in answer.results[0].reply_markup.inline_keyboard[0][0].url
+
+
+
+def test_start_payload_opens_product(monkeypatch):
+    """/start product_<id> из кнопки "Заказать" открывает товар в Mini App"""
+    sent = []
+    catalog_index.load(PRODUCTS)
+    product = PRODUCTS[0]
+    # Роутер - синглтон модуля, другие тесты уже подключили его к своим Dispatcher
+    monkeypatch.setattr(start.router, "_parent_router", None)
+    dp = Dispatcher()
+    dp.include_router(start.router)
+
+    async def runner():
+        bot = Bot(token="42:TEST")
+
+        async def fake_request(bot, method, timeout=None):
+            if isinstance(method, SendMessage):
+                sent.append(method)
+            return True
+
+        bot.session.make_request = fake_request
+        for update_id, text in ((1, f"/start product_{product['id']}"), (2, "/start"), (3, "/start product_x")):
+            await dp.feed_update(bot, Update.model_validate({
+                "update_id": update_id,
+                "message": {"message_id": update_id, "date": 0, "text": text,
+                            "chat": {"id": 7, "type": "private"},
+                            "from": {"id": 7, "is_bot": False, "first_name": "Test"}},
+            }))
+        await bot.session.close()
+
+    asyncio.run(runner())
+    # Приветствие на каждый /start и карточка товара только для валидного payload
+    assert len(sent) == 4
+    assert sent[1].text == f"🌸 {product['name']}"
+    button = sent[1].reply_markup.inline_keyboard[0][0]
+    assert button.web_app.url == start.product_url(start.WEBAPP_URL, product["id"])
+    assert button.web_app.url.endswith(f"?product={product['id']}")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
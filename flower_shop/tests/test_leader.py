@@ -0,0 +1,99 @@
+"""
+Тесты выбора ведущего процесса
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.utils.leader import LeaderElection
+
+
+def make_election(engine, lock_dir, events, name):
+    election = LeaderElection(engine=engine, name="test_leader", retry_interval=0.05, lock_dir=str(lock_dir))
+
+    async def elected():
+        events.append(("elected", name))
+
+    async def resigned():
+        events.append(("resigned", name))
+
+    election.on_elected(elected)
+    election.on_resigned(resigned)
+    return election
+
+
+def test_single_leader_and_failover(tmp_path):
+    """Ведущий один; после его остановки место занимает другой воркер"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'leader.db'}")
+        events = []
+        first = make_election(engine, tmp_path, events, "first")
+        second = make_election(engine, tmp_path, events, "second")
+        await first.start()
+        await second.start()
+        assert first.is_leader and not second.is_leader
+
+        await asyncio.sleep(0.15)
+        assert not second.is_leader
+        assert events == [("elected", "first")]
+
+        await first.stop()
+        await asyncio.sleep(0.15)
+        assert second.is_leader
+        assert events == [("elected", "first"), ("resigned", "first"), ("elected", "second")]
+
+        await second.stop()
+        await engine.dispose()
+
+    asyncio.run(runner())
+
+
+def test_off_mode_every_process_leads(tmp_path):
+    """LEADER_ELECTION=off - один воркер, задачи запускаются без блокировки"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'leader.db'}")
+        elections = [
+            LeaderElection(engine=engine, name="test_off", mode="off", lock_dir=str(tmp_path))
+            for _ in range(2)
+        ]
+        for election in elections:
+            await election.start()
+        assert all(election.is_leader for election in elections)
+        for election in elections:
+            await election.stop()
+        assert not any(election.is_leader for election in elections)
+        await engine.dispose()
+
+    asyncio.run(runner())
+
+
+def test_callback_error_does_not_block_election(tmp_path):
+    """Ошибка одной задачи ведущего не мешает запуску остальных"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'leader.db'}")
+        started = []
+        election = LeaderElection(engine=engine, name="test_errors", lock_dir=str(tmp_path))
+
+        async def broken():
+            raise RuntimeError("boom")
+
+        async def job():
+            started.append(True)
+
+        election.on_elected(broken)
+        election.on_elected(job)
+        await election.start()
+        assert election.is_leader and started == [True]
+        await election.stop()
+        await engine.dispose()
+
+    asyncio.run(runner())
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
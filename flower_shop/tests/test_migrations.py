@@ -0,0 +1,149 @@
+"""
+Тесты миграций схемы и регрессионная проверка планов запросов (EXPLAIN)
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from alembic import command
+from sqlalchemy import select, text, inspect
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.models.database import (
+    Order, OrderItem, Product, Reminder, alembic_config, run_migrations, wait_for_migrations,
+)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    asyncio.run(engine.dispose())
+
+
+def run_sync(engine, fn):
+    async def runner():
+        async with engine.connect() as conn:
+            result = await conn.run_sync(fn)
+            await conn.commit()
+            return result
+    return asyncio.run(runner())
+
+
+def index_names(engine):
+    def collect(conn):
+        inspector = inspect(conn)
+        return {
+            index["name"]
+            for table in inspector.get_table_names()
+            for index in inspector.get_indexes(table)
+        }
+    return run_sync(engine, collect)
+
+
+def test_upgrade_downgrade_roundtrip(engine):
+    """Миграции применяются и откатываются до пустой схемы"""
+    asyncio.run(run_migrations(bind=engine))
+    assert "ix_orders_telegram_id_created_at" in index_names(engine)
+
+    def downgrade(conn):
+        command.downgrade(alembic_config(conn), "base")
+    run_sync(engine, downgrade)
+    assert run_sync(engine, lambda conn: inspect(conn).get_table_names()) == ["alembic_version"]
+
+    asyncio.run(run_migrations(bind=engine))
+    assert "ix_products_catalog_keyset" in index_names(engine)
+
+
+def test_workers_wait_for_leader_migrations(engine):
+    """Не ведущий воркер ждет, пока схема дойдет до head"""
+    async def runner():
+        before = await wait_for_migrations(timeout=0.2, interval=0.05, bind=engine)
+        waiting = asyncio.create_task(wait_for_migrations(timeout=10, interval=0.05, bind=engine))
+        await run_migrations(bind=engine)
+        return before, await waiting
+
+    assert asyncio.run(runner()) == (False, True)
+
+
+def test_legacy_database_is_stamped(engine):
+    """База без alembic_version (старый create_all) помечается и догоняется"""
+    asyncio.run(run_migrations("0001", bind=engine))
+    run_sync(engine, lambda conn: conn.execute(text("DROP TABLE alembic_version")))
+
+    asyncio.run(run_migrations(bind=engine))
+    assert "ix_order_items_order_id" in index_names(engine)
+
+
+def test_keyset_columns_backfilled(engine):
+    """NULL в ключах курсоров обрывал пагинацию: 0010 и 0011 заполняют их"""
+    asyncio.run(run_migrations('0009', bind=engine))
+
+    def insert_nulls(conn):
+        conn.execute(text(
+            "INSERT INTO products (name, price, is_available, is_popular, created_at) VALUES ('Старый', 1, 1, NULL, NULL)"
+        ))
+        conn.execute(text("INSERT INTO orders (telegram_id, phone, address, created_at) VALUES (1, '+84', 'Nha Trang', NULL)"))
+
+    run_sync(engine, insert_nulls)
+    asyncio.run(run_migrations(bind=engine))
+
+    def nulls(conn):
+        return (
+            conn.execute(text("SELECT COUNT(*) FROM products WHERE is_popular IS NULL OR created_at IS NULL")).scalar(),
+            conn.execute(text("SELECT COUNT(*) FROM orders WHERE created_at IS NULL")).scalar(),
+        )
+
+    assert run_sync(engine, nulls) == (0, 0)
+
+
+# Формы запросов из routes/orders.py и routes/products.py -> ожидаемый индекс
+QUERY_SHAPES = [
+    (
+        select(Order).where(Order.telegram_id == 1).order_by(Order.created_at.desc(), Order.id.desc()),
+        "ix_orders_telegram_id_created_at",
+    ),
+    (
+        select(OrderItem).where(OrderItem.order_id.in_([1, 2, 3])),
+        "ix_order_items_order_id",
+    ),
+    (
+        select(Order).where(Order.status == "pending").order_by(Order.created_at.desc()),
+        "ix_orders_status_created_at",
+    ),
+    (
+        select(Product).where(Product.is_available == True, Product.category == "roses"),
+        "ix_products_category_available",
+    ),
+    (
+        select(Product.id, Product.name)
+        .where(Product.is_available == True)
+        .order_by(Product.is_popular.desc(), Product.created_at.desc(), Product.id.desc()),
+        "ix_products_catalog_keyset",
+    ),
+    (
+        select(Reminder).where(Reminder.telegram_id == 1),
+        "ix_reminders_telegram_id",
+    ),
+]
+
+
+@pytest.mark.parametrize("query,index", QUERY_SHAPES, ids=[index for _, index in QUERY_SHAPES])
+def test_query_plans_use_indexes(engine, query, index):
+    """Горячие запросы не делают последовательного сканирования"""
+    asyncio.run(run_migrations(bind=engine))
+
+    def explain(conn):
+        compiled = query.compile(conn, compile_kwargs={"literal_binds": True})
+        rows = conn.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()
+        return " | ".join(row[-1] for row in rows)
+
+    plan = run_sync(engine, explain)
+    assert index in plan, plan
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,79 @@
+"""
+Тесты клиента Bot API (TelegramNotifier) на локальном сервере-заглушке
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from aiohttp import web
+
+from backend.utils.telegram_notify import TelegramNotifier
+
+TOKEN = "test"
+
+
+async def with_fake_telegram(handler, scenario):
+    app = web.Application()
+    app.router.add_post(f"/bot{TOKEN}/sendMessage", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    notifier = TelegramNotifier(token=TOKEN, api_url=f"http://127.0.0.1:{port}")
+    try:
+        return await scenario(notifier)
+    finally:
+        await notifier.close()
+        await runner.cleanup()
+
+
+def test_shared_session_is_reused():
+    """Все сообщения идут через одну сессию и keep-alive соединение"""
+    peers = []
+
+    async def handler(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        payload = await request.json()
+        assert payload["parse_mode"] == "HTML"
+        return web.json_response({"ok": True, "result": {"message_id": 1}})
+
+    async def scenario(notifier):
+        session = await notifier.start()
+        results = [await notifier.send_message(1, f"msg {i}") for i in range(5)]
+        assert await notifier.start() is session
+        return results
+
+    results = asyncio.run(with_fake_telegram(handler, scenario))
+    assert all(result.ok for result in results)
+    assert len(set(peers)) == 1
+
+
+def test_retry_after_is_parsed():
+    """429 от Bot API возвращает retry_after из parameters"""
+    async def handler(request):
+        return web.json_response(
+            {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 7",
+             "parameters": {"retry_after": 7}},
+            status=429,
+        )
+
+    async def scenario(notifier):
+        return await notifier.send_message(1, "hi")
+
+    result = asyncio.run(with_fake_telegram(handler, scenario))
+    assert not result.ok
+    assert result.status == 429
+    assert result.retry_after == 7
+
+
+def test_without_token():
+    result = asyncio.run(TelegramNotifier(token=None).send_message(1, "hi"))
+    assert not result.ok
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
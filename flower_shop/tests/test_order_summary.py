@@ -0,0 +1,161 @@
+"""
+Тесты сводки заказов пользователя (read-model) и ее кэша в боте
+"""
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bot'))
+
+from aiohttp import web
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from backend.main import app
+from backend.models.database import run_migrations
+from backend.utils.order_summary import load_order_summary
+from order_summary import OrderSummaryCache, render_orders, repeat_url
+
+client = TestClient(app)
+
+TELEGRAM_ID = 700301
+
+
+def create_order(product_id: int, size: str, quantity: int) -> int:
+    response = client.post("/api/orders", json={
+        "telegram_id": TELEGRAM_ID,
+        "name": "Summary User",
+        "phone": "+84901234567",
+        "address": "Test Address",
+        "delivery_date": "2025-02-14",
+        "delivery_time": "10:00-12:00",
+        "items": [{"product_id": product_id, "size": size, "quantity": quantity}],
+    })
+    assert response.status_code == 200
+    return response.json()["order_id"]
+
+
+def test_summary_follows_orders(products):
+    """Сводка обновляется при создании заказа и смене статуса"""
+    before = client.get(f"/api/orders/{TELEGRAM_ID}/summary").json()["orders_count"]
+    create_order(products[0]["id"], "standard", 1)
+    last_id = create_order(products[1]["id"], "large", 2)
+
+    summary = client.get(f"/api/orders/{TELEGRAM_ID}/summary").json()
+    assert summary["orders_count"] == before + 2
+    assert summary["last_order_id"] == last_id
+    assert summary["recent_orders"][0]["status"] == "pending"
+    assert summary["last_order_items"] == [{
+        "product_id": products[1]["id"],
+        "product_name": products[1]["name"],
+        "size": "large",
+        "price": summary["last_order_items"][0]["price"],
+        "quantity": 2,
+    }]
+
+    assert client.patch(f"/api/orders/{last_id}/status", params={"status": "delivered"}).status_code == 200
+    summary = client.get(f"/api/orders/{TELEGRAM_ID}/summary").json()
+    assert summary["recent_orders"][0]["status"] == "delivered"
+
+    empty = client.get("/api/orders/1/summary").json()
+    assert empty["orders_count"] == 0 and empty["last_order_id"] is None
+
+
+def test_migration_backfills_existing_orders(tmp_path):
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'summary.db'}")
+        await run_migrations("0006", bind=engine)
+        async with engine.begin() as conn:
+            for order_id, created in ((1, "2025-01-01 10:00:00"), (2, "2025-02-01 10:00:00")):
+                await conn.execute(text(
+                    "INSERT INTO orders (id, telegram_id, phone, address, total, status, created_at) "
+                    f"VALUES ({order_id}, 42, '+84', 'addr', 100, 'delivered', '{created}')"
+                ))
+                await conn.execute(text(
+                    "INSERT INTO order_items (order_id, product_id, product_name, size, price, quantity) "
+                    f"VALUES ({order_id}, {order_id * 10}, 'Розы', 'xl', 100, 3)"
+                ))
+        await run_migrations(bind=engine)
+        async with engine.connect() as conn:
+            backfilled = (await conn.execute(text("SELECT * FROM user_order_summaries"))).mappings().one()
+        # Миграция заводит строки одним INSERT ... SELECT, сводку собирает первое чтение
+        async with AsyncSession(engine) as db:
+            summary = await load_order_summary(db, 42)
+        async with engine.connect() as conn:
+            row = (await conn.execute(text("SELECT * FROM user_order_summaries"))).mappings().one()
+        await engine.dispose()
+        return backfilled, summary, row
+
+    backfilled, summary, row = asyncio.run(runner())
+    assert backfilled["telegram_id"] == 42 and backfilled["orders_count"] == 2
+    assert backfilled["recent_orders"] is None
+    assert summary["last_order_id"] == 2 and summary["last_order_items"][0]["product_id"] == 20
+    assert row["last_order_id"] == 2 and '"product_id": 20' in row["last_order_items"]
+
+
+def test_bot_cache_coalesces_and_expires():
+    """Одновременные нажатия - один запрос; по TTL - перезапрос; при ошибке - старая сводка"""
+    state = {"calls": 0, "fail": False}
+
+    async def summary(request):
+        state["calls"] += 1
+        await asyncio.sleep(0.05)
+        if state["fail"]:
+            return web.Response(status=500)
+        return web.json_response({
+            "orders_count": 1,
+            "recent_orders": [{"id": 9, "status": "delivered", "total": 1200000,
+                               "created_at": "2025-10-15T10:00:00"}],
+            "last_order_id": 9,
+            "last_order_items": [{"product_id": 3, "product_name": "Розы", "size": "xl",
+                                  "price": 1200000, "quantity": 2}],
+        })
+
+    async def runner():
+        api = web.Application()
+        api.router.add_get("/api/orders/{telegram_id}/summary", summary)
+        server = web.AppRunner(api)
+        await server.setup()
+        site = web.TCPSite(server, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+
+        cache = OrderSummaryCache(api_url=f"http://127.0.0.1:{port}", ttl=0.2)
+        first = await asyncio.gather(*(cache.get(1) for _ in range(5)))
+        cached = await cache.get(1)
+        calls_before_expiry = state["calls"]
+        await asyncio.sleep(0.25)
+        state["fail"] = True
+        stale = await cache.get(1)
+        missing = await cache.get(2)
+        await cache.close()
+        await server.cleanup()
+        return first, cached, calls_before_expiry, stale, missing
+
+    first, cached, calls_before_expiry, stale, missing = asyncio.run(runner())
+    assert calls_before_expiry == 1
+    assert all(result["last_order_id"] == 9 for result in first) and cached == first[0]
+    assert stale == first[0]
+    assert missing is None
+
+
+def test_render_and_repeat_url():
+    summary = {
+        "orders_count": 7,
+        "recent_orders": [{"id": 9, "status": "delivered", "total": 1200000, "created_at": "2025-10-15T10:00:00"}],
+        "last_order_id": 9,
+        "last_order_items": [{"product_id": 3, "product_name": "Розы", "size": "xl", "quantity": 2},
+                             {"product_id": 5, "product_name": "Пионы", "size": "standard", "quantity": 1}],
+    }
+    text_value = render_orders(summary)
+    assert "Заказ #9" in text_value and "1,200,000 VND" in text_value and "15.10.2025" in text_value
+    assert "еще 6" in text_value
+    assert repeat_url("https://shop/webapp", summary) == "https://shop/webapp?repeat=9&cart=3%3Axl%3A2%2C5%3Astandard%3A1"
+    assert "нет заказов" in render_orders({"recent_orders": []})
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,183 @@
+"""
+Тесты истории заказов
+"""
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+import asyncio
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from backend.main import app
+from backend.models.database import DATABASE_URL, Product
+from backend.utils.pricing import item_price, parse_items, price_order, PricingError
+
+client = TestClient(app)
+
+TELEGRAM_ID = 700001
+
+
+def create_order(product, items_count=1):
+    order_data = {
+        "telegram_id": TELEGRAM_ID,
+        "name": "Test User",
+        "phone": "+84901234567",
+        "address": "Test Address",
+        "delivery_date": "2025-02-14",
+        "delivery_time": "10:00-12:00",
+        "items": [
+            {
+                "product_id": product["id"],
+                "product_name": product["name"],
+                "size": "standard",
+                "price": product["price"],
+                "quantity": 1
+            }
+            for _ in range(items_count)
+        ],
+        "items_total": product["price"] * items_count,
+        "delivery_cost": 100000,
+        "total": product["price"] * items_count + 100000
+    }
+    response = client.post("/api/orders", json=order_data)
+    assert response.status_code == 200
+    return response.json()["order_id"]
+
+
+def test_user_orders_with_items(products):
+    """Позиции загружаются вместе с заказами"""
+    order_id = create_order(products[0], items_count=2)
+    orders = client.get(f"/api/orders/{TELEGRAM_ID}").json()
+    order = next(o for o in orders if o["id"] == order_id)
+    assert len(order["items"]) == 2
+
+
+def test_user_orders_pagination_and_summary(products):
+    """Курсор проходит всю историю, summary не содержит позиций"""
+    for _ in range(3):
+        create_order(products[0])
+    all_ids = [o["id"] for o in client.get(f"/api/orders/{TELEGRAM_ID}").json()]
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2, "summary": "true"}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get(f"/api/orders/{TELEGRAM_ID}", params=params).json()
+        for order in page["items"]:
+            assert "items" not in order
+            assert order["items_count"] >= 1
+        seen.extend(order["id"] for order in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+
+    assert seen == all_ids
+
+
+def test_price_order():
+    """Наценка за размер и бесплатная доставка от 3,000,000 VND"""
+    products = {
+        1: {"id": 1, "name": "Розы", "price": 800000, "is_available": True},
+        2: {"id": 2, "name": "Лилии", "price": 900000, "is_available": False},
+    }
+
+    assert item_price(800000, "large") == 1040000
+    assert item_price(800000, "xl") == 1200000
+
+    lines = parse_items([{"product_id": 1, "size": "large", "quantity": 2, "price": 1}])
+    priced = price_order(lines, products)
+    assert priced.items[0]["price"] == 1040000
+    assert priced.items_total == 2080000
+    assert priced.delivery_cost == 100000
+    assert priced.total == 2180000
+
+    priced = price_order(parse_items([{"product_id": 1, "size": "xl", "quantity": 3}]), products)
+    assert priced.delivery_cost == 0
+
+    for items in (
+        [{"product_id": 2, "quantity": 1}],
+        [{"product_id": 3, "quantity": 1}],
+        [{"product_id": 1, "size": "huge", "quantity": 1}],
+        [{"product_id": 1, "quantity": 0}],
+        [],
+    ):
+        with pytest.raises(PricingError):
+            price_order(parse_items(items), products)
+
+
+def test_create_order_ignores_client_prices(products):
+    """Подмененные цены клиента заменяются расчетом сервера"""
+    product = products[0]
+    response = client.post("/api/orders", json={
+        "telegram_id": TELEGRAM_ID,
+        "name": "Test User",
+        "phone": "+84901234567",
+        "address": "Test Address",
+        "delivery_date": "2025-02-14",
+        "delivery_time": "10:00-12:00",
+        "items": [{"product_id": product["id"], "product_name": "x", "size": "standard", "price": 1, "quantity": 1}],
+        "items_total": 1,
+        "delivery_cost": 0,
+        "total": 1
+    })
+    assert response.status_code == 200
+    assert response.json()["items_total"] == product["price"]
+
+    order = next(o for o in client.get(f"/api/orders/{TELEGRAM_ID}").json() if o["id"] == response.json()["order_id"])
+    assert order["items"][0]["price"] == product["price"]
+    assert order["items"][0]["product_name"] == product["name"]
+
+
+
+def set_product(product_id: int, **values):
+    """Изменить товар в БД в обход админки (как другой воркер): снимок каталога не знает"""
+    async def runner():
+        engine = create_async_engine(DATABASE_URL)
+        async with engine.begin() as conn:
+            await conn.execute(update(Product).where(Product.id == product_id).values(**values))
+        await engine.dispose()
+    asyncio.run(runner())
+
+
+def order_payload(product_id: int) -> dict:
+    return {
+        "telegram_id": TELEGRAM_ID,
+        "name": "Test User",
+        "phone": "+84901234567",
+        "address": "Test Address",
+        "delivery_date": "2025-02-14",
+        "delivery_time": "10:00-12:00",
+        "items": [{"product_id": product_id, "size": "standard", "quantity": 1}],
+    }
+
+
+def test_create_order_uses_current_db_prices(products):
+    """Цена и наличие - из БД на момент заказа, а не из снимка каталога"""
+    product = products[0]
+    try:
+        set_product(product["id"], price=product["price"] + 1000)
+        response = client.post("/api/orders", json=order_payload(product["id"]))
+        assert response.status_code == 200
+        assert response.json()["items_total"] == product["price"] + 1000
+
+        set_product(product["id"], is_available=False)
+        response = client.post("/api/orders", json=order_payload(product["id"]))
+        assert response.status_code == 400
+    finally:
+        set_product(product["id"], price=product["price"], is_available=True)
+
+
+def test_create_order_rejects_empty_items():
+    response = client.post("/api/orders", json={**order_payload(0), "items": []})
+    assert response.status_code == 400
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,242 @@
+"""
+Тесты outbox уведомлений
+"""
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.main import app
+from backend.models.database import DATABASE_URL, NotificationOutbox, run_migrations
+from backend.utils import outbox, telegram_notify
+from backend.utils.outbox import OutboxDispatcher, digest_delay, enqueue
+from backend.utils.telegram_notify import render_admin_digest, split_message
+
+client = TestClient(app)
+
+TELEGRAM_ID = 700101
+
+
+ADMIN_CHAT_ID = "-100500"
+
+
+def test_order_enqueues_notifications(monkeypatch, products):
+    """Уведомления о заказе лежат в outbox сразу после ответа API"""
+    # Не зависим от ADMIN_CHAT_ID в окружении: outbox импортирует его из telegram_notify
+    monkeypatch.setattr(outbox, "ADMIN_CHAT_ID", ADMIN_CHAT_ID)
+    monkeypatch.setattr(telegram_notify, "ADMIN_CHAT_ID", ADMIN_CHAT_ID)
+    product = products[0]
+    response = client.post("/api/orders", json={
+        "telegram_id": TELEGRAM_ID,
+        "name": "Outbox User",
+        "phone": "+84901234567",
+        "address": "Test Address",
+        "delivery_date": "2025-02-14",
+        "delivery_time": "10:00-12:00",
+        "items": [{"product_id": product["id"], "size": "standard", "quantity": 1}],
+    })
+    assert response.status_code == 200
+    order_id = response.json()["order_id"]
+
+    async def runner():
+        engine = create_async_engine(DATABASE_URL)
+        async with AsyncSession(engine) as db:
+            rows = (await db.execute(
+                select(NotificationOutbox).where(NotificationOutbox.payload.contains(f"#{order_id}"))
+            )).scalars().all()
+        await engine.dispose()
+        return rows
+
+    rows = asyncio.run(runner())
+    assert {row.kind for row in rows} == {"order_admin", "order_client"}
+    assert all(row.status == "pending" for row in rows)
+    client_row = next(row for row in rows if row.kind == "order_client")
+    assert client_row.chat_id == TELEGRAM_ID
+    admin_row = next(row for row in rows if row.kind == "order_admin")
+    assert admin_row.chat_id == int(ADMIN_CHAT_ID)
+
+
+def dispatch(tmp_path, monkeypatch, results, rounds):
+    """Прогнать диспетчер по временной БД с подмененной отправкой"""
+    sent = []
+
+    async def fake_send(chat_id, text, priority=None):
+        sent.append(chat_id)
+        return results.get(chat_id, True)
+
+    monkeypatch.setattr(outbox, "send_telegram_message", fake_send)
+    # Повтор без паузы, чтобы второй проход снова взял строку
+    monkeypatch.setattr(outbox, "retry_delay", lambda attempts: -1)
+
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'outbox.db'}")
+        await run_migrations(bind=engine)
+        factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as db:
+            enqueue(db, "order_client", 1, {"text": "ok"})
+            enqueue(db, "order_client", 2, {"text": "fail"})
+            await db.commit()
+
+        dispatcher = OutboxDispatcher(session_factory=factory, max_attempts=2)
+        processed = [await dispatcher.dispatch_once() for _ in range(rounds)]
+        async with factory() as db:
+            rows = {row.chat_id: row for row in (await db.execute(select(NotificationOutbox))).scalars()}
+        await engine.dispose()
+        return processed, rows
+
+    processed, rows = asyncio.run(runner())
+    return processed, rows, sent
+
+
+def test_dispatch_retries_and_gives_up(tmp_path, monkeypatch):
+    """Успешная строка отправляется один раз, неудачная повторяется до max_attempts"""
+    processed, rows, sent = dispatch(tmp_path, monkeypatch, {2: False}, rounds=3)
+    assert processed == [2, 1, 0]
+    assert sent.count(1) == 1
+    assert sent.count(2) == 2
+    assert rows[1].status == "sent" and rows[1].sent_at is not None
+    assert rows[2].status == "failed" and rows[2].attempts == 2
+    assert rows[2].claim_token is None
+    assert json.loads(rows[2].payload) == {"text": "fail"}
+
+
+def test_stale_claim_is_ignored(tmp_path, monkeypatch):
+    """Результат с чужим claim_token не перезаписывает строку"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'claim.db'}")
+        await run_migrations(bind=engine)
+        factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as db:
+            enqueue(db, "order_client", 3, {"text": "x"})
+            await db.commit()
+
+        async def fake_send(chat_id, text, priority=None):
+            return True
+
+        monkeypatch.setattr(outbox, "send_telegram_message", fake_send)
+        dispatcher = OutboxDispatcher(session_factory=factory)
+        claimed = await dispatcher._claim()
+        row_id = claimed[0]["id"]
+        await dispatcher._deliver([{**claimed[0], "token": "other-token"}], "x")
+        async with factory() as db:
+            row = await db.get(NotificationOutbox, row_id)
+        await engine.dispose()
+        return row
+
+    row = asyncio.run(runner())
+    assert row.status == "sending"
+
+
+
+def admin_order(order_id, total=500000, items=1):
+    return {
+        "order_id": order_id,
+        "name": f"Client {order_id}",
+        "phone": "+84901234567",
+        "delivery_date": "2025-03-08",
+        "delivery_time": "10:00-12:00",
+        "total": total,
+        "items": [{"product_name": "Розы", "size": "standard", "quantity": 1}] * items,
+    }
+
+
+def test_admin_digest(tmp_path, monkeypatch):
+    """Заказы внутри окна уходят админу одной сводкой"""
+    sent = []
+
+    async def fake_send(chat_id, text, priority=None):
+        sent.append((chat_id, text, priority))
+        return True
+
+    monkeypatch.setattr(outbox, "send_telegram_message", fake_send)
+
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'digest.db'}")
+        await run_migrations(bind=engine)
+        factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as db:
+            # Окно первого заказа уже истекло, второй и третий еще ждут
+            enqueue(db, "order_admin", -100, {"text": "#1", "order": admin_order(1)}, delay=-1)
+            enqueue(db, "order_admin", -100, {"text": "#2", "order": admin_order(2)}, delay=60)
+            enqueue(db, "order_admin", -100, {"text": "#3", "order": admin_order(3)}, delay=60)
+            await db.commit()
+        processed = await OutboxDispatcher(session_factory=factory).dispatch_once()
+        async with factory() as db:
+            statuses = (await db.execute(select(NotificationOutbox.status))).scalars().all()
+        await engine.dispose()
+        return processed, statuses
+
+    processed, statuses = asyncio.run(runner())
+    assert processed == 3
+    assert statuses == ["sent"] * 3
+    assert len(sent) == 1
+    chat_id, text, priority = sent[0]
+    assert chat_id == -100 and priority == "admin"
+    assert "Новые заказы: 3" in text
+    assert "1,500,000 VND" in text
+    assert text.index("#1") < text.index("#2") < text.index("#3")
+
+
+def test_immediate_order_not_merged_into_digest(tmp_path, monkeypatch):
+    """Крупный заказ уходит один, ждущие сводки заказы остаются в окне"""
+    sent = []
+
+    async def fake_send(chat_id, text, priority=None):
+        sent.append(text)
+        return True
+
+    monkeypatch.setattr(outbox, "send_telegram_message", fake_send)
+
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'immediate.db'}")
+        await run_migrations(bind=engine)
+        factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as db:
+            enqueue(db, "order_admin", -100, {"text": "#2", "order": admin_order(2)}, delay=60)
+            enqueue(db, "order_admin", -100, {"text": "#3", "order": admin_order(3)}, delay=60)
+            enqueue(db, "order_admin", -100, {
+                "text": "#9", "order": admin_order(9, total=9000000), "immediate": True,
+            })
+            await db.commit()
+        processed = await OutboxDispatcher(session_factory=factory).dispatch_once()
+        async with factory() as db:
+            statuses = (await db.execute(
+                select(NotificationOutbox.status).order_by(NotificationOutbox.id)
+            )).scalars().all()
+        await engine.dispose()
+        return processed, statuses
+
+    processed, statuses = asyncio.run(runner())
+    assert processed == 1
+    assert sent == ["#9"]
+    assert statuses == ["pending", "pending", "sent"]
+
+
+def test_digest_delay(monkeypatch):
+    """Крупный заказ не ждет окна сводки"""
+    assert digest_delay({"total": 100}, window=0) == 0
+    assert digest_delay({"total": 100}, window=60) == 60
+    assert digest_delay({"total": outbox.ADMIN_DIGEST_IMMEDIATE_TOTAL}, window=60) == 0
+
+
+def test_split_message():
+    """Длинная сводка делится по строкам в пределах лимита Telegram"""
+    text = render_admin_digest([admin_order(i, items=3) for i in range(1, 80)])
+    parts = split_message(text)
+    assert len(parts) > 1
+    assert all(len(part) <= 4096 for part in parts)
+    assert "\n".join(parts) == text
+    assert split_message("x" * 5000, limit=4096) == ["x" * 4096, "x" * 904]
+    assert split_message("short") == ["short"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,136 @@
+"""
+Тесты напоминаний: расчет due_at, API и планировщик
+"""
+import asyncio
+import json
+import pytest
+from datetime import date, datetime, timedelta
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from backend.main import app
+from backend.models.database import NotificationOutbox, Reminder, run_migrations
+from backend.utils.reminders import ReminderScheduler, compute_due_at, occurrence_date
+
+client = TestClient(app)
+
+TELEGRAM_ID = 700201
+
+
+def test_compute_due_at():
+    """За N дней в 9:00 по Нячангу; годовые события переносятся на следующий год"""
+    now = datetime(2025, 6, 1)
+    assert compute_due_at(date(2025, 6, 10), 3, False, now) == datetime(2025, 6, 7, 2, 0)
+    assert compute_due_at(date(2025, 5, 10), 3, False, now) is None
+    assert compute_due_at(date(1990, 5, 10), 3, True, now) == datetime(2026, 5, 7, 2, 0)
+    assert compute_due_at(date(1990, 8, 10), 0, True, now) == datetime(2025, 8, 10, 2, 0)
+    # 29 февраля в невисокосный год
+    assert compute_due_at(date(2024, 2, 29), 0, True, now) == datetime(2026, 2, 28, 2, 0)
+    assert occurrence_date(datetime(2026, 5, 7, 2, 0), 3) == date(2026, 5, 10)
+
+
+def test_reminders_api():
+    event = (datetime.utcnow() + timedelta(days=20)).strftime("%d.%m.%Y")
+    response = client.post("/api/reminders", json={
+        "telegram_id": TELEGRAM_ID,
+        "event_name": "День рождения мамы",
+        "event_date": event,
+        "remind_days_before": 2,
+        "is_yearly": True,
+    })
+    assert response.status_code == 200
+    reminder = response.json()
+    assert reminder["due_at"] is not None
+
+    reminders = client.get(f"/api/reminders/{TELEGRAM_ID}").json()
+    assert reminder["id"] in [r["id"] for r in reminders]
+
+    assert client.post("/api/reminders", json={
+        "telegram_id": TELEGRAM_ID, "event_name": "Прошло", "event_date": "01.01.2020",
+    }).status_code == 400
+    assert client.post("/api/reminders", json={
+        "telegram_id": TELEGRAM_ID, "event_name": "Ошибка", "event_date": "2020-01-01",
+    }).status_code == 400
+
+    assert client.delete(f"/api/reminders/{reminder['id']}", params={"telegram_id": 1}).status_code == 404
+    assert client.delete(f"/api/reminders/{reminder['id']}", params={"telegram_id": TELEGRAM_ID}).status_code == 200
+    assert reminder["id"] not in [r["id"] for r in client.get(f"/api/reminders/{TELEGRAM_ID}").json()]
+
+
+def test_scheduler_fires_at_due_time(tmp_path):
+    """Напоминание уходит в outbox в срок; годовое переносится, разовое отключается"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'reminders.db'}")
+        await run_migrations(bind=engine)
+        factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        now = datetime.utcnow()
+        due = now + timedelta(seconds=0.3)
+        async with factory() as db:
+            once = Reminder(telegram_id=1, event_name="Годовщина", event_date="01.01.2020",
+                            remind_days_before=0, due_at=due)
+            yearly = Reminder(telegram_id=2, event_name="День рождения", event_date="15.03.1990",
+                              remind_days_before=1, is_yearly=True, due_at=due)
+            far = Reminder(telegram_id=3, event_name="Потом", event_date="01.01.2020",
+                           remind_days_before=0, due_at=now + timedelta(days=30))
+            db.add_all([once, yearly, far])
+            await db.commit()
+
+        scheduler = ReminderScheduler(session_factory=factory, horizon=60)
+        scheduler.start()
+        await asyncio.sleep(0.05)
+        # Дальше горизонта в памяти не держим
+        assert set(scheduler._scheduled) == {once.id, yearly.id}
+        await asyncio.sleep(0.6)
+        await scheduler.stop()
+
+        async with factory() as db:
+            reminders = {r.telegram_id: r for r in (await db.execute(select(Reminder))).scalars()}
+            outbox_rows = (await db.execute(select(NotificationOutbox))).scalars().all()
+        await engine.dispose()
+        return scheduler.fired, due, reminders, outbox_rows
+
+    fired, due, reminders, outbox_rows = asyncio.run(runner())
+    assert fired == 2
+    assert sorted(row.chat_id for row in outbox_rows) == [1, 2]
+    assert all(row.kind == "reminder" for row in outbox_rows)
+    assert "День рождения" in json.loads(next(r for r in outbox_rows if r.chat_id == 2).payload)["text"]
+    assert reminders[1].is_active is False and reminders[1].due_at is None
+    assert reminders[2].is_active is True
+    assert reminders[2].due_at == compute_due_at(date(1990, 3, 15), 1, True, due)
+    assert reminders[2].due_at.month == 3 and reminders[2].due_at.day == 14
+    assert reminders[2].last_sent_at is not None
+    assert reminders[3].last_sent_at is None
+
+
+
+def test_scheduler_sees_reminders_from_other_workers(tmp_path):
+    """Напоминание, созданное в другом воркере (без schedule()), подхватывается пересканированием"""
+    async def runner():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'rescan.db'}")
+        await run_migrations(bind=engine)
+        factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        scheduler = ReminderScheduler(session_factory=factory, horizon=3600, rescan_interval=0.2)
+        scheduler.start()
+        await asyncio.sleep(0.05)
+
+        async with factory() as db:
+            db.add(Reminder(telegram_id=4, event_name="Годовщина", event_date="01.01.2020",
+                            remind_days_before=0, due_at=datetime.utcnow() + timedelta(seconds=0.3)))
+            await db.commit()
+        await asyncio.sleep(0.8)
+        await scheduler.stop()
+        await engine.dispose()
+        return scheduler.fired
+
+    assert asyncio.run(runner()) == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,80 @@
+"""
+Тесты триграммного индекса поиска товаров
+"""
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from backend.main import app
+from shared.search_index import TrigramIndex, normalize
+
+client = TestClient(app)
+
+
+def make_index():
+    index = TrigramIndex()
+    index.sync([
+        (1, "🌹 Розы премиум", "Премиальные розы высшего качества"),
+        (2, "🌹 Розы белые", "Элегантные белые розы"),
+        (3, "Hoa hồng đỏ", "Bó hoa tươi"),
+        (4, "Орхидея", "Экзотика с розовыми прожилками"),
+        (5, "Ёлочка", "Зимний букет"),
+    ])
+    return index
+
+
+def test_normalize():
+    assert normalize("🌹 Розы ПРЕМИУМ!") == "розы премиум"
+    assert normalize("Hoa hồng đỏ") == "hoa hong do"
+    assert normalize("Ёлочка") == "елочка"
+
+
+def test_search_ranking():
+    index = make_index()
+    ids = [doc_id for doc_id, _ in index.search("розы")]
+    # Совпадения в названии выше, чем в описании
+    assert ids[:2] in ([1, 2], [2, 1])
+    assert [doc_id for doc_id, _ in index.search("розы прем")][0] == 1
+
+
+def test_search_typeahead_and_diacritics():
+    index = make_index()
+    assert index.search("р")[0][0] in (1, 2)
+    assert [doc_id for doc_id, _ in index.search("hong")] == [3]
+    assert [doc_id for doc_id, _ in index.search("đỏ")] == [3]
+    assert [doc_id for doc_id, _ in index.search("елочка")] == [5]
+    assert index.search("🌹") == []
+
+
+def test_incremental_sync():
+    index = make_index()
+    changed = index.sync([
+        (1, "🌹 Розы премиум", "Премиальные розы высшего качества"),
+        (2, "Тюльпаны", "Весенние тюльпаны"),
+        (3, "Hoa hồng đỏ", "Bó hoa tươi"),
+    ])
+    # Изменился один товар, два удалены
+    assert changed == 3
+    assert len(index) == 3
+    assert [doc_id for doc_id, _ in index.search("тюльп")] == [2]
+    assert [doc_id for doc_id, _ in index.search("орхидея")] == []
+
+
+def test_search_endpoint():
+    product_id = client.post("/api/products", json={
+        "name": "💐 Гортензия лавандовая", "category": "mono", "price": 400000, "is_available": True,
+    }).json()["id"]
+
+    response = client.get("/api/products/search", params={"q": "лаванд"})
+    assert response.status_code == 200
+    assert response.json()[0]["id"] == product_id
+
+    client.delete(f"/api/products/{product_id}")
+    assert client.get("/api/products/search", params={"q": "лаванд"}).json() == []
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,154 @@
+"""
+Тесты планировщика отправки в Telegram (лимиты, приоритеты, 429)
+"""
+import asyncio
+import time
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from backend.utils.send_scheduler import (
+    SendScheduler, TokenBucket, PRIORITY_ADMIN, PRIORITY_BULK, PRIORITY_CUSTOMER,
+)
+from backend.utils.telegram_notify import SendResult
+
+
+class FakeTelegram:
+    """Записывает отправки; responses[chat_id] - очередь ответов для этого чата"""
+
+    def __init__(self, responses=None):
+        self.sent = []
+        self.responses = responses or {}
+
+    async def __call__(self, chat_id, text):
+        self.sent.append((chat_id, text, time.monotonic()))
+        queue = self.responses.get(chat_id)
+        if queue:
+            return queue.pop(0)
+        return SendResult(ok=True, status=200)
+
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=1)
+    now = bucket.updated
+    assert bucket.delay(now) == 0
+    bucket.consume(now)
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.5) == 0
+
+
+def test_priority_lanes():
+    """При общем лимите клиентские сообщения уходят раньше админских и рассылок"""
+    fake = FakeTelegram()
+
+    async def scenario():
+        scheduler = SendScheduler(fake, global_rate=1, chat_rate=100, concurrency=1)
+        scheduler._global.tokens = 0
+        scheduler.start()
+        sends = [
+            asyncio.create_task(scheduler.send(1, "bulk", PRIORITY_BULK)),
+            asyncio.create_task(scheduler.send(2, "admin", PRIORITY_ADMIN)),
+            asyncio.create_task(scheduler.send(3, "customer", PRIORITY_CUSTOMER)),
+        ]
+        await asyncio.sleep(0)
+        # Все три ждут токен; добавляем токены разом
+        scheduler._global.rate = 1000
+        scheduler._global.capacity = 1000
+        results = await asyncio.gather(*sends)
+        await scheduler.stop()
+        return results
+
+    assert run(scenario) == [True, True, True]
+    assert [text for _, text, _ in fake.sent] == ["customer", "admin", "bulk"]
+
+
+def test_per_chat_limit():
+    """В один чат не чаще chat_rate, другие чаты не ждут"""
+    fake = FakeTelegram()
+
+    async def scenario():
+        scheduler = SendScheduler(fake, global_rate=1000, chat_rate=20)
+        scheduler.start()
+        await asyncio.gather(*(scheduler.send(1, str(i)) for i in range(3)), scheduler.send(2, "other"))
+        await scheduler.stop()
+
+    run(scenario)
+    same_chat = [at for chat_id, _, at in fake.sent if chat_id == 1]
+    assert [text for chat_id, text, _ in fake.sent if chat_id == 1] == ["0", "1", "2"]
+    assert same_chat[2] - same_chat[0] >= 0.09
+    assert fake.sent[1][0] == 2
+
+
+def test_retry_after_is_honored():
+    """429 откладывает отправку на retry_after и не теряет сообщение"""
+    fake = FakeTelegram({5: [SendResult(ok=False, status=429, retry_after=0.05)]})
+
+    async def scenario():
+        scheduler = SendScheduler(fake, global_rate=1000, chat_rate=1000)
+        scheduler.start()
+        ok = await scheduler.send(5, "hi")
+        metrics = scheduler.metrics()
+        await scheduler.stop()
+        return ok, metrics
+
+    ok, metrics = run(scenario)
+    assert ok
+    assert len(fake.sent) == 2
+    assert fake.sent[1][2] - fake.sent[0][2] >= 0.05
+    assert metrics["rate_limited"] == 1
+    assert metrics["sent"] == 1
+    assert metrics["latency_ms"]["p50"] is not None
+
+
+def test_client_errors_are_not_retried():
+    fake = FakeTelegram({6: [SendResult(ok=False, status=403, description="Forbidden: bot was blocked by the user")]})
+
+    async def scenario():
+        scheduler = SendScheduler(fake, global_rate=1000, chat_rate=1000)
+        scheduler.start()
+        ok = await scheduler.send(6, "hi")
+        await scheduler.stop()
+        return ok, scheduler.metrics()
+
+    ok, metrics = run(scenario)
+    assert not ok
+    assert len(fake.sent) == 1
+    assert metrics["failed"] == 1
+
+
+def test_overflow_drops_lowest_priority():
+    """При переполнении вытесняется рассылка, а не сообщение клиенту"""
+    fake = FakeTelegram()
+
+    async def scenario():
+        scheduler = SendScheduler(fake, global_rate=1000, chat_rate=1000, max_queue=1)
+        scheduler._global.tokens = 0
+        scheduler._global.rate = 0.001
+        scheduler.start()
+        bulk = asyncio.create_task(scheduler.send(1, "bulk", PRIORITY_BULK))
+        await asyncio.sleep(0)
+        customer = asyncio.create_task(scheduler.send(2, "customer"))
+        await asyncio.sleep(0)
+        another_bulk = await scheduler.send(3, "bulk", PRIORITY_BULK)
+        dropped = await bulk
+        metrics = scheduler.metrics()
+        await scheduler.stop()
+        return dropped, another_bulk, await customer, metrics
+
+    dropped, another_bulk, customer, metrics = run(scenario)
+    assert dropped is False
+    assert another_bulk is False
+    # Планировщик остановлен до отправки - клиентское сообщение завершилось неудачей, а не зависло
+    assert customer is False
+    assert metrics["dropped"] == 2
+    assert metrics["queue_depth"][PRIORITY_CUSTOMER] == 1
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,104 @@
+"""
+Тесты супервизора start_all.py
+"""
+import asyncio
+import pytest
+import socket
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+import start_all
+from start_all import Child, backend_workers, wait_ready
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_backend_workers():
+    assert backend_workers("3") == 3
+    assert backend_workers("0") == 1
+    assert backend_workers("auto") == (os.cpu_count() or 1)
+
+
+def test_ready_after_health_responds(tmp_path):
+    """Готовность - по ответу /health, а не по фиксированной паузе"""
+    (tmp_path / "health").write_text("OK")
+    port = free_port()
+
+    async def runner():
+        child = Child(
+            "http",
+            [sys.executable, "-m", "http.server", str(port), "--bind", "127.0.0.1"],
+            health_url=f"http://127.0.0.1:{port}/health",
+            cwd=str(tmp_path),
+        )
+        task = asyncio.create_task(child.run())
+        await asyncio.wait_for(child.ready.wait(), 10)
+        code = await child.stop(timeout=5)
+        await task
+        return child, code
+
+    child, code = asyncio.run(runner())
+    assert child.restarts == 0
+    assert code is not None
+
+
+def test_wait_ready_gives_up_when_process_exits():
+    port = free_port()
+
+    async def runner():
+        process = await asyncio.create_subprocess_exec(sys.executable, "-c", "pass")
+        await process.wait()
+        return await wait_ready(f"http://127.0.0.1:{port}/health", timeout=5, process=process)
+
+    assert asyncio.run(runner()) is False
+
+
+def test_crashed_child_restarts_with_backoff(monkeypatch):
+    """Упавший процесс перезапускается, пауза растет до backoff_max"""
+    delays = []
+    original = start_all.logger.warning
+
+    def record(message):
+        delays.append(message.rsplit("через ", 1)[1])
+        original(message)
+
+    monkeypatch.setattr(start_all.logger, "warning", record)
+
+    async def runner():
+        child = Child("crash", [sys.executable, "-c", "raise SystemExit(3)"], backoff=0.1, backoff_max=0.4)
+        task = asyncio.create_task(child.run())
+        while child.restarts < 4:
+            await asyncio.sleep(0.05)
+        await child.stop(timeout=5)
+        await task
+        return child
+
+    child = asyncio.run(runner())
+    assert child.restarts >= 4
+    assert delays[:4] == ["0.1 с", "0.2 с", "0.4 с", "0.4 с"]
+
+
+def test_stop_forwards_signal_and_kills_after_timeout():
+    """Процесс, игнорирующий сигнал, добивается SIGKILL после таймаута"""
+    script = "import signal, time; signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(30)"
+
+    async def runner():
+        child = Child("stubborn", [sys.executable, "-c", script])
+        task = asyncio.create_task(child.run())
+        await child.ready.wait()
+        await asyncio.sleep(0.3)
+        code = await child.stop(timeout=0.5)
+        await task
+        return code
+
+    assert asyncio.run(runner()) == -9
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+"""
+Тесты ограничения частоты апдейтов от пользователя
+"""
+import asyncio
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bot'))
+
+from aiogram import Bot, Dispatcher, F
+from aiogram.methods import SendMessage
+from aiogram.types import Update
+
+from throttling import ThrottlingMiddleware, UserBuckets, setup_throttling
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    })
+
+
+def test_buckets_refill_and_evict():
+    buckets = UserBuckets(ttl=10, max_size=2)
+    key = (1, "default")
+    assert [buckets.consume(key, 1, 2, now=0) for _ in range(3)] == [True, True, False]
+    assert buckets.consume(key, 1, 2, now=1) is True
+    buckets.consume((2, "default"), 1, 2, now=1)
+    buckets.consume((3, "default"), 1, 2, now=2)
+    # Сверх max_size вытесняется самый давний
+    assert len(buckets) == 2 and key not in buckets._buckets
+    buckets.consume((4, "default"), 1, 2, now=20)
+    # Простоявшие дольше ttl удалены
+    assert len(buckets) == 1
+
+
+def test_middleware_limits_per_rule():
+    """Кнопка с БД ограничена строже, остальные сообщения - общим лимитом"""
+    handled = []
+    dp = Dispatcher()
+    throttling = setup_throttling(dp, rate=0.001, burst=3, limits={"orders": (0.001, 1)},
+                                  rules={"📦 Мои заказы": "orders"}, mode="drop")
+
+    @dp.message(F.text)
+    async def any_text(message):
+        handled.append((message.from_user.id, message.text))
+
+    async def runner():
+        bot = Bot(token="42:TEST")
+        for i in range(5):
+            await dp.feed_update(bot, message_update(i, 1, "📦 Мои заказы"))
+            await dp.feed_update(bot, message_update(100 + i, 1, "привет"))
+            await dp.feed_update(bot, message_update(200 + i, 2, "привет"))
+        await bot.session.close()
+
+    asyncio.run(runner())
+    assert handled.count((1, "📦 Мои заказы")) == 1
+    assert handled.count((1, "привет")) == 3
+    assert handled.count((2, "привет")) == 3
+    metrics = throttling.metrics()
+    assert metrics["allowed"] == 7
+    assert metrics["throttled"] == {"orders": 4, "default": 4}
+
+
+def test_slow_down_reply_once():
+    """В режиме reply пользователь получает одно предупреждение, а не по одному на апдейт"""
+    sent = []
+    middleware = ThrottlingMiddleware(rate=0.001, burst=1, limits={}, rules={}, mode="reply")
+
+    async def handler(event, data):
+        return "handled"
+
+    async def runner():
+        bot = Bot(token="42:TEST")
+
+        async def fake_call(method, timeout=None):
+            sent.append(method)
+
+        bot.session.make_request = lambda bot, method, timeout=None: fake_call(method)
+        results = []
+        for i in range(4):
+            message = message_update(i, 1, "спам").message.as_(bot)
+            results.append(await middleware(handler, message, {}))
+        await bot.session.close()
+        return results
+
+    results = asyncio.run(runner())
+    assert results == ["handled", None, None, None]
+    assert len(sent) == 1 and isinstance(sent[0], SendMessage)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,101 @@
+"""
+Тесты единого сервера API + бот (unified_server.py)
+"""
+import pytest
+from fastapi.testclient import TestClient
+import sys
+import os
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from aiogram import Bot
+
+import unified_server
+# Модули бота импортируются после unified_server: он добавляет flower_shop/bot в sys.path
+import recorder
+from handlers import inline, start
+
+SECRET = "test-secret"
+# Вызовы set_webhook в запуске lifespan модуля
+webhook_calls = []
+
+
+def test_api_only_without_token(monkeypatch):
+    """Без BOT_TOKEN поднимается только API"""
+    monkeypatch.setattr(unified_server, "BOT_TOKEN", None)
+    with TestClient(unified_server.app) as test_client:
+        assert test_client.get("/health").json()["bot"] == "disabled"
+        assert test_client.post("/webhook", json={"update_id": 1}).status_code == 404
+        assert test_client.get("/api/products").status_code == 200
+
+
+@pytest.fixture(scope="module")
+def record_file(tmp_path_factory):
+    return tmp_path_factory.mktemp("records") / "updates.jsonl"
+
+
+@pytest.fixture(scope="module")
+def client(record_file):
+    """Один запуск lifespan на модуль, как в воркере uvicorn"""
+    async def set_webhook(self, url, **kwargs):
+        webhook_calls.append((url, kwargs))
+        return True
+
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # Роутеры - синглтоны модулей, другие тесты уже подключили их к своим Dispatcher
+        for handler in (start, inline):
+            monkeypatch.setattr(handler.router, "_parent_router", None)
+        monkeypatch.setattr(unified_server, "BOT_TOKEN", "42:TEST")
+        monkeypatch.setattr(unified_server, "WEBHOOK_SECRET", SECRET)
+        monkeypatch.setattr(Bot, "set_webhook", set_webhook)
+        monkeypatch.setattr(recorder, "UPDATE_RECORD_FILE", str(record_file))
+        with TestClient(unified_server.app) as test_client:
+            yield test_client
+
+
+def test_real_api_routes_mounted(client):
+    """Вместо заглушек - роуты flower_shop.backend"""
+    response = client.get("/api/products")
+    assert response.status_code == 200
+    assert isinstance(response.json(), list) and response.json()
+
+    health = client.get("/health").json()
+    assert health["bot"] == "active"
+    assert health["leader"] is True
+
+
+def test_leader_sets_webhook_with_secret(client):
+    """Ведущий всегда передает секрет: getWebhookInfo его не возвращает"""
+    assert webhook_calls == [(unified_server.webhook_url(), {"secret_token": SECRET})]
+
+
+def test_webhook_checks_secret_and_payload(client):
+    """Без секрета - 403, невалидный апдейт - 400"""
+    update = {"update_id": 900001}
+    assert client.post("/webhook", json=update).status_code == 403
+
+    headers = {unified_server.SECRET_HEADER: SECRET}
+    assert client.post("/webhook", json={"foo": "bar"}, headers=headers).status_code == 400
+
+    response = client.post("/webhook", json=update, headers=headers)
+    assert response.status_code == 200 and response.text == "OK"
+    # Повторная доставка тоже 200, но в пул не попадает
+    assert client.post("/webhook", json=update, headers=headers).status_code == 200
+    assert unified_server.deduplicator.duplicates == 1
+
+
+def test_webhook_updates_recorded(client, record_file):
+    """UPDATE_RECORD_FILE работает и в едином сервере"""
+    headers = {unified_server.SECRET_HEADER: SECRET}
+    assert client.post("/webhook", json={"update_id": 900002}, headers=headers).status_code == 200
+    # Апдейт пишется воркером пула после ответа webhook
+    for _ in range(50):
+        if '"update_id": 900002' in record_file.read_text():
+            break
+        time.sleep(0.05)
+    assert '"update_id": 900002' in record_file.read_text()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,104 @@
+"""
+Тесты пула обработки апдейтов webhook
+"""
+import asyncio
+import random
+import pytest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'bot'))
+
+from aiogram.types import Update
+
+from update_pool import UpdatePool, update_chat_id
+
+
+def message_update(update_id: int, chat_id: int, text: str = "hi") -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 1700000000,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    })
+
+
+class FakeDispatcher:
+    """Медленные обработчики со случайной задержкой"""
+
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.handled = []
+        self.gate = None
+
+    async def feed_update(self, bot, update):
+        if self.gate is not None:
+            await self.gate.wait()
+        await asyncio.sleep(random.uniform(0, self.delay))
+        self.handled.append((update.message.chat.id, update.update_id))
+
+
+def test_update_chat_id():
+    assert update_chat_id(message_update(1, 42)) == 42
+    callback = Update.model_validate({
+        "update_id": 2,
+        "callback_query": {
+            "id": "1", "chat_instance": "x", "data": "buy",
+            "from": {"id": 7, "is_bot": False, "first_name": "Test"},
+        },
+    })
+    assert update_chat_id(callback) == 7
+
+
+def test_per_chat_order():
+    """Апдейты одного чата обрабатываются по порядку, разные чаты - параллельно"""
+    dp = FakeDispatcher()
+
+    async def runner():
+        pool = UpdatePool(dp, bot=None, workers=4, queue_size=1000)
+        pool.start()
+        update_id = 0
+        for _ in range(10):
+            for chat_id in range(1, 9):
+                update_id += 1
+                assert pool.submit(message_update(update_id, chat_id))
+        await pool.stop()
+        return pool.metrics()
+
+    metrics = asyncio.run(runner())
+    assert metrics["processed"] == 80
+    assert metrics["queue_depth"] == 0
+    assert metrics["lag_ms"]["p50"] is not None
+    for chat_id in range(1, 9):
+        ids = [update_id for chat, update_id in dp.handled if chat == chat_id]
+        assert ids == sorted(ids) and len(ids) == 10
+
+
+def test_backpressure():
+    """Полная очередь отклоняет апдейты, после обработки снова принимает"""
+    dp = FakeDispatcher(delay=0)
+
+    async def runner():
+        dp.gate = asyncio.Event()
+        pool = UpdatePool(dp, bot=None, workers=2, queue_size=3)
+        pool.start()
+        accepted = [pool.submit(message_update(i, i)) for i in range(1, 6)]
+        dp.gate.set()
+        await asyncio.sleep(0.05)
+        again = pool.submit(message_update(6, 6))
+        await pool.stop()
+        return accepted, again, pool.metrics()
+
+    accepted, again, metrics = asyncio.run(runner())
+    assert accepted == [True, True, True, False, False]
+    assert again is True
+    assert metrics["rejected"] == 2
+    assert metrics["processed"] == 4
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
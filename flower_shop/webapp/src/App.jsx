@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react'
-import { BrowserRouter as Router, Routes, Route } from 'react-router-dom'
+import { BrowserRouter as Router, Routes, Route, useNavigate } from 'react-router-dom'
 import Catalog from './components/Catalog'
 import ProductCard from './components/ProductCard'
 import Cart from './components/Cart'
@@ -7,6 +7,20 @@ import Checkout from './components/Checkout'
 import OrderSuccess from './components/OrderSuccess'
 import './App.css'
 
+// Ссылка из бота на конкретный товар (inline-поиск): ?product=<id>
+function OpenProduct() {
+  const navigate = useNavigate()
+
+  useEffect(() => {
+    const productId = new URLSearchParams(window.location.search).get('product')
+    if (productId && /^\d+$/.test(productId)) {
+      navigate(`/product/${productId}`, { replace: true })
+    }
+  }, [])
+
+  return null
+}
+
 function App() {
   const [cart, setCart] = useState([])
   const [user, setUser] = useState(null)
@@ -28,6 +42,51 @@ function App() {
     }
   }, [])
 
+  useEffect(() => {
+    // Повтор заказа из бота: ?repeat=<id>&cart=<product_id>:<size>:<qty>,...
+    const cartParam = new URLSearchParams(window.location.search).get('cart')
+    if (!cartParam) return
+
+    const restoreCart = async () => {
+      try {
+        const entries = cartParam.split(',')
+          .map(entry => entry.split(':'))
+          .filter(([id]) => /^\d+$/.test(id))
+        if (!entries.length) return
+
+        // Только товары корзины: актуальные цены и наличие
+        const apiUrl = import.meta.env.VITE_API_URL || 'http://localhost:8000'
+        const response = await fetch(`${apiUrl}/api/products/lookup`, {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ ids: entries.map(([id]) => Number(id)) })
+        })
+        if (!response.ok) return
+        const { found, unavailable, missing } = await response.json()
+        const byId = new Map(found.map(product => [product.id, product]))
+        const restored = entries
+          .map(([id, size, quantity]) => ({
+            product: byId.get(Number(id)),
+            size: size || 'standard',
+            quantity: Math.max(1, Number(quantity) || 1)
+          }))
+          .filter(item => item.product)
+        if (restored.length) setCart(restored)
+
+        // Снятые с продажи и удаленные товары не добавляем, но говорим об этом
+        const skipped = unavailable.map(product => product.name)
+        if (missing.length) skipped.push(`удаленные из каталога товары (${missing.length})`)
+        if (skipped.length) {
+          alert(`Не добавлены в корзину, сейчас недоступны: ${skipped.join(', ')}`)
+        }
+      } catch (e) {
+        console.error('Не удалось восстановить корзину', e)
+      }
+    }
+
+    restoreCart()
+  }, [])
+
   const addToCart = (product, size = 'standard') => {
     const existingItem = cart.find(item => 
       item.product.id === product.id && item.size === size
@@ -70,6 +129,7 @@ function App() {
   return (
     <Router>
       <div className="app">
+        <OpenProduct />
         <Routes>
           <Route path="/" element={<Catalog />} />
           <Route path="/product/:id" element={<ProductCard addToCart={addToCart} />} />
@@ -1,23 +1,51 @@
 """
 Универсальный сервер для Bot + API
 Объединяет Telegram Bot и FastAPI в одном процессе
+
+API (роуты flower_shop.backend), бот и уведомления работают в одном event
+loop: общий пул соединений с БД и одна HTTP-сессия к Telegram. Бот читает
+сводки заказов и каталог напрямую из процесса, а не через HTTP.
+
+Запуск в несколько воркеров:
+    uvicorn unified_server:app --workers 4
+Webhook принимает любой воркер. set_webhook и фоновые задачи (outbox,
+напоминания, рассылки) выполняет только ведущий (backend/utils/leader.py).
 """
-import asyncio
 import logging
 import os
+import sys
 from contextlib import asynccontextmanager
+from typing import List, Optional
 
-from fastapi import FastAPI
-from aiogram import Bot, Dispatcher, Router
-from aiogram.filters import CommandStart
-from aiogram.types import Message, WebAppInfo, InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.types import Update
 from dotenv import load_dotenv
-from aiohttp import web
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 
-# Загружаем переменные окружения
+# Загружаем переменные окружения до импорта модулей бота и backend:
+# они читают DATABASE_URL, BOT_TOKEN, ADMIN_CHAT_ID при импорте
 load_dotenv()
 
+# Модули бота лежат в flower_shop/bot, общий с backend пакет - в flower_shop/shared
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flower_shop', 'bot'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flower_shop'))
+from catalog import catalog_index
+from dedup import create_deduplicator
+from order_summary import order_summaries
+from recorder import setup_recorder
+from storage import create_storage, setup_storage_cache
+from throttling import setup_throttling
+from update_pool import UpdatePool
+
+from flower_shop.backend.main import setup_app, startup, shutdown
+from flower_shop.backend.models.database import async_session, engine
+from flower_shop.backend.utils.catalog_cache import catalog_cache
+from flower_shop.backend.utils.leader import leader
+from flower_shop.backend.utils.order_summary import load_order_summary
+from flower_shop.backend.utils.telegram_notify import notifier
+
 # Настройка логирования
 logging.basicConfig(
     level=logging.INFO,
@@ -25,78 +53,128 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Получаем токен бота
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-WEBAPP_URL = os.getenv('WEBAPP_URL', 'https://your-webapp-url.com')
-
-if not BOT_TOKEN:
-    raise ValueError("BOT_TOKEN не найден в переменных окружения")
-
-# Создаем роутер для бота
-bot_router = Router()
-
-# Обработчики команд бота
-@bot_router.message(CommandStart())
-async def cmd_start(message: Message):
-    """Приветствие и кнопка открытия Mini App"""
-    
-    # Inline кнопка с Mini App
-    keyboard = InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(
-            text="🛍 Открыть магазин",
-            web_app=WebAppInfo(url=WEBAPP_URL)
-        )]
-    ])
-    
-    text = """🌸 <b>Добро пожаловать в «Цветы Нячанг»!</b>
-
-Свежие букеты с доставкой за 2-3 часа 🚚
-📸 Фото перед отправкой
-💳 Удобная оплата
-
-Нажмите кнопку ниже чтобы открыть каталог:"""
-    
-    await message.answer(
-        text,
-        reply_markup=keyboard,
-        parse_mode='HTML'
-    )
-
-# Глобальные переменные для бота
-bot = None
-dp = None
+WEBHOOK_PATH = "/webhook"
+# Секрет в заголовке X-Telegram-Bot-Api-Secret-Token (пусто - не проверяется)
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def webhook_url() -> str:
+    railway_domain = os.getenv("RAILWAY_PUBLIC_DOMAIN")
+    if railway_domain:
+        return f"https://{railway_domain}{WEBHOOK_PATH}"
+    return os.getenv("WEBHOOK_URL", f"https://your-domain.railway.app{WEBHOOK_PATH}")
+
+
+class SharedSession(AiohttpSession):
+    """Сессия aiogram поверх ClientSession уведомлений; закрывает ее notifier"""
+
+    async def create_session(self):
+        return await notifier.start()
+
+    async def close(self) -> None:
+        pass
+
+
+async def fetch_order_summary(telegram_id: int) -> dict:
+    """Сводка заказов из read-model без HTTP-запроса к себе же"""
+    async with async_session() as db:
+        return await load_order_summary(db, telegram_id)
+
+
+_catalog_version: Optional[int] = None
+
+
+async def load_catalog() -> Optional[List[dict]]:
+    """Доступные товары из снимка backend; None - версия снимка не изменилась"""
+    global _catalog_version
+    snapshot = await catalog_cache.get()
+    if snapshot.version == _catalog_version:
+        return None
+    _catalog_version = snapshot.version
+    return list(snapshot.select())
+
+
+# Объекты бота; None - BOT_TOKEN не задан, работает только API
+bot: Optional[Bot] = None
+dp: Optional[Dispatcher] = None
+storage = None
+deduplicator = None
+throttling = None
+recorder = None
+update_pool: Optional[UpdatePool] = None
+
+
+async def set_webhook() -> None:
+    """Только в ведущем воркере: остальные не перезаписывают webhook при каждом старте
+
+    Вызываем всегда, даже если URL не изменился: getWebhookInfo не возвращает
+    секрет, а setWebhook идемпотентен - так новый WEBHOOK_SECRET доходит до Telegram.
+    """
+    if bot is None:
+        return
+    url = webhook_url()
+    await bot.set_webhook(url, secret_token=WEBHOOK_SECRET or None)
+    logger.info(f"🔗 Webhook установлен: {url}")
+
+
+leader.on_elected(set_webhook)
+
+
+def create_bot() -> None:
+    global bot, dp, storage, deduplicator, throttling, recorder, update_pool
+    bot = Bot(token=BOT_TOKEN, session=SharedSession())
+    # FSM в той же БД и том же пуле соединений, что и API
+    storage = create_storage(engine=engine)
+    dp = Dispatcher(storage=storage)
+    # Кэш состояния FSM только на время апдейта: апдейты пользователя могут прийти в разные воркеры
+    setup_storage_cache(dp)
+    # Запись апдейтов для нагрузочного стенда (UPDATE_RECORD_FILE)
+    recorder = setup_recorder(dp)
+    # Повторные доставки Telegram отбрасываем по update_id еще в webhook, до очереди пула
+    deduplicator = create_deduplicator(prefix=str(bot.id), engine=engine)
+    # Лимит частоты на пользователя, до хендлеров
+    throttling = setup_throttling(dp)
+
+    from handlers import start, inline
+    dp.include_router(start.router)
+    dp.include_router(inline.router)
+    update_pool = UpdatePool(dp, bot)
+    order_summaries.fetch = fetch_order_summary
+    catalog_index.source = load_catalog
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Управление жизненным циклом приложения"""
-    global bot, dp
-    
+    global bot, recorder
+    if BOT_TOKEN:
+        create_bot()
+    else:
+        logger.warning("⚠️ BOT_TOKEN не задан: запущен только API")
+
+    # Таблицы, HTTP-сессия, выбор ведущего (и set_webhook, если этот воркер ведущий)
+    await startup()
+    if bot is not None:
+        update_pool.start()
+        catalog_index.start()
     try:
-        # Инициализируем бота
-        bot = Bot(token=BOT_TOKEN)
-        storage = MemoryStorage()
-        dp = Dispatcher(storage=storage)
-        dp.include_router(bot_router)
-        
-        # Настраиваем webhook
-        webhook_path = "/webhook"
-        port = int(os.getenv("PORT", 8000))
-        
-        railway_domain = os.getenv("RAILWAY_PUBLIC_DOMAIN")
-        if railway_domain:
-            webhook_url = f"https://{railway_domain}{webhook_path}"
-        else:
-            webhook_url = os.getenv("WEBHOOK_URL", f"https://your-domain.railway.app{webhook_path}")
-        
-        await bot.set_webhook(webhook_url)
-        logger.info(f"🔗 Webhook установлен: {webhook_url}")
-        
         yield
-        
     finally:
-        # Закрываем соединения
-        if bot:
+        if bot is not None:
+            await update_pool.stop()
+            await catalog_index.stop()
+            await order_summaries.close()
+            await storage.close()
+            await deduplicator.close()
+            if recorder is not None:
+                recorder.close()
+                recorder = None
             await bot.session.close()
+            bot = None
+        await shutdown()
+
 
 # Создаем FastAPI приложение
 app = FastAPI(
@@ -105,39 +183,54 @@ app = FastAPI(
     version="1.0.0",
     lifespan=lifespan
 )
+setup_app(app)
+
 
-# API Routes
 @app.get("/")
 async def root():
     return {"message": "Flower Shop API + Bot", "version": "1.0.0"}
 
+
 @app.get("/health")
 async def health_check():
-    return {"status": "OK", "bot": "active"}
+    return {"status": "OK", "bot": "active" if bot is not None else "disabled", "leader": leader.is_leader}
+
 
-@app.post("/webhook")
-async def webhook_handler(request: web.Request):
-    """Обработчик webhook от Telegram"""
+@app.post(WEBHOOK_PATH)
+async def webhook_handler(request: Request):
+    """Обработчик webhook от Telegram: апдейт в очередь пула, ответ сразу"""
+    if bot is None:
+        return PlainTextResponse("BOT DISABLED", status_code=404)
+    if WEBHOOK_SECRET and request.headers.get(SECRET_HEADER) != WEBHOOK_SECRET:
+        return PlainTextResponse("FORBIDDEN", status_code=403)
     try:
-        data = await request.json()
-        await dp.feed_update(bot, data)
-        return web.Response(text="OK")
+        update = Update.model_validate(await request.json(), context={"bot": bot})
     except Exception as e:
-        logger.error(f"❌ Ошибка webhook: {e}")
-        return web.Response(text="ERROR", status=500)
-
-# API endpoints (здесь можно добавить FastAPI роуты)
-@app.get("/api/products")
-async def get_products():
-    """Получить список товаров"""
-    # Здесь будет логика получения товаров
-    return {"products": []}
-
-@app.post("/api/orders")
-async def create_order():
-    """Создать заказ"""
-    # Здесь будет логика создания заказа
-    return {"success": True, "order_id": 123}
+        logger.error(f"❌ Невалидное обновление: {e}")
+        return PlainTextResponse("INVALID", status_code=400)
+
+    if not await deduplicator.check(update.update_id):
+        logger.info(f"🔁 Повторный апдейт {update.update_id} пропущен")
+        return PlainTextResponse("OK")
+
+    # Очередь полна - Telegram повторит доставку позже, этот повтор не дубль
+    if not update_pool.submit(update):
+        logger.warning(f"⚠️ Очередь апдейтов заполнена, {update.update_id} отклонен")
+        await deduplicator.release(update.update_id)
+        return PlainTextResponse("BUSY", status_code=503)
+    return PlainTextResponse("OK")
+
+
+@app.get("/metrics/updates")
+async def update_metrics():
+    """Очередь, задержка и время обработки апдейтов"""
+    return update_pool.metrics() if update_pool is not None else {}
+
+
+@app.get("/metrics/throttling")
+async def throttling_metrics():
+    return throttling.metrics() if throttling is not None else {}
+
 
 if __name__ == "__main__":
     import uvicorn